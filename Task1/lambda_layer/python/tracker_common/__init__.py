@@ -0,0 +1,2 @@
+# Code shared by the signup (Task1) and scheduled price check (Task2) Lambdas.
+# It ships in the price_tracker_v1 layer next to the vendored dependencies.
@@ -0,0 +1,67 @@
+import os
+import threading
+import boto3
+from botocore.config import Config
+
+# botocore settings, overridable through the Lambda environment. Every crawl worker can
+# read or write the table (price drops) while scan segments and the
+# write-behind thread do too, so the pool should cover all of them at once; the
+# Terraform sets BOTO_POOL_SIZE from the crawl concurrency for that reason.
+POOL_SIZE = int(os.environ.get('BOTO_POOL_SIZE', 10))
+CONNECT_TIMEOUT = float(os.environ.get('BOTO_CONNECT_TIMEOUT', 2))
+READ_TIMEOUT = float(os.environ.get('BOTO_READ_TIMEOUT', 5))
+# 'adaptive' adds client-side rate limiting on throttling errors to the standard retries
+RETRY_MODE = os.environ.get('BOTO_RETRY_MODE', 'adaptive')
+MAX_ATTEMPTS = int(os.environ.get('BOTO_MAX_ATTEMPTS', 3))
+TCP_KEEPALIVE = os.environ.get('BOTO_TCP_KEEPALIVE', 'true').lower() == 'true'
+
+_session = None
+_clients = {}
+_resources = {}
+_lock = threading.Lock()
+
+
+def client_config(pool_size=POOL_SIZE):
+    return Config(
+        max_pool_connections=pool_size,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+        retries={'mode': RETRY_MODE, 'max_attempts': MAX_ATTEMPTS},
+        tcp_keepalive=TCP_KEEPALIVE
+    )
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        _session = boto3.session.Session()
+    return _session
+
+
+# One client per service for the life of the container, built on first use, so warm
+# invocations reuse its endpoint setup and open connections. Clients are thread safe.
+def get_client(service):
+    client = _clients.get(service)
+    if client is None:
+        with _lock:
+            client = _clients.get(service)
+            if client is None:
+                client = _clients[service] = _get_session().client(service, config=client_config())
+    return client
+
+
+# Same for resources. A resource must not be shared between threads that use it at
+# once; threads that need their own get one from new_resource.
+def get_resource(service):
+    resource = _resources.get(service)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(service)
+            if resource is None:
+                resource = _resources[service] = _get_session().resource(service, config=client_config())
+    return resource
+
+
+# A resource of its own (own session and connection pool) with the same settings
+def new_resource(service, region_name=None):
+    return boto3.session.Session().resource(service, region_name=region_name, config=client_config())
@@ -0,0 +1,104 @@
+import logging
+import os
+import threading
+import time
+from botocore.exceptions import BotoCoreError, ClientError
+
+logger = logging.getLogger()
+
+# Read capacity units per second a scan may use. By default it is sized from the
+# table's (or index's) provisioned throughput times SCAN_CAPACITY_SHARE; SCAN_READ_UNITS
+# overrides that. A scan may spend SCAN_BURST_SECONDS of it in one page, which is also
+# the longest it waits between pages; keep it well under DEADLINE_MARGIN_MS.
+SCAN_READ_UNITS = os.environ.get('SCAN_READ_UNITS')
+SCAN_CAPACITY_SHARE = float(os.environ.get('SCAN_CAPACITY_SHARE', 1.0))
+SCAN_BURST_SECONDS = float(os.environ.get('SCAN_BURST_SECONDS', 5))
+
+# DynamoDB errors that mean "slow down" rather than "this request is wrong"
+THROTTLING_ERRORS = frozenset({
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded'
+})
+
+
+# Token bucket in DynamoDB capacity units: refills at `rate` units per second up to
+# `burst`. A caller waits for a unit before sending a request and then charges what
+# the response reports as consumed (ReturnConsumedCapacity), so large items slow the
+# pace down by what they actually cost. The balance can go negative; the next caller
+# then waits until the debt is paid back.
+class CapacityBucket:
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(self.rate, 1.0))
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated = clock()
+        self.consumed = 0.0
+        self.waited = 0.0
+        self.throttled = 0
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    # Seconds until `units` are available
+    def delay(self, units=1.0):
+        with self._lock:
+            self._refill()
+            return max(0.0, (min(units, self.burst) - self._tokens) / self.rate)
+
+    def add_waited(self, seconds):
+        with self._lock:
+            self.waited += seconds
+
+    def charge(self, units):
+        with self._lock:
+            self._refill()
+            self._tokens -= units
+            self.consumed += units
+
+    # A throttled request: empty the bucket so every caller backs off for a while
+    def drain(self, seconds):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, -seconds * self.rate)
+            self.throttled += 1
+
+    def reset_stats(self):
+        with self._lock:
+            self.consumed = 0.0
+            self.waited = 0.0
+            self.throttled = 0
+
+    def report(self):
+        with self._lock:
+            return {
+                'units_per_second': self.rate,
+                'consumed_units': round(self.consumed, 1),
+                'waited_seconds': round(self.waited, 2),
+                'throttled': self.throttled
+            }
+
+
+# Bucket for scans or queries of `table` (of its GSI index_name), or None when the
+# table is on demand or its capacity cannot be read, in which case reads are not paced
+def read_bucket(table, index_name=None, share=SCAN_CAPACITY_SHARE):
+    if SCAN_READ_UNITS:
+        units = float(SCAN_READ_UNITS)
+    else:
+        try:
+            throughput = table.provisioned_throughput
+            if index_name is not None:
+                index = next(index for index in table.global_secondary_indexes or [] if index['IndexName'] == index_name)
+                throughput = index['ProvisionedThroughput']
+            units = float(throughput.get('ReadCapacityUnits', 0)) * share
+        except (BotoCoreError, ClientError, StopIteration) as e:
+            logger.warning(f"Could not read the provisioned throughput of {table.name}; reads are not paced: {e}")
+            return None
+    if units <= 0:
+        return None
+    return CapacityBucket(units, units * SCAN_BURST_SECONDS)
@@ -0,0 +1,78 @@
+from decimal import Decimal
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+# Decodes items in the low-level wire format ({'url': {'S': ...}, 'lowest_price': {'N': ...}})
+# without the generic walk the boto3 resource layer does over every attribute value.
+# Strings and lists of strings are taken as they are; numbers go through numbers[name]
+# (Decimal unless given, so prices stay usable in conditional writes). Every other type
+# falls back to boto3's TypeDeserializer, which is what the resource layer gives.
+class ItemDecoder:
+    def __init__(self, numbers=None):
+        self.numbers = numbers or {}
+
+    def __call__(self, item):
+        decoded = {}
+        numbers = self.numbers
+        for name, value in item.items():
+            if 'S' in value:
+                decoded[name] = value['S']
+            elif 'N' in value:
+                decoded[name] = numbers.get(name, Decimal)(value['N'])
+            elif 'L' in value:
+                decoded[name] = [entry['S'] if 'S' in entry else _deserializer.deserialize(entry) for entry in value['L']]
+            else:
+                decoded[name] = _deserializer.deserialize(value)
+        return decoded
+
+
+def encode_values(values):
+    return {name: _serializer.serialize(value) for name, value in values.items()}
+
+
+def decode_values(values):
+    return {name: _deserializer.deserialize(value) for name, value in values.items()}
+
+
+# Read side of a boto3 Table (scan and query) on the low-level client. Requests and
+# responses keep the resource format, ExclusiveStartKey/LastEvaluatedKey included, so
+# scan_pages, query_pages and saved cursors work with either; only the items are
+# decoded by the ItemDecoder. Clients are thread safe, so one instance serves all
+# scan segments and the write-behind thread.
+class ClientTable:
+    def __init__(self, table, decoder=None, client=None):
+        self.table = table
+        self.name = table.name
+        self.client = client or table.meta.client
+        self.decode = decoder or ItemDecoder()
+
+    def scan(self, **kwargs):
+        return self._read(self.client.scan, kwargs)
+
+    def query(self, **kwargs):
+        return self._read(self.client.query, kwargs)
+
+    # Key and values in the resource format; returned Attributes are decoded back
+    def update_item(self, **kwargs):
+        request = dict(kwargs, TableName=self.name)
+        for name in ('Key', 'ExpressionAttributeValues'):
+            if name in request:
+                request[name] = encode_values(request[name])
+        response = self.client.update_item(**request)
+        if 'Attributes' in response:
+            response['Attributes'] = decode_values(response['Attributes'])
+        return response
+
+    def _read(self, operation, kwargs):
+        request = dict(kwargs, TableName=self.name)
+        for name in ('ExpressionAttributeValues', 'ExclusiveStartKey'):
+            if name in request:
+                request[name] = encode_values(request[name])
+        response = operation(**request)
+        response['Items'] = [self.decode(item) for item in response.get('Items', [])]
+        if 'LastEvaluatedKey' in response:
+            response['LastEvaluatedKey'] = decode_values(response['LastEvaluatedKey'])
+        return response
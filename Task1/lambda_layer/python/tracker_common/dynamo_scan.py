@@ -0,0 +1,178 @@
+import queue
+import threading
+from botocore.exceptions import ClientError
+from tracker_common.aws_clients import new_resource
+from tracker_common.capacity import THROTTLING_ERRORS
+from tracker_common.dynamo_client import ClientTable
+
+_SEGMENT_DONE = object()
+
+# Throttled pages are sent again after BACKOFF_SECONDS * 2^(n - 1) for the nth throttle in a row
+MAX_THROTTLES = 8
+BACKOFF_SECONDS = 0.5
+# Paced pages are sized from the items per capacity unit of the previous page; the first
+# one assumes 1 KB items (eight per unit for an eventually consistent read)
+ITEMS_PER_UNIT = 8
+# A wait for read capacity (which a throttle backoff can stretch to a minute) checks
+# stop() at least this often
+STOP_POLL_SECONDS = 0.5
+
+
+def _never():
+    return False
+
+
+# Wait for a unit of read capacity in steps, so stop() can end the wait;
+# False if stop() returned True first
+def _wait_for_capacity(bucket, stop):
+    while True:
+        delay = bucket.delay()
+        if delay <= 0:
+            return True
+        if stop():
+            return False
+        step = min(delay, STOP_POLL_SECONDS)
+        bucket.sleep(step)
+        bucket.add_waited(step)
+
+
+# Page through one scan or query, carrying every argument (ExpressionAttributeNames
+# included) over to the continuation requests.
+# With a CapacityBucket every request waits for read capacity and is charged what it
+# consumed (ReturnConsumedCapacity); unless the caller set a Limit, pages are then sized
+# to about one burst of the bucket. A throttled request empties the bucket and is sent
+# again, up to MAX_THROTTLES times in a row.
+# stop() is checked before every request and during capacity waits; once it returns
+# True no further page is requested, so the last yielded page's LastEvaluatedKey is
+# where the caller has to continue.
+# Yields (start_key, response) where start_key is the ExclusiveStartKey that produced the page.
+def _paginate(operation, kwargs, start_key=None, bucket=None, stop=_never):
+    sized = bucket is not None and 'Limit' not in kwargs
+    if bucket is not None:
+        kwargs = dict(kwargs, ReturnConsumedCapacity='TOTAL')
+    if sized:
+        kwargs['Limit'] = max(1, int(ITEMS_PER_UNIT * bucket.burst))
+    throttles = 0
+    while True:
+        if start_key is not None:
+            kwargs = dict(kwargs, ExclusiveStartKey=start_key)
+        if stop():
+            return
+        if bucket is not None and not _wait_for_capacity(bucket, stop):
+            return
+        try:
+            response = operation(**kwargs)
+        except ClientError as e:
+            if bucket is None or e.response['Error']['Code'] not in THROTTLING_ERRORS or throttles >= MAX_THROTTLES:
+                raise
+            throttles += 1
+            bucket.drain(BACKOFF_SECONDS * 2 ** (throttles - 1))
+            continue
+        throttles = 0
+        if bucket is not None:
+            units = response.get('ConsumedCapacity', {}).get('CapacityUnits', 0)
+            bucket.charge(units)
+            if sized and units > 0:
+                kwargs['Limit'] = max(1, int(response.get('ScannedCount', response['Count']) / units * bucket.burst))
+        yield start_key, response
+        if 'LastEvaluatedKey' not in response:
+            return
+        start_key = response['LastEvaluatedKey']
+
+
+# boto3 resources are not thread safe, so every segment worker gets its own Table;
+# a ClientTable is shared, its client is thread safe
+def _new_table(table):
+    if isinstance(table, ClientTable):
+        return table
+    region = table.meta.client.meta.region_name
+    return new_resource('dynamodb', region).Table(table.name)
+
+
+# Run segment_pages(table, segment, start_key) for every segment in start_keys and
+# yield (segment, start_key, response) for every page as it arrives. With more
+# than one segment left, each runs in its own worker thread and pages from all
+# segments are interleaved in arrival order through a small bounded queue, so
+# workers never run more than a couple of pages ahead of the consumer.
+def _segmented_pages(table, start_keys, table_factory, segment_pages):
+    if len(start_keys) <= 1:
+        for segment, start_key in start_keys.items():
+            for page_key, page in segment_pages(table, segment, start_key):
+                yield segment, page_key, page
+        return
+
+    pages = queue.Queue(maxsize=len(start_keys) * 2)
+    stop = threading.Event()
+
+    def put(page):
+        while not stop.is_set():
+            try:
+                pages.put(page, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker(segment):
+        try:
+            for page_key, page in segment_pages(table_factory(table), segment, start_keys[segment]):
+                if not put((segment, page_key, page)):
+                    return
+            put(_SEGMENT_DONE)
+        except Exception as e:
+            put(e)
+
+    for segment in start_keys:
+        threading.Thread(target=worker, args=(segment,), name=f'scan-{segment}', daemon=True).start()
+
+    try:
+        running = len(start_keys)
+        while running:
+            page = pages.get()
+            if page is _SEGMENT_DONE:
+                running -= 1
+            elif isinstance(page, Exception):
+                raise page
+            else:
+                yield page
+    finally:
+        stop.set()
+
+
+# Yield (segment, start_key, response) for every scan page as it arrives. With
+# segments > 1 the table is read as a parallel scan (Segment/TotalSegments), one
+# worker thread per segment.
+# start_keys maps segment -> ExclusiveStartKey to resume from; segments missing
+# from it are treated as finished. By default every segment starts at the beginning.
+# All segments share the bucket, if any, and the stop function (see _paginate).
+def scan_pages(table, segments=1, start_keys=None, table_factory=_new_table, bucket=None, stop=_never, **scan_kwargs):
+    segments = max(1, int(segments))
+    if start_keys is None:
+        start_keys = {segment: None for segment in range(segments)}
+
+    def segment_pages(segment_table, segment, start_key):
+        kwargs = scan_kwargs
+        if segments > 1:
+            kwargs = dict(scan_kwargs, Segment=segment, TotalSegments=segments)
+        return _paginate(segment_table.scan, kwargs, start_key, bucket, stop)
+
+    return _segmented_pages(table, start_keys, table_factory, segment_pages)
+
+
+# Same as scan_pages, but every segment is a separate query: partition_kwargs[segment]
+# holds the arguments specific to that segment (its key condition values, typically)
+# and is merged over the shared query_kwargs.
+def query_pages(table, partition_kwargs, start_keys=None, table_factory=_new_table, bucket=None, stop=_never,
+                **query_kwargs):
+    if start_keys is None:
+        start_keys = {segment: None for segment in range(len(partition_kwargs))}
+
+    def segment_pages(segment_table, segment, start_key):
+        kwargs = dict(query_kwargs)
+        for name, value in partition_kwargs[segment].items():
+            if isinstance(value, dict) and isinstance(kwargs.get(name), dict):
+                value = dict(kwargs[name], **value)
+            kwargs[name] = value
+        return _paginate(segment_table.query, kwargs, start_key, bucket, stop)
+
+    return _segmented_pages(table, start_keys, table_factory, segment_pages)
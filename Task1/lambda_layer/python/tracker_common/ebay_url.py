@@ -0,0 +1,45 @@
+import re
+from urllib.parse import urlsplit
+from tracker_common.response_cache import canonical_url
+
+# Tracked items are keyed by this URL, whatever spelling of it was submitted
+ITEM_URL = 'https://www.ebay.com/itm/{}'
+
+# Item pages are /itm/<id> or /itm/<title-slug>/<id>, with any tracking query string
+_ITEM_PATH = re.compile(r'/itm/(?:[^/?#]+/)?(\d{1,19})(?=[/?#]|$)')
+_ITEM_PAGE_PATH = re.compile(r'/itm/(?:[^/]+/)?(\d{1,19})/?')
+_EBAY_HOSTS = frozenset(['ebay.com', 'www.ebay.com', 'm.ebay.com'])
+MAX_URL_LENGTH = 2048
+
+
+# eBay item number of a listing URL, or None when the URL does not name one
+def item_id(url):
+    match = _ITEM_PATH.search(url or '')
+    return match.group(1) if match else None
+
+
+# Key that is the same for every URL of one listing
+def item_key(url):
+    return item_id(url) or canonical_url(url)
+
+
+# The one URL of a listing: its item page without title slug, query or fragment
+def canonical_item_url(url):
+    item = item_id(url)
+    return ITEM_URL.format(item) if item else canonical_url(url)
+
+
+# Item number of a submitted listing URL, or None unless it is an http(s) eBay item page.
+# Only string and regex checks, so bad input is rejected before any network work.
+def parse_item_url(url):
+    if not isinstance(url, str) or not url or len(url) > MAX_URL_LENGTH:
+        return None
+    try:
+        parts = urlsplit(url.strip())
+        host = parts.hostname
+    except ValueError:
+        return None
+    if parts.scheme not in ('http', 'https') or host not in _EBAY_HOSTS:
+        return None
+    match = _ITEM_PAGE_PATH.fullmatch(parts.path)
+    return match.group(1) if match else None
@@ -0,0 +1,322 @@
+import collections
+import datetime
+import html as html_lib
+import json
+import logging
+import os
+import re
+import threading
+from bs4 import BeautifulSoup as bs, SoupStrainer
+from tracker_common.prices import price_number
+
+logger = logging.getLogger()
+
+# Every extractor takes the page HTML and returns (price, title); either may be None.
+# extract_item first reads the structured product data embedded in the page (JSON-LD),
+# then runs the selected span extractor ('scan' by default), and finally falls back to
+# the full BeautifulSoup parse ('bs4') when a field is still missing.
+EXTRACTOR = os.environ.get('PRICE_EXTRACTOR', 'scan')
+
+TITLE_CLASS = 'ux-textspans ux-textspans--BOLD'
+TEXT_CLASS = 'ux-textspans'
+PRICE_PREFIX = 'US $'
+CURRENCY = 'USD'
+
+
+# "US $1,299.99/ea" -> "1299.99"
+def clean_price(text):
+    return text.strip().replace(PRICE_PREFIX, '').replace(',', '').split('/')[0]
+
+
+def _is_price_text(text):
+    return bool(text) and text.strip().startswith(PRICE_PREFIX)
+
+
+def _find_fields(soup):
+    title_element = soup.find('span', class_=TITLE_CLASS)
+    price_element = soup.find('span', class_=TEXT_CLASS, string=_is_price_text)
+    title = title_element.text.strip() if title_element else None
+    price = clean_price(price_element.text) if price_element else None
+    return price, title
+
+
+# Full DOM parse of the whole page
+def extract_bs4(html):
+    return _find_fields(bs(html, 'html.parser'))
+
+
+# The strainer sees the raw, unsplit class attribute
+def _has_text_class(value):
+    return bool(value) and TEXT_CLASS in (value.split() if isinstance(value, str) else value)
+
+
+_TEXT_SPANS = SoupStrainer('span', class_=_has_text_class)
+
+
+# BeautifulSoup restricted to ux-textspans spans: the tokenizer still reads the whole
+# page but only the matching spans are turned into tree nodes
+def extract_strainer(html):
+    return _find_fields(bs(html, 'html.parser', parse_only=_TEXT_SPANS))
+
+
+_SPAN_TAG = re.compile(r'<(/?)span\b([^>]*)>', re.IGNORECASE)
+# span tags plus the starts of raw-text blocks, whose content is not markup
+_TOKEN = re.compile(r'<(/?)span\b([^>]*)>|<(script|style)\b|<!--', re.IGNORECASE)
+_BLOCK_END = {
+    'script': re.compile(r'</script\s*>', re.IGNORECASE),
+    'style': re.compile(r'</style\s*>', re.IGNORECASE),
+    None: re.compile(r'-->')
+}
+_CLASS_ATTR = re.compile(r'''\bclass\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))''', re.IGNORECASE)
+_ANY_TAG = re.compile(r'<[^>]*>')
+
+
+# Targeted scanner: walks the <span> tags of the page with a regex and stops as soon as
+# the title span and the first "US $" text span are found. Scripts, styles and comments
+# are skipped like html.parser does, except JSON-LD scripts, whose product data fills the
+# fields as well. Text can be fed in chunks; a span or block that is not complete yet is
+# kept in the buffer until more text arrives.
+class ItemPageScanner:
+    def __init__(self):
+        self.buffer = ''
+        self.price = None
+        self.title = None
+        self.ends_at = None
+        self.strategy = 'scan'
+
+    @property
+    def done(self):
+        return self.price is not None and self.title is not None
+
+    # Returns True once both fields are found
+    def feed(self, text):
+        if self.done:
+            return True
+        self.buffer += text
+        pos = 0
+        while not self.done:
+            match = _TOKEN.search(self.buffer, pos)
+            if match is None:
+                # keep a possibly cut-off "<span ..." at the end of the buffer for the next chunk
+                tail = self.buffer.rfind('<', pos)
+                pos = tail if tail >= 0 and len(self.buffer) - tail < 4096 else len(self.buffer)
+                break
+            if match.group(2) is None:
+                # <script>, <style> or <!--: jump past the end of the block
+                block_end = _BLOCK_END[match.group(3) and match.group(3).lower()].search(self.buffer, match.end())
+                if block_end is None:
+                    pos = match.start()
+                    break
+                if match.group(3) and match.group(3).lower() == 'script':
+                    self._read_json_ld(match.end(), block_end.start())
+                pos = block_end.end()
+                continue
+            if match.group(1):
+                pos = match.end()
+                continue
+            classes = self._classes(match.group(2))
+            if TEXT_CLASS not in classes:
+                pos = match.end()
+                continue
+            end = self._closing(match.end())
+            if end is None:
+                # the span is not complete yet; wait for the next chunk
+                pos = match.start()
+                break
+            inner = self.buffer[match.end():end]
+            if self.title is None and ' '.join(classes) == TITLE_CLASS:
+                self.title = html_lib.unescape(_ANY_TAG.sub('', inner)).strip()
+            if self.price is None and '<' not in inner:
+                text = html_lib.unescape(inner)
+                if _is_price_text(text):
+                    self.price = clean_price(text)
+            pos = match.end()
+        self.buffer = self.buffer[pos:]
+        return self.done
+
+    def _read_json_ld(self, start, end):
+        tag_end = self.buffer.find('>', start, end)
+        if tag_end < 0 or not _JSON_LD_TYPE.search(self.buffer, start, tag_end):
+            return
+        price, title, ends_at = _json_ld_fields(self.buffer[tag_end + 1:end])
+        if price is not None and title is not None:
+            self.price, self.title, self.ends_at, self.strategy = price, title, ends_at, 'json_ld'
+
+    def _classes(self, attributes):
+        match = _CLASS_ATTR.search(attributes)
+        if match is None:
+            return []
+        return next(group for group in match.groups() if group is not None).split()
+
+    # Index of the </span> matching the span opened right before `start`
+    def _closing(self, start):
+        depth = 1
+        for match in _SPAN_TAG.finditer(self.buffer, start):
+            depth += -1 if match.group(1) else 1
+            if depth == 0:
+                return match.start()
+        return None
+
+
+def extract_scan(html):
+    scanner = ItemPageScanner()
+    scanner.feed(html)
+    return scanner.price, scanner.title
+
+
+_JSON_LD = re.compile(
+    r"""<script\b[^>]*\btype\s*=\s*["']?application/ld\+json["']?[^>]*>(.*?)</script\s*>""",
+    re.IGNORECASE | re.DOTALL
+)
+_JSON_LD_TYPE = re.compile(r'''\btype\s*=\s*["']?application/ld\+json''', re.IGNORECASE)
+
+
+def _json_ld_objects(data):
+    if isinstance(data, list):
+        for value in data:
+            yield from _json_ld_objects(value)
+    elif isinstance(data, dict):
+        yield data
+        yield from _json_ld_objects(data.get('@graph', []))
+
+
+def _is_product(node):
+    node_type = node.get('@type')
+    return node_type == 'Product' or (isinstance(node_type, list) and 'Product' in node_type)
+
+
+def _offer_price(offers):
+    for offer in offers if isinstance(offers, list) else [offers]:
+        if not isinstance(offer, dict) or offer.get('priceCurrency', CURRENCY) != CURRENCY:
+            continue
+        price = price_number(str(offer.get('price', offer.get('lowPrice'))).replace(',', ''))
+        if price is not None:
+            return f'{price:.2f}'
+    return None
+
+
+# ISO 8601 date or time as epoch seconds, UTC unless it says otherwise; a date alone
+# means the end of that day
+def _epoch(value):
+    if not isinstance(value, str):
+        return None
+    try:
+        moment = datetime.datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return int(moment.timestamp()) + (86400 if len(value.strip()) == 10 else 0)
+
+
+# When the listing ends: availabilityEnds (an auction's end) or else priceValidUntil
+def _offer_end(offers):
+    for offer in offers if isinstance(offers, list) else [offers]:
+        if not isinstance(offer, dict):
+            continue
+        for name in ('availabilityEnds', 'priceValidUntil'):
+            ends_at = _epoch(offer.get(name))
+            if ends_at is not None:
+                return ends_at
+    return None
+
+
+def _json_ld_fields(text):
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None, None, None
+    for node in _json_ld_objects(data):
+        if not _is_product(node):
+            continue
+        price = _offer_price(node.get('offers'))
+        title = node.get('name')
+        if price is not None and isinstance(title, str) and title.strip():
+            return price, html_lib.unescape(title).strip(), _offer_end(node.get('offers'))
+    return None, None, None
+
+
+# schema.org Product data: name, offers.price in USD and the end of the offer
+def _json_ld_item(html):
+    for match in _JSON_LD.finditer(html):
+        price, title, ends_at = _json_ld_fields(match.group(1))
+        if price is not None:
+            return price, title, ends_at
+    return None, None, None
+
+
+def extract_json_ld(html):
+    price, title, _ = _json_ld_item(html)
+    return price, title
+
+
+# How often each strategy produced the result, reset by the handler every run
+class StrategyStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = collections.Counter()
+
+    def reset(self):
+        with self._lock:
+            self.counts = collections.Counter()
+
+    def add(self, strategy):
+        with self._lock:
+            self.counts[strategy] += 1
+
+    def report(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+strategy_stats = StrategyStats()
+
+
+EXTRACTORS = {
+    'scan': extract_scan,
+    'strainer': extract_strainer,
+    'bs4': extract_bs4
+}
+
+
+# Extract (price, title, strategy, ends_at): embedded JSON-LD first, then the configured
+# span backend, then the full BeautifulSoup parse. strategy names the step that
+# succeeded, or is 'none' when no step found both fields. ends_at, the end of the
+# listing in epoch seconds, is only known from the JSON-LD product data (else None).
+def extract_with_strategy(html, backend=EXTRACTOR):
+    price, title, ends_at = _json_ld_item(html)
+    if price is not None and title is not None:
+        strategy_stats.add('json_ld')
+        return price, title, 'json_ld', ends_at
+    steps = [(backend, EXTRACTORS[backend])]
+    if backend != 'bs4':
+        steps.append(('bs4', extract_bs4))
+    for strategy, extract in steps:
+        price, title = extract(html)
+        if price is not None and title is not None:
+            strategy_stats.add(strategy)
+            return price, title, strategy, ends_at
+    strategy_stats.add('none')
+    return price, title, 'none', ends_at
+
+
+def extract_item(html, backend=EXTRACTOR):
+    price, title, strategy, _ = extract_with_strategy(html, backend)
+    if strategy not in ('json_ld', backend):
+        logger.info(f"Extraction used the {strategy} path")
+    return price, title
+
+
+# Same as extract_with_strategy over a page that arrives as an iterator of text chunks.
+# The scanner reads JSON-LD and spans as the chunks come in and stops consuming the
+# iterator once both fields are found, so the rest of the page is never downloaded.
+# A page that ends without them goes through the whole extract_item chain.
+def extract_stream_with_strategy(chunks, backend=EXTRACTOR):
+    scanner = ItemPageScanner()
+    seen = []
+    for chunk in chunks:
+        seen.append(chunk)
+        if scanner.feed(chunk):
+            strategy_stats.add(scanner.strategy)
+            return scanner.price, scanner.title, scanner.strategy, scanner.ends_at
+    return extract_with_strategy(''.join(seen), backend)
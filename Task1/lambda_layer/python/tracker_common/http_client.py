@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+# urllib3 decodes gzip and deflate itself, and br / zstd when the brotli (or brotlicffi)
+# / zstandard package is importable. Only what it can decode is advertised, so adding
+# one of those packages to the layer is enough to have eBay send the smaller encoding.
+DECODABLE_ENCODINGS = frozenset(ACCEPT_ENCODING.split(',')) | {'identity'}
+
+# header is added to prevent robot blocking
+CRAWL_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': ACCEPT_ENCODING.replace(',', ', '),
+    'Connection': 'keep-alive'
+}
+
+# Connection pool and timeout settings, overridable through the Lambda environment.
+# One page may take up to worst_case_seconds() (9 s with these values); keep that under
+# the price check's DEADLINE_MARGIN_MS (10 s) and the API Gateway timeout of the
+# signup (12 s) when changing them. READ_TIMEOUT bounds every socket read, not the
+# download: a page that keeps sending is cut off TOTAL_TIMEOUT after its request.
+POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 64))
+CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 1.5))
+READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 2.5))
+RETRIES = int(os.environ.get('HTTP_RETRIES', 1))
+RETRY_BACKOFF = float(os.environ.get('HTTP_RETRY_BACKOFF', 0.3))
+# Longest wait before a retry. A longer Retry-After sent with a 429/503 is cut to it;
+# a listing that refuses the retry too fails its check (requests' RetryError).
+MAX_RETRY_WAIT = float(os.environ.get('HTTP_MAX_RETRY_WAIT', 1))
+TOTAL_TIMEOUT = float(os.environ.get('HTTP_TOTAL_TIMEOUT', 6.5))
+BODY_CHUNK_SIZE = 16 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+
+
+# A page that was still downloading TOTAL_TIMEOUT after its request; like every
+# requests timeout it is a RequestException
+class DownloadTimeout(requests.exceptions.Timeout):
+    pass
+
+
+# urllib3 sleeps for whatever Retry-After the server sends; this caps it
+class CappedRetry(Retry):
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, self.backoff_max)
+
+
+# The request and its retries until the response headers arrive, or the body, which is
+# checked against TOTAL_TIMEOUT after every chunk and so may take one more read
+def worst_case_seconds(retries=RETRIES):
+    headers = (retries + 1) * (CONNECT_TIMEOUT + READ_TIMEOUT) + retries * MAX_RETRY_WAIT
+    return max(headers, TOTAL_TIMEOUT + READ_TIMEOUT)
+
+
+def build_session(pool_size=POOL_SIZE, retries=RETRIES, backoff=RETRY_BACKOFF):
+    retry = CappedRetry(
+        total=retries,
+        backoff_factor=backoff,
+        backoff_max=MAX_RETRY_WAIT,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True
+    )
+    # pool_maxsize keeps one idle keep-alive connection per crawl worker
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.headers.update(CRAWL_HEADERS)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+# The session lives at module level so warm invocations reuse open TCP+TLS connections
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+
+# GET url with the crawl timeouts. The body is always read through iter_body, so the
+# download stops at the response's deadline; with stream=True that is left to the caller.
+def fetch(url, stream=False, **kwargs):
+    kwargs.setdefault('timeout', (CONNECT_TIMEOUT, READ_TIMEOUT))
+    deadline = time.monotonic() + TOTAL_TIMEOUT
+    response = get_session().get(url, stream=True, **kwargs)
+    response.deadline = deadline
+    if not stream:
+        # what Response.content does, with the deadline checked between chunks
+        response._content = b''.join(iter_body(response, BODY_CHUNK_SIZE))
+        response._content_consumed = True
+    return response
+
+
+# Decoded body chunks of a streamed response; closes it and raises DownloadTimeout once
+# its deadline (set by fetch) has passed
+def iter_body(response, chunk_size):
+    deadline = getattr(response, 'deadline', None)
+    for chunk in response.iter_content(chunk_size):
+        if deadline is not None and time.monotonic() > deadline:
+            response.close()
+            raise DownloadTimeout(f"Download of {response.url} took longer than {TOTAL_TIMEOUT}s")
+        yield chunk
@@ -0,0 +1,141 @@
+import collections
+import os
+import threading
+import time
+from tracker_common.ebay_url import item_key
+
+# Parsed (title, price, listing end) observations of a listing, kept for OBSERVATION_TTL_SECONDS
+# so a page read a moment ago is not crawled again within the container.
+# OBSERVATION_CACHE picks the store behind the in-process LRU: 'memory' or 'none'.
+# Nothing is shared through the table: a signup already reuses the tracked item when
+# it was checked recently, and the first price check of a new item comes at least
+# MIN_CHECK_INTERVAL after its signup, when an observation would have expired.
+OBSERVATION_CACHE = os.environ.get('OBSERVATION_CACHE', 'memory')
+OBSERVATION_TTL_SECONDS = int(os.environ.get('OBSERVATION_TTL_SECONDS', 5 * 60))
+OBSERVATION_LRU_SIZE = int(os.environ.get('OBSERVATION_LRU_SIZE', 2048))
+
+
+# Per-run counters, reset by the handler at the start of every invocation
+class ObservationStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.lookups = 0
+            self.lru_hits = 0
+            self.store_hits = 0
+            self.ages = []
+
+    def add_hit(self, layer, age):
+        with self._lock:
+            if layer == 'lru':
+                self.lru_hits += 1
+            else:
+                self.store_hits += 1
+            self.ages.append(age)
+
+    def add_lookup(self):
+        with self._lock:
+            self.lookups += 1
+
+    def report(self):
+        with self._lock:
+            hits = self.lru_hits + self.store_hits
+            return {
+                'lookups': self.lookups,
+                'lru_hits': self.lru_hits,
+                'store_hits': self.store_hits,
+                'hit_ratio': round(hits / self.lookups, 3) if self.lookups else 0.0,
+                'served_age_avg': round(sum(self.ages) / len(self.ages), 1) if self.ages else None,
+                'served_age_max': round(max(self.ages), 1) if self.ages else None
+            }
+
+
+stats = ObservationStats()
+
+
+class MemoryObservationStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._observations = {}
+
+    def get(self, key):
+        with self._lock:
+            return self._observations.get(key)
+
+    def put(self, key, observation):
+        with self._lock:
+            self._observations[key] = observation
+
+
+# In-process LRU in front of a store. Observations older than ttl_seconds are never served.
+class ObservationCache:
+    def __init__(self, store=None, ttl_seconds=OBSERVATION_TTL_SECONDS, lru_size=OBSERVATION_LRU_SIZE):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.lru_size = lru_size
+        self._lock = threading.Lock()
+        self._lru = collections.OrderedDict()
+
+    def _fresh(self, observation, now):
+        return observation is not None and now - observation['fetched_at'] < self.ttl_seconds
+
+    def _remember(self, key, observation):
+        with self._lock:
+            self._lru[key] = observation
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def get(self, key, now=None):
+        now = time.time() if now is None else now
+        stats.add_lookup()
+        with self._lock:
+            observation = self._lru.get(key)
+            if observation is not None:
+                self._lru.move_to_end(key)
+        if self._fresh(observation, now):
+            stats.add_hit('lru', now - observation['fetched_at'])
+            return observation
+        if self.store is None:
+            return None
+        observation = self.store.get(key)
+        if not self._fresh(observation, now):
+            return None
+        self._remember(key, observation)
+        stats.add_hit('store', now - observation['fetched_at'])
+        return observation
+
+    def put(self, key, price, title, strategy=None, ends_at=None, now=None):
+        observation = {
+            'title': title,
+            'price': price,
+            'fetched_at': int(time.time() if now is None else now),
+            'strategy': strategy,
+            'ends_at': ends_at
+        }
+        self._remember(key, observation)
+        if self.store is not None:
+            self.store.put(key, observation)
+        return observation
+
+    # (price, title, ends_at) of the listing at url: a fresh observation when there is one,
+    # otherwise crawl(url) -> (price, title, strategy, ends_at), remembered when it found
+    # both price and title
+    def crawl(self, url, crawl):
+        key = item_key(url)
+        observation = self.get(key)
+        if observation is not None:
+            return observation['price'], observation['title'], observation.get('ends_at')
+        price, title, strategy, ends_at = crawl(url)
+        if price is not None and title is not None:
+            self.put(key, price, title, strategy, ends_at)
+        return price, title, ends_at
+
+
+def open_cache(kind=OBSERVATION_CACHE):
+    if kind == 'memory':
+        return ObservationCache(MemoryObservationStore())
+    return ObservationCache(lru_size=0)
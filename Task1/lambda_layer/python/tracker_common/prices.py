@@ -0,0 +1,16 @@
+from decimal import Decimal, InvalidOperation
+
+# Prices are stored as DynamoDB Numbers (Decimal in boto3) so that conditions such as
+# "lowest_price > :price" compare them numerically. Items written before that hold
+# strings like "19.99"; they are converted the next time the price is written.
+
+
+# "19.99", Decimal('19.99') -> Decimal('19.99'); None, unparseable, NaN or infinite -> None
+def price_number(price):
+    if price is None:
+        return None
+    try:
+        number = Decimal(str(price))
+    except InvalidOperation:
+        return None
+    return number if number.is_finite() else None
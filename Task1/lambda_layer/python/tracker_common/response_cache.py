@@ -0,0 +1,324 @@
+import codecs
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit, urlunsplit
+from requests.exceptions import ContentDecodingError
+from tracker_common.http_client import DECODABLE_ENCODINGS, fetch, iter_body
+
+logger = logging.getLogger()
+
+# /tmp survives between warm invocations of the same Lambda container
+CACHE_DIR = os.environ.get('RESPONSE_CACHE_DIR', '/tmp/ebay-cache')
+CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_MB', 256)) * 1024 * 1024
+CACHE_ENABLED = os.environ.get('RESPONSE_CACHE', 'true').lower() == 'true'
+
+# Stream pages to incremental parsers and drop the connection once they have what they
+# need. An early close costs a new connection for the next request and a streamed page
+# is cached without its body, so this is off by default, and even when on a page whose
+# Content-Length is below STREAM_MIN_BYTES is read whole: the rest of it is cheaper to
+# read than a reconnect.
+STREAM_PAGES = os.environ.get('STREAM_PAGES', 'false').lower() == 'true'
+STREAM_MIN_BYTES = int(os.environ.get('STREAM_MIN_BYTES', 1024 * 1024))
+STREAM_CHUNK_SIZE = 16 * 1024
+
+
+# Item pages differ only by tracking parameters and fragments, so key on scheme+host+path
+def canonical_url(url):
+    parts = urlsplit(url.strip())
+    return urlunsplit(('https', parts.netloc.lower(), parts.path.rstrip('/'), '', ''))
+
+
+def content_hash(body):
+    return hashlib.sha256(body).hexdigest()
+
+
+# Per-run counters, reset by the handler at the start of every invocation
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.conditional = 0
+            self.not_modified = 0
+            self.unchanged = 0
+            self.bytes_saved = 0
+            self.parse_seconds = 0.0
+            self.parse_seconds_saved = 0.0
+            self.streamed = 0
+            self.stopped_early = 0
+            self.bytes_read = 0
+            self.page_bytes = 0
+            self.page_size_unknown = 0
+            self.read_ratios = []
+            self.encodings = {}
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    # Bytes on the wire and after decoding, per Content-Encoding
+    def add_encoding(self, encoding, wire_bytes, decoded_bytes):
+        with self._lock:
+            counts = self.encodings.setdefault(encoding, {'responses': 0, 'wire_bytes': 0, 'decoded_bytes': 0})
+            counts['responses'] += 1
+            counts['wire_bytes'] += wire_bytes
+            counts['decoded_bytes'] += decoded_bytes
+
+    # One streamed page whose full size is known
+    def add_read_ratio(self, bytes_read, page_bytes):
+        with self._lock:
+            self.read_ratios.append(bytes_read / page_bytes if page_bytes else 1.0)
+
+    def _read_ratio_percentile(self, share):
+        ratios = sorted(self.read_ratios)
+        return round(ratios[min(len(ratios) - 1, int(len(ratios) * share))], 3) if ratios else None
+
+    @property
+    def hits(self):
+        return self.not_modified + self.unchanged
+
+    def report(self):
+        hit_rate = self.hits / self.requests if self.requests else 0.0
+        return {
+            'requests': self.requests,
+            'conditional_requests': self.conditional,
+            'not_modified': self.not_modified,
+            'unchanged_content': self.unchanged,
+            'hit_rate': round(hit_rate, 3),
+            'bytes_saved': self.bytes_saved,
+            'parse_seconds': round(self.parse_seconds, 3),
+            'parse_seconds_saved': round(self.parse_seconds_saved, 3),
+            'streamed': self.streamed,
+            'stopped_early': self.stopped_early,
+            'bytes_read': self.bytes_read,
+            'page_bytes': self.page_bytes,
+            'read_ratio': round(self.bytes_read / self.page_bytes, 3) if self.page_bytes else None,
+            # per streamed page: bytes read and full page size, on average, and the
+            # spread of the share of each page that was read
+            'bytes_read_per_page': round(self.bytes_read / len(self.read_ratios)) if self.read_ratios else None,
+            'page_bytes_per_page': round(self.page_bytes / len(self.read_ratios)) if self.read_ratios else None,
+            'read_ratio_p50': self._read_ratio_percentile(0.5),
+            'read_ratio_p90': self._read_ratio_percentile(0.9),
+            'page_size_unknown': self.page_size_unknown,
+            'encodings': {name: dict(counts) for name, counts in self.encodings.items()}
+        }
+
+
+stats = CacheStats()
+
+
+# One zlib-compressed file per canonical URL: a JSON line with the validators and
+# the last parse result, followed by the raw page body
+class ResponseCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.json.z')
+
+    # Cache files, without the temporary files of writes in progress
+    def _entries(self):
+        return [entry for entry in os.scandir(self.directory) if entry.name.endswith('.json.z')]
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                meta, body = zlib.decompress(f.read()).split(b'\n', 1)
+            entry = json.loads(meta)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, zlib.error) as e:
+            logger.warning(f"Dropping unreadable cache entry for {key}: {e}")
+            return None
+        entry['body'] = body
+        return entry
+
+    def put(self, key, entry):
+        meta = {name: value for name, value in entry.items() if name != 'body'}
+        data = zlib.compress(json.dumps(meta).encode() + b'\n' + entry['body'], 6)
+        path = self._path(key)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            # a rewritten entry only adds the difference to the directory size
+            try:
+                replaced = os.stat(path).st_size
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write cache entry for {key}: {e}")
+            return
+        self._account(len(data) - replaced)
+
+    # Keep the directory under max_bytes by dropping the least recently written entries
+    def _account(self, added):
+        with self._lock:
+            if self._size is None:
+                self._size = sum(entry.stat().st_size for entry in self._entries())
+            else:
+                self._size += added
+            if self._size <= self.max_bytes:
+                return
+            entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+            for entry in entries:
+                if self._size <= self.max_bytes * 0.8:
+                    break
+                try:
+                    self._size -= entry.stat().st_size
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+
+cache = ResponseCache()
+
+
+# Content-Encoding of a response; one that urllib3 cannot decode would hand the parser
+# compressed bytes, so it is treated like any other failed download
+def _content_encoding(response):
+    encoding = response.headers.get('Content-Encoding', '').strip().lower() or 'identity'
+    undecodable = [name for name in encoding.replace(' ', '').split(',') if name not in DECODABLE_ENCODINGS]
+    if undecodable:
+        response.close()
+        raise ContentDecodingError(f"Cannot decode Content-Encoding {encoding} from {response.url}")
+    return encoding
+
+
+# A streamed response is only parsed while it downloads when it is not known to be short
+def _worth_streaming(response):
+    length = response.headers.get('Content-Length')
+    return not (length and length.isdigit() and int(length) < STREAM_MIN_BYTES)
+
+
+# Read a streamed response through parse_stream and close it as soon as the parser
+# returns. Sizes are bytes on the wire; the full size of a page that was not read to
+# the end is only known from its Content-Length. Returns (result, page size as far as known).
+def _parse_streamed(url, response, parse_stream, content_encoding):
+    chunks_left = [True]
+    decoded_bytes = [0]
+
+    def chunks():
+        decoder = codecs.getincrementaldecoder(response.encoding)(errors='replace')
+        for chunk in iter_body(response, STREAM_CHUNK_SIZE):
+            decoded_bytes[0] += len(chunk)
+            yield decoder.decode(chunk)
+        yield decoder.decode(b'', final=True)
+        chunks_left[0] = False
+
+    try:
+        result = parse_stream(chunks())
+        bytes_read = response.raw.tell()
+    finally:
+        response.close()
+    stopped_early = chunks_left[0]
+    length = response.headers.get('Content-Length')
+    page_bytes = int(length) if length and length.isdigit() else None if stopped_early else bytes_read
+    stats.add(
+        streamed=1,
+        stopped_early=1 if stopped_early else 0,
+        bytes_read=bytes_read if page_bytes is not None else 0,
+        page_bytes=page_bytes or 0,
+        page_size_unknown=1 if page_bytes is None else 0
+    )
+    if page_bytes is not None:
+        stats.add_read_ratio(bytes_read, page_bytes)
+    stats.add_encoding(content_encoding, bytes_read, decoded_bytes[0])
+    logger.info(f"Read {bytes_read} of {page_bytes if page_bytes is not None else '?'} bytes of {url}")
+    return result, page_bytes or bytes_read
+
+
+# Fetch an item page through the cache and return parse(html).
+# A cached page is revalidated with If-None-Match / If-Modified-Since; on 304 the
+# stored parse result is reused without downloading or parsing the page. When eBay
+# sends no validators, a body with the same content hash as the cached one is not
+# parsed again either. Network errors propagate as requests exceptions.
+# With parse_stream (an incremental version of parse, taking an iterator of text
+# chunks) and STREAM_PAGES on, a changed page of at least STREAM_MIN_BYTES (or of
+# unknown size) is streamed to it instead and the download stops as soon as it
+# returns; such pages are cached without their body, so only the 304 path applies to them.
+def crawl_page(url, parse, parse_stream=None):
+    parser = getattr(parse, '__name__', 'parse')
+    key = canonical_url(url)
+    entry = cache.get(key) if CACHE_ENABLED else None
+    if entry is not None and entry.get('partial') and entry.get('parser') != parser:
+        # nothing to parse again without the page
+        entry = None
+    stream = parse_stream is not None and STREAM_PAGES
+
+    headers = {}
+    if entry is not None:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+    response = fetch(url, headers=headers, stream=True) if stream else fetch(url, headers=headers)
+    if stream and response.status_code >= 400:
+        response.close()
+    response.raise_for_status()
+    stats.add(requests=1, conditional=1 if headers else 0)
+
+    if response.status_code == 304 and entry is not None:
+        if stream:
+            response.close()
+        stats.add(not_modified=1, bytes_saved=entry['size'])
+        body, encoding = entry['body'], entry['encoding']
+    elif stream and _worth_streaming(response):
+        content_encoding = _content_encoding(response)
+        body, encoding = None, response.encoding or 'utf-8'
+        response.encoding = encoding
+        entry = None
+    else:
+        content_encoding = _content_encoding(response)
+        body, encoding = response.content, response.encoding or 'utf-8'
+        stats.add_encoding(content_encoding, response.raw.tell(), len(body))
+        if entry is not None and entry['hash'] == content_hash(body):
+            stats.add(unchanged=1)
+        else:
+            entry = None
+
+    if entry is not None and entry.get('parser') == parser:
+        stats.add(parse_seconds_saved=entry['parse_seconds'])
+        return tuple(entry['result'])
+
+    if body is None:
+        # parsing overlaps the download here, so it is not timed
+        result, size = _parse_streamed(url, response, parse_stream, content_encoding)
+        parse_seconds = 0.0
+    else:
+        started = time.perf_counter()
+        result = parse(body.decode(encoding, errors='replace'))
+        parse_seconds = time.perf_counter() - started
+        size = len(body)
+        stats.add(parse_seconds=parse_seconds)
+
+    if CACHE_ENABLED:
+        cache.put(key, {
+            'url': key,
+            'etag': response.headers.get('ETag') or (entry or {}).get('etag'),
+            'last_modified': response.headers.get('Last-Modified') or (entry or {}).get('last_modified'),
+            'hash': content_hash(body) if body is not None else None,
+            'size': size,
+            'partial': body is None,
+            'encoding': encoding,
+            'body': body if body is not None else b'',
+            'parser': parser,
+            'result': list(result),
+            'parse_seconds': parse_seconds,
+            'fetched_at': int(time.time())
+        })
+    return result
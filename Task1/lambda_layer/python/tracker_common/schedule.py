@@ -0,0 +1,128 @@
+import math
+import os
+import time
+import zlib
+from decimal import Decimal
+from tracker_common.prices import price_number
+
+# Items are spread over CHECK_SHARDS partitions of the due-index GSI
+# (hash key check_shard, range key next_check_at) so no single partition runs hot
+DUE_INDEX = os.environ.get('DUE_INDEX', 'due-index')
+CHECK_SHARDS = int(os.environ.get('CHECK_SHARDS', 6))
+
+# Scheduling wheel: the tracked set is split into TIME_SLICES slices and the
+# scheduled Lambda, triggered at every multiple of SLICE_SECONDS, handles one slice per run.
+# CHECK_SHARDS should be a multiple of TIME_SLICES so every slice gets shards.
+TIME_SLICES = int(os.environ.get('TIME_SLICES', 1))
+SLICE_SECONDS = int(os.environ.get('SLICE_SECONDS', 30 * 60))
+
+# Check interval bounds in seconds. BASE_INTERVAL is the old fixed 30 minute rate,
+# which a quiet listing with one subscriber starts from.
+BASE_INTERVAL = int(os.environ.get('BASE_CHECK_INTERVAL', 30 * 60))
+MIN_INTERVAL = int(os.environ.get('MIN_CHECK_INTERVAL', 10 * 60))
+MAX_INTERVAL = int(os.environ.get('MAX_CHECK_INTERVAL', 24 * 3600))
+
+# Weight of the latest observation in the volatility moving average
+VOLATILITY_WEIGHT = 0.2
+
+
+def check_shard(url):
+    return zlib.crc32(url.encode()) % CHECK_SHARDS
+
+
+# Slice of the wheel an invocation at `now` handles. The trigger is a cron schedule
+# aligned to multiples of SLICE_SECONDS (which divides an hour), and EventBridge fires
+# it at or shortly after that time, so the tick it started in is the one to take.
+def current_slice(now=None):
+    now = time.time() if now is None else now
+    return int(now // SLICE_SECONDS) % TIME_SLICES
+
+
+# due-index shards that belong to a slice
+def slice_shards(slot):
+    return [shard for shard in range(CHECK_SHARDS) if shard % TIME_SLICES == slot]
+
+
+# Parallel scan segments that belong to a slice when the table is scanned as
+# TIME_SLICES * segments_per_slice segments: DynamoDB splits the table by key hash,
+# so each slice reads a disjoint, evenly sized part of it
+def slice_segments(slot, segments_per_slice):
+    return [slot * segments_per_slice + k for k in range(segments_per_slice)]
+
+
+# Exponential moving average of "the price changed since the previous check", in [0, 1]
+def update_volatility(volatility, changed):
+    return (1 - VOLATILITY_WEIGHT) * volatility + VOLATILITY_WEIGHT * (1.0 if changed else 0.0)
+
+
+# Seconds until the next check of a listing:
+# - every day without a price change adds one BASE_INTERVAL,
+# - volatile listings are checked up to 4x more often,
+# - more subscribers shorten the interval logarithmically,
+# - a listing about to end is checked at least 4 times in its remaining time,
+#   an ended one only once a day.
+def check_interval(volatility, quiet_seconds, subscribers=1, ends_at=None, now=None):
+    now = time.time() if now is None else now
+    interval = BASE_INTERVAL * (1 + quiet_seconds / 86400)
+    interval *= 1 - 0.75 * min(max(volatility, 0.0), 1.0)
+    interval /= 1 + 0.25 * math.log2(max(subscribers, 1))
+    if ends_at is not None:
+        remaining = ends_at - now
+        if remaining <= 0:
+            return MAX_INTERVAL
+        interval = min(interval, remaining / 4)
+    return int(min(max(interval, MIN_INTERVAL), MAX_INTERVAL))
+
+
+# Schedule attributes to store after a successful check that observed current_price
+# and, if the page said, the listing end time ends_at (else the stored one is used)
+def next_schedule(item, current_price, now=None, ends_at=None):
+    return check_schedule(
+        item['url'],
+        current_price,
+        item.get('last_price'),
+        item.get('last_change_at'),
+        item.get('volatility'),
+        len(item.get('subscribers', [])),
+        ends_at if ends_at is not None else item.get('listing_ends_at'),
+        now
+    )
+
+
+# next_schedule from the item's values, for callers that do not hold the item as a dict
+def check_schedule(url, current_price, last_price=None, last_change_at=None, volatility=None,
+                   subscribers=0, ends_at=None, now=None):
+    now = int(time.time() if now is None else now)
+    changed = last_price is not None and float(last_price) != float(current_price)
+    volatility = update_volatility(float(volatility or 0), changed)
+    last_change_at = now if changed or last_change_at is None else int(last_change_at)
+    ends_at = int(ends_at) if ends_at is not None else None
+    interval = check_interval(volatility, now - last_change_at, subscribers or 1, ends_at, now)
+    schedule = {
+        'check_shard': check_shard(url),
+        'next_check_at': now + interval,
+        'last_checked_at': now,
+        'last_price': price_number(current_price),
+        'last_change_at': last_change_at,
+        'volatility': Decimal(str(round(volatility, 4)))
+    }
+    if ends_at is not None:
+        schedule['listing_ends_at'] = ends_at
+    return schedule
+
+
+# Schedule attributes to store after a failed check: try again after the shortest
+# interval, doubled for every check in a row that failed before (failed_checks)
+def failure_schedule(url, failed_checks=0, now=None):
+    now = int(time.time() if now is None else now)
+    failures = min(int(failed_checks), 16)
+    return {
+        'check_shard': check_shard(url),
+        'next_check_at': now + min(MIN_INTERVAL * 2 ** failures, MAX_INTERVAL),
+        'last_checked_at': now
+    }
+
+
+# Schedule attributes for a listing that was just added with its first observed price
+def initial_schedule(url, current_price, now=None, ends_at=None):
+    return next_schedule({'url': url}, current_price, now, ends_at)
@@ -0,0 +1,198 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+from tracker_common.aws_clients import get_client
+
+logger = logging.getLogger()
+
+# Where asynchronous signups are queued: an SQS queue URL in AWS, 'sqlite:///path/to.db'
+# or 'memory://' for local runs
+SIGNUP_QUEUE_URL = os.environ.get('SIGNUP_QUEUE_URL', 'memory://')
+# A failed message becomes visible again after RETRY_DELAY_SECONDS * 2^(attempts - 1)
+RETRY_DELAY_SECONDS = 5
+MAX_ATTEMPTS = 5
+
+# id: the backend's message id; receipt: what ack/retry need; attempts: deliveries so far
+Message = namedtuple('Message', 'id receipt body attempts')
+
+
+# Every backend offers send(body) -> id, receive(max_messages, visibility_seconds) -> [Message],
+# ack(message) and retry(message, delay_seconds). A received message stays invisible to
+# other consumers for visibility_seconds unless it is acked or retried first.
+class MemoryQueue:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._messages = {}
+
+    def send(self, body):
+        message_id = uuid.uuid4().hex
+        with self._lock:
+            self._messages[message_id] = {'body': json.dumps(body), 'attempts': 0, 'visible_at': 0.0}
+        return message_id
+
+    def receive(self, max_messages=10, visibility_seconds=30):
+        now = time.time()
+        batch = []
+        with self._lock:
+            for message_id, message in self._messages.items():
+                if len(batch) == max_messages:
+                    break
+                if message['visible_at'] <= now:
+                    message['attempts'] += 1
+                    message['visible_at'] = now + visibility_seconds
+                    batch.append(Message(message_id, message_id, json.loads(message['body']), message['attempts']))
+        return batch
+
+    def ack(self, message):
+        with self._lock:
+            self._messages.pop(message.receipt, None)
+
+    def retry(self, message, delay_seconds=0):
+        with self._lock:
+            if message.receipt in self._messages:
+                self._messages[message.receipt]['visible_at'] = time.time() + delay_seconds
+
+    def __len__(self):
+        with self._lock:
+            return len(self._messages)
+
+
+# Same as MemoryQueue, kept in a SQLite file so several local processes can share it
+class SQLiteQueue:
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS signups '
+            '(id TEXT PRIMARY KEY, body TEXT NOT NULL, attempts INTEGER NOT NULL, visible_at REAL NOT NULL)'
+        )
+
+    def send(self, body):
+        message_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute('INSERT INTO signups VALUES (?, ?, 0, 0)', (message_id, json.dumps(body)))
+        return message_id
+
+    def receive(self, max_messages=10, visibility_seconds=30):
+        now = time.time()
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self._db.execute(
+                    'SELECT id, body, attempts FROM signups WHERE visible_at <= ? ORDER BY rowid LIMIT ?',
+                    (now, max_messages)
+                ).fetchall()
+                self._db.executemany(
+                    'UPDATE signups SET attempts = attempts + 1, visible_at = ? WHERE id = ?',
+                    [(now + visibility_seconds, message_id) for message_id, _, _ in rows]
+                )
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+        return [Message(message_id, message_id, json.loads(body), attempts + 1) for message_id, body, attempts in rows]
+
+    def ack(self, message):
+        with self._lock:
+            self._db.execute('DELETE FROM signups WHERE id = ?', (message.receipt,))
+
+    def retry(self, message, delay_seconds=0):
+        with self._lock:
+            self._db.execute('UPDATE signups SET visible_at = ? WHERE id = ?', (time.time() + delay_seconds, message.receipt))
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM signups').fetchone()[0]
+
+
+class SQSQueue:
+    def __init__(self, queue_url, client=None):
+        self.queue_url = queue_url
+        self.client = client or get_client('sqs')
+
+    def send(self, body):
+        return self.client.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(body))['MessageId']
+
+    def receive(self, max_messages=10, visibility_seconds=30):
+        response = self.client.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=min(max_messages, 10),
+            VisibilityTimeout=visibility_seconds,
+            AttributeNames=['ApproximateReceiveCount']
+        )
+        return [
+            Message(
+                message['MessageId'],
+                message['ReceiptHandle'],
+                json.loads(message['Body']),
+                int(message['Attributes']['ApproximateReceiveCount'])
+            )
+            for message in response.get('Messages', [])
+        ]
+
+    def ack(self, message):
+        self.client.delete_message(QueueUrl=self.queue_url, ReceiptHandle=message.receipt)
+
+    def retry(self, message, delay_seconds=0):
+        self.client.change_message_visibility(
+            QueueUrl=self.queue_url,
+            ReceiptHandle=message.receipt,
+            VisibilityTimeout=int(delay_seconds)
+        )
+
+
+# Messages of an SQS event delivered to Lambda by an event source mapping
+def messages_from_event(records):
+    return [
+        Message(
+            record['messageId'],
+            record['receiptHandle'],
+            json.loads(record['body']),
+            int(record['attributes']['ApproximateReceiveCount'])
+        )
+        for record in records
+    ]
+
+
+_memory_queue = MemoryQueue()
+
+
+def open_queue(url=SIGNUP_QUEUE_URL):
+    if url.startswith('memory://'):
+        return _memory_queue
+    if url.startswith('sqlite://'):
+        return SQLiteQueue(url[len('sqlite://'):])
+    return SQSQueue(url)
+
+
+# Local worker loop: hand every visible message to process(body) in batches of
+# batch_size until none is left. A failed message is retried with exponential backoff
+# and dropped (logged as dead) after max_attempts deliveries. In AWS the SQS event
+# source mapping and the queue's redrive policy do the same.
+# Returns (processed, retried, dead).
+def drain(queue, process, batch_size=10, max_attempts=MAX_ATTEMPTS, visibility_seconds=30):
+    processed = retried = dead = 0
+    while True:
+        batch = queue.receive(batch_size, visibility_seconds)
+        if not batch:
+            return processed, retried, dead
+        for message in batch:
+            try:
+                process(message.body)
+            except Exception as e:
+                if message.attempts >= max_attempts:
+                    logger.error(f"Dropping message {message.id} after {message.attempts} attempts: {str(e)}")
+                    queue.ack(message)
+                    dead += 1
+                else:
+                    logger.warning(f"Message {message.id} failed (attempt {message.attempts}), retrying: {str(e)}")
+                    queue.retry(message, RETRY_DELAY_SECONDS * 2 ** (message.attempts - 1))
+                    retried += 1
+                continue
+            queue.ack(message)
+            processed += 1
@@ -0,0 +1,130 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+# Leases live in the tracking table under reserved hash keys; like every reserved
+# record they start with '#' and the price check skips them. expires_at is the
+# table's TTL attribute, so DynamoDB removes old leases on its own.
+LEASE_PREFIX = '#lease#'
+LEASE_SECONDS = int(os.environ.get('SIGNUP_LEASE_SECONDS', 20))
+# How long a signup waits for another invocation's lease before giving up; below the
+# 12 s API Gateway integration timeout
+LEASE_WAIT_SECONDS = float(os.environ.get('SIGNUP_LEASE_WAIT_SECONDS', 8))
+LEASE_POLL_SECONDS = 0.25
+
+
+class LeaseTimeout(Exception):
+    pass
+
+
+# In-process coalescing: concurrent do(key, fn) calls with the same key run fn once
+# and all get its result (or its exception)
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if leader:
+            try:
+                future.set_result(fn())
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    del self._calls[key]
+        return future.result()
+
+
+def _is_conditional_failure(e):
+    return e.response['Error']['Code'] == 'ConditionalCheckFailedException'
+
+
+# Take the lease on key unless another owner holds one that has not expired
+def acquire_lease(table, key, owner, now=None):
+    now = int(time.time() if now is None else now)
+    try:
+        table.put_item(
+            Item={'url': LEASE_PREFIX + key, 'owner': owner, 'expires_at': now + LEASE_SECONDS},
+            ConditionExpression='attribute_not_exists(#u) OR expires_at < :now',
+            ExpressionAttributeNames={'#u': 'url'},
+            ExpressionAttributeValues={':now': now}
+        )
+        return True
+    except ClientError as e:
+        if _is_conditional_failure(e):
+            return False
+        raise
+
+
+# Publish the owner's result on its lease, for the invocations waiting on it
+def complete_lease(table, key, owner, result):
+    try:
+        table.update_item(
+            Key={'url': LEASE_PREFIX + key},
+            UpdateExpression='SET #r = :result, expires_at = :expires_at',
+            ConditionExpression='#o = :owner',
+            ExpressionAttributeNames={'#r': 'result', '#o': 'owner'},
+            ExpressionAttributeValues={
+                ':result': result,
+                ':owner': owner,
+                ':expires_at': int(time.time()) + LEASE_SECONDS
+            }
+        )
+    except ClientError as e:
+        if not _is_conditional_failure(e):
+            raise
+        logger.warning(f"Lease on {key} expired before the result was stored.")
+
+
+# Give the lease up without a result, so a waiting invocation can take over
+def release_lease(table, key, owner):
+    try:
+        table.delete_item(
+            Key={'url': LEASE_PREFIX + key},
+            ConditionExpression='#o = :owner',
+            ExpressionAttributeNames={'#o': 'owner'},
+            ExpressionAttributeValues={':owner': owner}
+        )
+    except ClientError as e:
+        if not _is_conditional_failure(e):
+            raise
+
+
+def read_lease(table, key):
+    return table.get_item(Key={'url': LEASE_PREFIX + key}, ConsistentRead=True).get('Item')
+
+
+# Cross-invocation coalescing: only the invocation holding the lease on key runs
+# create(); the others poll the lease until its result is published and return that.
+# When the holder fails (its lease is released) or dies (its lease expires), one of
+# the waiters takes over. create() must return a string.
+def coalesce(table, key, create, wait_seconds=LEASE_WAIT_SECONDS):
+    owner = uuid.uuid4().hex
+    deadline = time.monotonic() + wait_seconds
+    while True:
+        if acquire_lease(table, key, owner):
+            try:
+                result = create()
+            except Exception:
+                release_lease(table, key, owner)
+                raise
+            complete_lease(table, key, owner, result)
+            return result
+        lease = read_lease(table, key)
+        if lease is not None and 'result' in lease:
+            return lease['result']
+        if time.monotonic() >= deadline:
+            raise LeaseTimeout(f"Timed out waiting for the lease on {key}")
+        time.sleep(LEASE_POLL_SECONDS)
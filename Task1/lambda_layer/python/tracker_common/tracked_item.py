@@ -0,0 +1,90 @@
+from decimal import Decimal
+from operator import attrgetter
+
+
+# One tracked listing as the Task2 price check reads it: a fixed set of slots instead
+# of a dict per item, holding only what the check uses. The subscriber list is kept
+# as its length, the only thing the schedule needs. failed_checks, read only after a
+# failed check, stays the raw number string until it is asked for. next_check_at is
+# the schedule the item was read with, part of its due-index key.
+# lowest_price is a Decimal, or the stored string for rows written before prices
+# were Numbers.
+class TrackedItem:
+    __slots__ = ('url', 'lowest_price', 'sns_arn', 'subscriber_count', 'last_price', 'last_change_at',
+                 'volatility', 'listing_ends_at', '_failed_checks', 'next_check_at')
+
+    def __init__(self, url, lowest_price=None, sns_arn=None, subscriber_count=0, last_price=None,
+                 last_change_at=None, volatility=None, listing_ends_at=None, failed_checks=None,
+                 next_check_at=None):
+        self.url = url
+        self.lowest_price = lowest_price
+        self.sns_arn = sns_arn
+        self.subscriber_count = subscriber_count
+        self.last_price = last_price
+        self.last_change_at = last_change_at
+        self.volatility = volatility
+        self.listing_ends_at = listing_ends_at
+        self._failed_checks = failed_checks
+        self.next_check_at = next_check_at
+
+    @property
+    def failed_checks(self):
+        return int(self._failed_checks) if self._failed_checks is not None else 0
+
+    # Build from an item in the resource format (a dict of Python values)
+    @classmethod
+    def from_item(cls, item):
+        last_change_at = item.get('last_change_at')
+        ends_at = item.get('listing_ends_at')
+        failed_checks = item.get('failed_checks')
+        next_check_at = item.get('next_check_at')
+        return cls(
+            item['url'],
+            item.get('lowest_price'),
+            item.get('SNS_ARN'),
+            len(item.get('subscribers', [])),
+            _float(item.get('last_price')),
+            int(last_change_at) if last_change_at is not None else None,
+            _float(item.get('volatility')),
+            int(ends_at) if ends_at is not None else None,
+            str(failed_checks) if failed_checks is not None else None,
+            int(next_check_at) if next_check_at is not None else None
+        )
+
+    def __repr__(self):
+        return f"TrackedItem({self.url!r}, lowest_price={self.lowest_price!r})"
+
+
+def _float(value):
+    return float(value) if value is not None else None
+
+
+def _number(value, convert):
+    return convert(value['N']) if value is not None and 'N' in value else None
+
+
+# Decoder for ClientTable: builds a TrackedItem straight from an item in the low-level
+# wire format, without an intermediate dict of decoded values
+def decode_tracked_item(item):
+    lowest_price = item.get('lowest_price')
+    if lowest_price is not None:
+        lowest_price = Decimal(lowest_price['N']) if 'N' in lowest_price else lowest_price.get('S')
+    sns_arn = item.get('SNS_ARN')
+    subscribers = item.get('subscribers')
+    failed_checks = item.get('failed_checks')
+    return TrackedItem(
+        item['url']['S'],
+        lowest_price,
+        sns_arn.get('S') if sns_arn is not None else None,
+        len(subscribers.get('L', ())) if subscribers is not None else 0,
+        _number(item.get('last_price'), float),
+        _number(item.get('last_change_at'), int),
+        _number(item.get('volatility'), float),
+        _number(item.get('listing_ends_at'), int),
+        failed_checks.get('N') if failed_checks is not None else None,
+        _number(item.get('next_check_at'), int)
+    )
+
+
+# url_of for crawl_concurrently
+item_url = attrgetter('url')
@@ -0,0 +1,233 @@
+import collections
+import logging
+import os
+import threading
+import time
+from botocore.exceptions import ClientError
+from tracker_common.capacity import CapacityBucket, THROTTLING_ERRORS
+from tracker_common.dynamo_client import ClientTable
+
+logger = logging.getLogger()
+
+# Write capacity units per second the deferred writes may use, and how many unused
+# units they may spend at once. DynamoDB itself keeps up to five minutes of unused
+# capacity as burst; only part of it is taken here so signups still find some.
+WRITE_CAPACITY_UNITS = float(os.environ.get('WRITE_CAPACITY_UNITS', 1))
+WRITE_BURST_UNITS = float(os.environ.get('WRITE_BURST_UNITS', 30))
+# A throttled update is retried after BACKOFF_SECONDS * 2^(attempts - 1)
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 0.5
+
+
+# The worker writes through the low-level client of the table's resource, which is
+# thread safe and shared for the life of the container, so a run opens no session or
+# connection pool of its own
+def _client_table(table):
+    return table if isinstance(table, ClientTable) else ClientTable(table)
+
+
+# Per-run counters of a WriteBehind
+class WriteStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.coalesced = 0
+        self.writes = 0
+        self.consumed_units = 0.0
+        self.throttled = 0
+        self.missing = 0
+        self.failed = 0
+        self.dropped = 0
+        self.flush_seconds = 0.0
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def report(self):
+        with self._lock:
+            return {
+                'queued': self.queued,
+                'coalesced': self.coalesced,
+                'writes': self.writes,
+                'consumed_units': round(self.consumed_units, 1),
+                'throttled': self.throttled,
+                'missing': self.missing,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'flush_seconds': round(self.flush_seconds, 2)
+            }
+
+
+# One pending UpdateItem: attributes to SET and counters to ADD
+class PendingUpdate:
+    def __init__(self, set_values, add_values):
+        self.set_values = dict(set_values or {})
+        self.add_values = dict(add_values or {})
+        self.attempts = 0
+
+    # Apply a later update on top of this one
+    def merge(self, later):
+        for name, value in later.set_values.items():
+            self.set_values[name] = value
+            self.add_values.pop(name, None)
+        for name, value in later.add_values.items():
+            if name in self.set_values:
+                self.set_values[name] += value
+            else:
+                self.add_values[name] = self.add_values.get(name, 0) + value
+
+    def request(self, key_name, key):
+        expression = 'SET ' + ', '.join(f'{name} = :{name}' for name in self.set_values)
+        if self.add_values:
+            expression += ' ADD ' + ', '.join(f'{name} :{name}' for name in self.add_values)
+        values = {f':{name}': value for name, value in self.set_values.items()}
+        values.update({f':{name}': value for name, value in self.add_values.items()})
+        return {
+            'Key': {key_name: key},
+            'UpdateExpression': expression,
+            # never recreate an item that was deleted after it was read
+            'ConditionExpression': 'attribute_exists(#k)',
+            'ExpressionAttributeNames': {'#k': key_name},
+            'ExpressionAttributeValues': values,
+            'ReturnConsumedCapacity': 'TOTAL'
+        }
+
+
+# Write-behind stage for item state that can be lost without harm (schedules, counters):
+# put() only records the update, merged with any update of the same item still waiting,
+# and a worker thread sends them in arrival order, paced by a CapacityBucket charged
+# with the consumed capacity DynamoDB reports. Throttled updates go back to the queue
+# with exponential backoff. close(timeout) waits for the queue to drain; whatever is
+# still queued by then is dropped and counted.
+# Writes that must not be lost, or whose outcome matters, do not belong here.
+class WriteBehind:
+    def __init__(self, table, bucket=None, key_name='url', max_attempts=MAX_ATTEMPTS, table_factory=_client_table):
+        self.table = table
+        self.bucket = bucket or CapacityBucket(WRITE_CAPACITY_UNITS, WRITE_BURST_UNITS)
+        self.key_name = key_name
+        self.max_attempts = max_attempts
+        self.table_factory = table_factory
+        self.stats = WriteStats()
+        self._pending = collections.OrderedDict()
+        self._not_before = {}
+        self._condition = threading.Condition()
+        self._closing = False
+        self._deadline = None
+        self._worker = None
+
+    def start(self):
+        self._worker = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._worker.start()
+        return self
+
+    def put(self, key, set_values=None, add_values=None):
+        update = PendingUpdate(set_values, add_values)
+        with self._condition:
+            if key in self._pending:
+                self._pending[key].merge(update)
+                self.stats.add(coalesced=1)
+            else:
+                self._pending[key] = update
+            self.stats.add(queued=1)
+            self._condition.notify()
+
+    def __len__(self):
+        with self._condition:
+            return len(self._pending)
+
+    # Next update that is not backing off, or None once the queue is closed and empty
+    def _take(self):
+        with self._condition:
+            while True:
+                if self._deadline is not None and time.monotonic() >= self._deadline:
+                    return None
+                now = time.monotonic()
+                for key, update in self._pending.items():
+                    if self._not_before.get(key, 0) <= now:
+                        del self._pending[key]
+                        self._not_before.pop(key, None)
+                        return key, update
+                if self._closing and not self._pending:
+                    return None
+                wake_at = min(self._not_before.values(), default=now + 1.0)
+                if self._deadline is not None:
+                    wake_at = min(wake_at, self._deadline)
+                self._condition.wait(max(0.01, wake_at - now))
+
+    def _requeue(self, key, update, delay):
+        with self._condition:
+            if key in self._pending:
+                # a newer update of the same item arrived meanwhile; it goes on top
+                update.merge(self._pending.pop(key))
+            self._pending[key] = update
+            self._not_before[key] = time.monotonic() + delay
+            self._condition.notify()
+
+    def _run(self):
+        table = self.table_factory(self.table)
+        while True:
+            taken = self._take()
+            if taken is None:
+                return
+            key, update = taken
+            if not self._wait_for_capacity():
+                self._requeue(key, update, 0)
+                return
+            self._write(table, key, update)
+
+    # Wait for a unit of write capacity; False if the deadline comes first. Waits on the
+    # condition so that close() can set a deadline while the worker is waiting.
+    def _wait_for_capacity(self):
+        with self._condition:
+            while True:
+                delay = self.bucket.delay(1.0)
+                if delay <= 0:
+                    return True
+                if self._deadline is not None and time.monotonic() + delay > self._deadline:
+                    return False
+                started = time.monotonic()
+                self._condition.wait(delay)
+                self.bucket.add_waited(time.monotonic() - started)
+
+    def _write(self, table, key, update):
+        update.attempts += 1
+        try:
+            response = table.update_item(**update.request(self.key_name, key))
+        except ClientError as e:
+            code = e.response['Error']['Code']
+            if code == 'ConditionalCheckFailedException':
+                self.stats.add(missing=1)
+                return
+            if code in THROTTLING_ERRORS and update.attempts < self.max_attempts:
+                delay = BACKOFF_SECONDS * 2 ** (update.attempts - 1)
+                self.bucket.drain(delay)
+                self.stats.add(throttled=1)
+                self._requeue(key, update, delay)
+                return
+            logger.error(f"Deferred update of {key} failed after {update.attempts} attempts: {e.response['Error']['Message']}")
+            self.stats.add(failed=1)
+            return
+        units = response.get('ConsumedCapacity', {}).get('CapacityUnits', 1.0)
+        self.bucket.charge(units)
+        self.stats.add(writes=1, consumed_units=units)
+
+    # Stop accepting work and wait up to timeout seconds (None: no limit) for the
+    # queue to drain. Returns the number of updates that were dropped.
+    def close(self, timeout=None):
+        started = time.monotonic()
+        with self._condition:
+            self._closing = True
+            if timeout is not None:
+                self._deadline = started + max(0.0, timeout)
+            self._condition.notify_all()
+        if self._worker is not None:
+            self._worker.join()
+        with self._condition:
+            dropped = len(self._pending)
+            self._pending.clear()
+        self.stats.add(dropped=dropped, flush_seconds=time.monotonic() - started)
+        if dropped:
+            logger.warning(f"Dropped {dropped} deferred updates at the deadline.")
+        return dropped
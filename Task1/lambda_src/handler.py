@@ -1,18 +1,47 @@
 import json
-import boto3
 import os
 import logging
 import requests
 import re
-from bs4 import BeautifulSoup as bs
 import datetime
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
+from tracker_common.extract import extract_with_strategy, extract_stream_with_strategy, strategy_stats
+from tracker_common.response_cache import crawl_page, stats as cache_stats
+from tracker_common.schedule import initial_schedule, next_schedule
+from tracker_common.prices import price_number
+from tracker_common.ebay_url import ITEM_URL, canonical_item_url, item_key, parse_item_url
+from tracker_common.single_flight import SingleFlight, LeaseTimeout, coalesce
+from tracker_common.signup_queue import open_queue, messages_from_event
+from tracker_common.observation_cache import open_cache, stats as observation_stats
+from tracker_common.aws_clients import get_client, get_resource
 
-# Initialize services
-dynamodb = boto3.resource('dynamodb')
-sns_client = boto3.client('sns')
+# Initialize services (shared, tuned clients from the layer's factory)
+dynamodb = get_resource('dynamodb')
+sns_client = get_client('sns')
 table = dynamodb.Table(os.environ['DB'])
 PRIMARY_KEY = 'url'
+# Recent (title, price) observations of this container (OBSERVATION_CACHE)
+observations = open_cache()
+# A stored item checked more recently than this is reused by signups without crawling the page
+ITEM_FRESH_SECONDS = int(os.environ.get('ITEM_FRESH_SECONDS', 24 * 3600))
+
+# 'sync':  sign up within the API request
+# 'async': queue the signup, answer 202 with its id, and sign up when the queue
+#          (SIGNUP_QUEUE_URL) delivers it back to this function in batches
+SIGNUP_MODE = os.environ.get('SIGNUP_MODE', 'sync')
+signup_queue = open_queue() if SIGNUP_MODE == 'async' else None
+# Time a queued signup may need at most: a slow crawl plus the DynamoDB and SNS calls
+SIGNUP_TIME_BUDGET_MS = 15000
+
+# Independent signup steps (crawl, DynamoDB write, SNS subscribe) run on this pool;
+# it lives at module level so warm invocations reuse its threads
+signup_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='signup')
+# Signups for a listing that is not tracked yet are coalesced per listing: one crawl and
+# one topic/item creation, shared in-process and across invocations through a lease
+item_creations = SingleFlight()
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -25,14 +54,50 @@ class DynamoDBError(Exception):
 class SNSError(Exception):
     pass
 
+# The listing page could not be downloaded; unlike a page without a price this may pass
+class CrawlError(Exception):
+    pass
+
+# Run fn(*args) and record how long it took, in milliseconds, under timings[name]
+def timed(timings, name, fn, *args):
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+# Run independent steps {name: (fn, args)} concurrently and wait for all of them, so a
+# failure never leaves another step running unobserved; then re-raise the first failure.
+# Steps must not share the DynamoDB Table resource, which is not thread safe.
+def run_concurrently(steps, timings):
+    futures = {name: signup_executor.submit(timed, timings, name, fn, *args) for name, (fn, args) in steps.items()}
+    results = {}
+    errors = []
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            logger.error(f"Signup step {name} failed: {str(e)}")
+            errors.append(e)
+    if errors:
+        raise errors[0]
+    return results
+
 def query_dynamodb_sns(url, email):
+    timings = {}
+    started = time.perf_counter()
+    # Every spelling of a listing's URL maps to one item, one topic and one crawl
+    url = canonical_item_url(url)
     try:
-        current_price, title = price_crawl(url)
-        if not current_price or not title:
-            logger.error(f"Failed to get current price/title from the website {url}.")
-            raise ValueError(f"Failed to get price or title for {url}")
+        # Known items need nothing from the page, so look them up before crawling
+        response = timed(timings, 'get_item', get_dynamodb_item, url)
 
-        response = table.get_item(Key={PRIMARY_KEY: url})
+        if 'Item' not in response:
+            logger.info(f"No entry found for {url}. Creating a new one.")
+            key = item_key(url)
+            item_url = timed(timings, 'create_item', item_creations.do, key,
+                             lambda: coalesce(table, key, lambda: create_tracked_item(url, timings)))
+            response = get_dynamodb_item(item_url, consistent=True)
 
         if 'Item' in response:
             logger.info("Found an entry in DB.")
@@ -40,40 +105,107 @@ def query_dynamodb_sns(url, email):
             subscribers = item.get('subscribers', [])
             logger.info(f"Existing subscribers are {subscribers}")
 
+            # The SNS subscription (or confirmation resend), the subscriber list update and,
+            # for a stale record, the crawl are independent of each other
+            steps = {'sns_subscribe': (update_sns_subscribers, (item['SNS_ARN'], email))}
             if email not in subscribers:
-                update_dynamodb_subscribers(url, email)
-                update_sns_subscribers(item['SNS_ARN'], email)
+                steps['db_subscribers'] = (update_dynamodb_subscribers, (item['url'], email))
                 logger.info(f"Adding {email} to the subscribers list")
             else:
-                update_sns_subscribers(item['SNS_ARN'], email)
-                logger.info("The tracking item and subscribers are already in the DB. Resent a subscription confirmation email to {email}.")
+                logger.info(f"The tracking item and subscribers are already in the DB. Resending a subscription confirmation email to {email}.")
+            if not is_fresh(item):
+                steps['crawl'] = (refresh_crawl, (item['url'],))
+            results = run_concurrently(steps, timings)
+            if 'crawl' in results:
+                timed(timings, 'db_refresh', refresh_dynamodb_item, item, *results['crawl'])
         else:
-            logger.info(f"No entry found for {url}. Creating a new one.")
-            sns_arn = create_sns(title, email)
-            logger.info(f"Created a new SNS with arn: {sns_arn}")
-            add_dynamodb_item(title, current_price, email, sns_arn, url)
-            logger.info("Added a new entry in DB.")
+            raise DynamoDBError(f'{url} was created but could not be read back')
 
+    except LeaseTimeout as e:
+        logger.error(str(e))
+        raise DynamoDBError('Timed out waiting for another signup of this item')
     except ClientError as e:
         logger.error(f"Error in querying dynamodb: {e.response['Error']['Message']}")
         raise DynamoDBError('Failed to query or update DynamoDB')
+    finally:
+        timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"Signup step latency (ms): {json.dumps(timings)}")
+
+def is_fresh(item):
+    last_checked_at = item.get('last_checked_at')
+    return last_checked_at is not None and time.time() - int(last_checked_at) < ITEM_FRESH_SECONDS
+
+# A stale item is crawled again and its stored price and schedule brought up to date.
+# The signup does not depend on the page, so a failed crawl is only logged.
+def refresh_crawl(url):
+    try:
+        return price_crawl(url)
+    except CrawlError:
+        return None, None, None
+
+def refresh_dynamodb_item(item, current_price, title, ends_at=None):
+    if not current_price or not title:
+        logger.warning(f"Could not refresh {item['url']}; keeping the stored record.")
+        return
+    schedule = next_schedule(item, current_price, ends_at=ends_at)
+    try:
+        table.update_item(
+            Key={PRIMARY_KEY: item['url']},
+            UpdateExpression='SET ' + ', '.join(f'{name} = :{name}' for name in schedule),
+            ExpressionAttributeValues={f':{name}': value for name, value in schedule.items()}
+        )
+        logger.info(f"Refreshed stale entry for {item['url']}")
+    except ClientError as e:
+        logger.error(f"Error in refresh_dynamodb_item: {e.response['Error']['Message']}")
+        raise DynamoDBError('Failed to refresh entry in DynamoDB.')
+
+def get_dynamodb_item(url, consistent=False):
+    return table.get_item(Key={PRIMARY_KEY: url}, ConsistentRead=consistent)
 
-def add_dynamodb_item(title, current_price, email, sns_arn, url):
+# Crawl a new listing and create its topic and item, without subscribers; the caller
+# subscribes like on a known item. Runs at most once at a time per listing, and returns
+# the key of the item, which may have been created by an earlier lease holder.
+def create_tracked_item(url, timings):
+    existing = get_dynamodb_item(url, consistent=True)
+    if 'Item' in existing:
+        return existing['Item']['url']
+    current_price, title, ends_at = timed(timings, 'crawl', price_crawl, url)
+    if not current_price or not title:
+        logger.error(f"Failed to get current price/title from the website {url}.")
+        raise ValueError(f"Failed to get price or title for {url}")
+    sns_arn = timed(timings, 'sns_create_topic', create_sns_topic, title)
+    logger.info(f"Created a new SNS with arn: {sns_arn}")
+    timed(timings, 'db_put_item', add_dynamodb_item, title, current_price, sns_arn, url, ends_at)
+    logger.info("Added a new entry in DB.")
+    return url
+
+def add_dynamodb_item(title, current_price, sns_arn, url, ends_at=None):
     try:
         current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        current_price = price_number(current_price)
         item = {
             "title": title,
             "url": url,
-            "subscribers": [email],
+            "subscribers": [],
             "max_price": current_price,
             "max_price_date": current_time,
             "lowest_price": current_price,
             "lowest_price_date": current_time,
             "SNS_ARN": sns_arn
         }
-        table.put_item(Item=item)
+        # first scheduled price check, picked up by the Task2 due-index query
+        item.update(initial_schedule(url, current_price, ends_at=ends_at))
+        # never overwrite the subscribers of an item created by an earlier lease holder
+        table.put_item(
+            Item=item,
+            ConditionExpression='attribute_not_exists(#u)',
+            ExpressionAttributeNames={'#u': PRIMARY_KEY}
+        )
         logger.info(f"Added new entry in the DB for {url}")
     except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            logger.info(f"{url} was added by another signup.")
+            return
         logger.error(f"Error in add_dynamodb_item: {e.response['Error']['Message']}")
         raise DynamoDBError('Failed to add entry to DynamoDB.')
 
@@ -94,7 +226,7 @@ def update_dynamodb_subscribers(url, email):
         logger.error(f"Error in updating dynamodb: {e.response['Error']['Message']}")
         raise DynamoDBError('Failed to update subscribers in DynamoDB')
 
-def create_sns(title, subscriber):
+def create_sns_topic(title):
     try:
         topic_name = re.sub(r'[^a-zA-Z0-9-_]', '_', title)[:256]
         response = sns_client.create_topic(Name=topic_name)
@@ -102,18 +234,10 @@ def create_sns(title, subscriber):
         
         logger.info(f"Created SNS topic: {title}")
         logger.info(f"Topic ARN: {topic_arn}")
-        
-        sns_client.subscribe(
-            TopicArn=topic_arn,
-            Protocol='email',
-            Endpoint=subscriber
-        )
-        
-        logger.info(f"Subscribed {subscriber} to the topic {title}.")
         return topic_arn
     except ClientError as e:
-        logger.error(f"Error creating SNS topic or subscribing: {e}")
-        raise SNSError('Failed to create SNS topic or subscribe')
+        logger.error(f"Error creating SNS topic: {e}")
+        raise SNSError('Failed to create SNS topic')
 
 def update_sns_subscribers(sns_arn, email):
     try:
@@ -127,39 +251,31 @@ def update_sns_subscribers(sns_arn, email):
         logger.error(f"Error in updating sns subscribers: {e.response['Error']['Message']}")
         raise SNSError('Failed to update SNS subscribers')
 
+def crawl_observation(url):
+    return crawl_page(url, extract_with_strategy, extract_stream_with_strategy)
+
+# (price, title, listing end) of the listing, None for fields the page does not have;
+# raises CrawlError when the page could not be downloaded
 def price_crawl(url):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Connection': 'keep-alive'
-    }
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        soup = bs(response.text, 'html.parser')
-        
-        title_element = soup.find('span', class_='ux-textspans ux-textspans--BOLD')
-        price_element = soup.find('span', class_='ux-textspans', string=lambda text: text and text.strip().startswith('US $'))
-        logger.info(f'title: {title_element}  price: {price_element}')
-        if title_element and price_element:
-            title = title_element.text.strip()
-            price = price_element.text.strip().replace('US $', '').replace(',', '').split('/')[0]
-            return price, title
-        else:
-            logger.error(f"Failed to catch elements on the webpage {url}.")
-            return None, None
+        price, title, ends_at = observations.crawl(url, crawl_observation)
     except requests.RequestException as e:
         logger.error(f"Error in price_crawl: {str(e)}")
-        return None, None
+        raise CrawlError(f'Failed to download {url}')
+    logger.info(f'title: {title}  price: {price}')
+    if price is None or title is None:
+        logger.error(f"Failed to catch elements on the webpage {url}.")
+    return price, title, ends_at
 
-# def validate_email(email):
-#     pattern = r'^[\w\.-]+@[\w\.-]+\.\w+$'
-#     return re.match(pattern, email) is not None
+EMAIL_PATTERN = re.compile(r'[^@\s]{1,64}@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)+')
 
-# def validate_url(url):
-#     pattern = r'^https?:\/\/(www\.)?[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b([-a-zA-Z0-9()@:%_\+.~#?&//=]*)$'
-#     return 'www.ebay.com' in url and re.match(pattern, url)
+def validate_email(email):
+    return isinstance(email, str) and len(email) <= 254 and EMAIL_PATTERN.fullmatch(email) is not None
+
+# Canonical item URL of a submitted eBay item page, or None
+def validate_url(url):
+    item = parse_item_url(url)
+    return ITEM_URL.format(item) if item else None
 
 def create_response(status_code, body):
     return {
@@ -172,30 +288,89 @@ def create_response(status_code, body):
         'body': json.dumps(body)
     }
 
+# Queued signup, from the SQS event source mapping or a local drain() of the queue
+def process_signup(body):
+    logger.info(f"Processing signup {body['signup_id']} for URL: {body['url']} and email: {body['email']}")
+    query_dynamodb_sns(body['url'], body['email'])
+
+# Signups that can never succeed: a listing without a price or title, a malformed message
+PERMANENT_SIGNUP_ERRORS = (ValueError, KeyError, TypeError)
+
+# Failed signups are reported back individually; SQS makes them visible again after the
+# visibility timeout and moves them to the dead-letter queue after maxReceiveCount tries.
+# Only transient failures (DynamoDB, SNS, the page download) are reported; permanent ones
+# are logged and acknowledged, since a redelivery would fail the same way.
+# Messages that would not finish before the Lambda timeout are handed back untried.
+def process_signup_batch(records, context):
+    cache_stats.reset()
+    observation_stats.reset()
+    strategy_stats.reset()
+    failures = []
+    for message in messages_from_event(records):
+        if context is not None and context.get_remaining_time_in_millis() < SIGNUP_TIME_BUDGET_MS:
+            failures.append({'itemIdentifier': message.id})
+            continue
+        try:
+            process_signup(message.body)
+        except PERMANENT_SIGNUP_ERRORS as e:
+            logger.error(f"Dropping signup {message.id}, which cannot succeed: {str(e)}")
+        except Exception as e:
+            logger.error(f"Signup {message.body.get('signup_id')} failed on attempt {message.attempts}: {str(e)}")
+            failures.append({'itemIdentifier': message.id})
+    logger.info(f"Processed {len(records)} queued signups, {len(failures)} failed.")
+    logger.info(f"Response cache: {json.dumps(cache_stats.report())}")
+    logger.info(f"Extraction strategies: {json.dumps(strategy_stats.report())}")
+    logger.info(f"Observation cache: {json.dumps(observation_stats.report())}")
+    return {'batchItemFailures': failures}
+
+def enqueue_signup(url, email):
+    signup_id = uuid.uuid4().hex
+    signup_queue.send({'signup_id': signup_id, 'url': url, 'email': email})
+    logger.info(f"Queued signup {signup_id}")
+    return signup_id
+
 def lambda_handler(event, context):
+    if 'Records' in event:
+        return process_signup_batch(event['Records'], context)
     try:
         logger.info(f"Event: {json.dumps(event)}")
-        query_params = event.get('queryStringParameters', {})
+        query_params = event.get('queryStringParameters') or {}
         url = query_params.get('url')
         email = query_params.get('email')
         
         logger.info(f"Processing request for URL: {url} and email: {email}")
         
-        # if not validate_email(email):
-        #     logger.error(f"Email {email} is invalid")
-        #     return create_response(400, {'error': 'email address is not valid.'})
+        # Reject malformed input before any DynamoDB, SNS or eBay request
+        item_url = validate_url(url)
+        if item_url is None:
+            logger.error(f"URL {url} is invalid")
+            return create_response(400, {'error': 'Invalid URL'})
         
-        # if not validate_url(url):
-        #     logger.error(f"URL {url} is invalid")
-        #     return create_response(400, {'error': 'url is not valid.'})
+        if not validate_email(email):
+            logger.error(f"Email {email} is invalid")
+            return create_response(400, {'error': 'Invalid email address'})
+        url = item_url
         
+        if SIGNUP_MODE == 'async':
+            signup_id = enqueue_signup(url, email)
+            return create_response(202, {'message': 'Signup received, a confirmation email will follow.', 'signup_id': signup_id})
+
+        cache_stats.reset()
+        observation_stats.reset()
+        strategy_stats.reset()
         query_dynamodb_sns(url, email)
+        logger.info(f"Response cache: {json.dumps(cache_stats.report())}")
+        logger.info(f"Extraction strategies: {json.dumps(strategy_stats.report())}")
+        logger.info(f"Observation cache: {json.dumps(observation_stats.report())}")
         return create_response(200, {'message': 'Signed up successfully!'})
     
     except KeyError as e:
         logger.error(f"Missing required parameter: {str(e)}")
         return create_response(400, {'error': 'Missing required parameters'})
-    except (DynamoDBError, SNSError) as e:
+    except ValueError as e:
+        # the listing could not be read: it does not exist or has no price
+        return create_response(400, {'error': str(e)})
+    except (DynamoDBError, SNSError, CrawlError) as e:
         return create_response(500, {'error': str(e)})
     except Exception as e:
         logger.error(f"Unexpected error in lambda_handler: {str(e)}")
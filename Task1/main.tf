@@ -13,8 +13,31 @@ module "dynamodb" {
     {
       name = "url"
       type = "S"
+    },
+    {
+      name = "check_shard"
+      type = "N"
+    },
+    {
+      name = "next_check_at"
+      type = "N"
+    }
+  ]
+
+  # Records with expires_at (signup leases) are removed by DynamoDB once expired
+  ttl_enabled        = true
+  ttl_attribute_name = "expires_at"
+
+  # Sparse index of scheduled price checks; Task2 queries each shard for next_check_at <= now
+  global_secondary_indexes = [
+    {
+      name            = "due-index"
+      hash_key        = "check_shard"
+      range_key       = "next_check_at"
+      projection_type = "ALL"
+      read_capacity   = 1
+      write_capacity  = 1
     }
-    
   ]
 }
 
@@ -38,6 +61,13 @@ module "lambda" {
 
   environment_variables = {
     DB = var.dynamodb_table_name
+    CHECK_SHARDS = var.check_shards
+    ITEM_FRESH_SECONDS = var.item_fresh_seconds
+    SIGNUP_MODE = var.signup_mode
+    SIGNUP_QUEUE_URL = aws_sqs_queue.signups.url
+    OBSERVATION_CACHE = var.observation_cache
+    OBSERVATION_TTL_SECONDS = var.observation_ttl_seconds
+    BOTO_RETRY_MODE = var.boto_retry_mode
   }
 
   attach_policy_json = true
@@ -79,12 +109,48 @@ module "lambda" {
         Effect = "Allow"
         Action = "cloudwatch:GetInsightRuleReport"
         Resource = "arn:aws:cloudwatch:*:*:insight-rule/DynamoDBContributorInsights*"
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "sqs:SendMessage",
+          "sqs:ReceiveMessage",
+          "sqs:DeleteMessage",
+          "sqs:ChangeMessageVisibility",
+          "sqs:GetQueueAttributes"
+        ]
+        Resource = aws_sqs_queue.signups.arn
       }
     ]
   })
 
 }
 
+# Queue of signups accepted in async signup_mode; the same Lambda consumes it in batches
+resource "aws_sqs_queue" "signups_dlq" {
+  name                      = "price_tracker_v1_signups_dlq"
+  message_retention_seconds = 1209600
+}
+
+resource "aws_sqs_queue" "signups" {
+  name = "price_tracker_v1_signups"
+  # at least the Lambda timeout, so a batch in progress is not delivered twice
+  visibility_timeout_seconds = 180
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.signups_dlq.arn
+    maxReceiveCount     = 5
+  })
+}
+
+resource "aws_lambda_event_source_mapping" "signups" {
+  event_source_arn                   = aws_sqs_queue.signups.arn
+  function_name                      = module.lambda.lambda_function_arn
+  enabled                            = var.signup_mode == "async"
+  batch_size                         = var.signup_batch_size
+  maximum_batching_window_in_seconds = 1
+  function_response_types            = ["ReportBatchItemFailures"]
+}
+
 module "lambda_layer" {
   source = "terraform-aws-modules/lambda/aws"
 
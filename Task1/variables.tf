@@ -8,6 +8,11 @@ variable "dynamodb_table_name" {
   default= "price_tracker_v1"
 }
 
+variable "check_shards" {
+  description = "Number of due-index partitions the tracked items are spread over (must match Task2)"
+  default     = 6
+}
+
 variable "lambda_layer"{
   default = "arn:aws:lambda:us-east-1:637423641675:layer:web_layer1:3"
 }
@@ -23,3 +28,33 @@ variable "my_domain" {
   default="app1.maxinehe.top"
   
 }
+
+variable "item_fresh_seconds" {
+  description = "Signups for an item checked more recently than this reuse the stored record instead of crawling the page"
+  default     = 86400
+}
+
+variable "signup_mode" {
+  description = "sync: sign up within the API request; async: queue the signup, answer 202 and process it from SQS"
+  default     = "sync"
+}
+
+variable "signup_batch_size" {
+  description = "Queued signups handed to one Lambda invocation in async signup_mode"
+  default     = 5
+}
+
+variable "observation_cache" {
+  description = "Where recent title/price observations are kept: memory (per container) or none"
+  default     = "memory"
+}
+
+variable "observation_ttl_seconds" {
+  description = "How old a title/price observation may be and still be used instead of crawling the page"
+  default     = 300
+}
+
+variable "boto_retry_mode" {
+  description = "botocore retry mode of the AWS clients: adaptive (client-side rate limiting on throttles), standard or legacy"
+  default     = "adaptive"
+}
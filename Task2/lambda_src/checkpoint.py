@@ -0,0 +1,102 @@
+import datetime
+import logging
+
+logger = logging.getLogger()
+
+# The cursor lives in the tracking table itself under a reserved hash key; every time
+# slice of the scheduling wheel has its own (CURSOR_KEY#<slot>), so an interrupted
+# slice is resumed by its own chain or tick and never by another slice's
+CURSOR_KEY = '#price_check_cursor'
+
+
+def cursor_key(slot=None):
+    return CURSOR_KEY if slot is None else f'{CURSOR_KEY}#{slot}'
+
+
+# Position of an interrupted price check: for every scan segment (or due-index
+# shard, in 'due' mode) that still has work, the ExclusiveStartKey to continue
+# from. Within a page that is the key of the last item handed to the crawl stage,
+# not an offset into the page: checked items get a later next_check_at, so a page
+# read again leaves them out and an offset would skip unchecked items instead.
+# Finished segments are dropped.
+class ScanCursor:
+    def __init__(self, segments, positions=None, mode='scan', active=None, slot=None):
+        self.segments = segments
+        self.mode = mode
+        self.slot = slot
+        if positions is None:
+            active = range(segments) if active is None else active
+            positions = {segment: None for segment in active}
+        self.positions = positions
+
+    @property
+    def finished(self):
+        return not self.positions
+
+    def start_keys(self):
+        return dict(self.positions)
+
+    # Called right before an item is handed to the crawl stage, with its key
+    # (as an ExclusiveStartKey of the scan or query)
+    def advance(self, segment, key):
+        self.positions[segment] = key
+
+    def end_page(self, segment, page):
+        if 'LastEvaluatedKey' in page:
+            self.positions[segment] = page['LastEvaluatedKey']
+        else:
+            del self.positions[segment]
+
+    def to_item(self):
+        positions = {}
+        for segment, start_key in self.positions.items():
+            position = {}
+            if start_key is not None:
+                position['start_key'] = start_key
+            positions[str(segment)] = position
+        item = {
+            'url': cursor_key(self.slot),
+            'segments': self.segments,
+            'mode': self.mode,
+            'positions': positions,
+            'saved_at': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        if self.slot is not None:
+            item['slot'] = self.slot
+        return item
+
+    @classmethod
+    def from_item(cls, item):
+        positions = {}
+        for segment, position in item['positions'].items():
+            # cursors saved with a page offset restart that page; its checked items are no longer due
+            positions[int(segment)] = position.get('start_key')
+        slot = int(item['slot']) if 'slot' in item else None
+        return cls(int(item['segments']), positions, item.get('mode', 'scan'), slot=slot)
+
+
+def saved_at(item):
+    return datetime.datetime.strptime(item['saved_at'], "%Y-%m-%d %H:%M:%S")
+
+
+# Load the slice's saved cursor, or a fresh one over the `active` segments when there
+# is none or the mode or segment count changed
+def load_cursor(table, segments, mode='scan', active=None, slot=None):
+    response = table.get_item(Key={'url': cursor_key(slot)}, ConsistentRead=True)
+    item = response.get('Item')
+    if item is None:
+        return ScanCursor(segments, mode=mode, active=active, slot=slot), None
+    if int(item['segments']) != segments or item.get('mode', 'scan') != mode:
+        logger.warning(f"Saved cursor uses {item['segments']} segments in {item.get('mode', 'scan')} mode, "
+                       f"now {segments} in {mode} mode. Starting a new cycle.")
+        return ScanCursor(segments, mode=mode, active=active, slot=slot), None
+    return ScanCursor.from_item(item), saved_at(item)
+
+
+def save_cursor(table, cursor):
+    table.put_item(Item=cursor.to_item())
+    logger.info(f"Saved cursor with {len(cursor.positions)} unfinished segments")
+
+
+def clear_cursor(table, slot=None):
+    table.delete_item(Key={'url': cursor_key(slot)})
@@ -0,0 +1,36 @@
+import logging
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+logger = logging.getLogger()
+
+DEFAULT_CONCURRENCY = 8
+
+
+# Run crawl(url) for every item with at most `concurrency` requests in flight;
+# url_of(item) gives the url (item['url'] unless set).
+# Items are pulled lazily from the iterable, so a generator feeding this stage
+# is never read further ahead than the pool width.
+# Yields (item, result, error) in completion order; exactly one of result/error is set.
+def crawl_concurrently(items, crawl, concurrency=DEFAULT_CONCURRENCY, url_of=itemgetter('url')):
+    concurrency = max(1, int(concurrency))
+    items = iter(items)
+    in_flight = {}
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='crawl') as pool:
+        def fill():
+            for item in items:
+                in_flight[pool.submit(crawl, url_of(item))] = item
+                if len(in_flight) >= concurrency:
+                    return
+
+        fill()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = in_flight.pop(future)
+                try:
+                    yield item, future.result(), None
+                except Exception as e:
+                    yield item, None, e
+            fill()
@@ -1,20 +1,65 @@
 import json
-import boto3
 import os
 import logging
 from botocore.exceptions import ClientError
-from bs4 import BeautifulSoup as bs
 import requests
 import datetime
+import time
+from tracker_common.extract import extract_with_strategy, extract_stream_with_strategy, strategy_stats
+from tracker_common.response_cache import crawl_page, stats as cache_stats
+from tracker_common.dynamo_scan import scan_pages, query_pages
+from tracker_common.ebay_url import canonical_item_url
+from tracker_common.prices import price_number
+from tracker_common.write_behind import WriteBehind
+from tracker_common.capacity import read_bucket
+from tracker_common.dynamo_client import ClientTable
+from tracker_common.tracked_item import decode_tracked_item, item_url
+from tracker_common.observation_cache import open_cache, stats as observation_stats
+from tracker_common.aws_clients import get_client, get_resource
+from tracker_common.schedule import DUE_INDEX, CHECK_SHARDS, TIME_SLICES, check_schedule, failure_schedule, \
+    current_slice, slice_shards, slice_segments
+from crawl_engine import crawl_concurrently, DEFAULT_CONCURRENCY
+from checkpoint import load_cursor, save_cursor, clear_cursor
 
 #logging settings
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize the DynamoDB client
-dynamodb = boto3.resource('dynamodb')
+# Initialize the DynamoDB client (shared, tuned clients from the layer's factory)
+dynamodb = get_resource('dynamodb')
 table = dynamodb.Table(os.environ['DB'])
+# Recent (title, price) observations of this container (OBSERVATION_CACHE)
+observations = open_cache()
+
+# Number of listings fetched and parsed in parallel during a price check
+CRAWL_CONCURRENCY = int(os.environ.get('CRAWL_CONCURRENCY', DEFAULT_CONCURRENCY))
+# Number of parallel scan segments (worker threads) used to read the table (or the current time slice of it)
+SCAN_SEGMENTS = int(os.environ.get('SCAN_SEGMENTS', 1))
+# 'scan': scan the whole table and check the items that are due (also backfills the schedule of old items)
+# 'due':  query only the due items through the due-index GSI, one query per shard
+CHECK_MODE = os.environ.get('CHECK_MODE', 'scan')
+# Stop taking new items once less than this much time is left, so in-flight crawls can finish
+DEADLINE_MARGIN_MS = int(os.environ.get('DEADLINE_MARGIN_MS', 10000))
+# Continue an unfinished cycle right away in a new async invocation instead of waiting for the next tick
+SELF_REINVOKE = os.environ.get('SELF_REINVOKE', 'true').lower() == 'true'
+# A cursor saved more recently than this belongs to a running re-invocation chain
+CURSOR_LEASE_SECONDS = int(os.environ.get('CURSOR_LEASE_SECONDS', 120))
+# Time kept back after the deferred state writes are flushed, for saving the cursor
+FLUSH_MARGIN_MS = 3000
+
+# The scan reads through the low-level client and decodes what it projects straight
+# into slotted TrackedItems, which every later stage of the check passes along
+scan_table = ClientTable(table, decode_tracked_item)
+
+# Scans and due-index queries are paced to the provisioned read capacity of the table or
+# the index; one bucket per mode, kept for the life of the container
+read_buckets = {}
+
+def read_bucket_for(mode):
+    if mode not in read_buckets:
+        read_buckets[mode] = read_bucket(table, DUE_INDEX if mode == 'due' else None)
+    return read_buckets[mode]
 
 class WebScrapingError(Exception):
     pass
@@ -23,95 +68,176 @@ class DynamoDBError(Exception):
 class SNSError(Exception):
     pass
 
+def crawl_observation(url):
+    logger.info(f"Loading webpage {url}...")
+    # shared keep-alive session from the layer; unchanged pages are served from the /tmp cache
+    # title and price are found by the fast extractor, with a full BeautifulSoup parse as fallback
+    return crawl_page(url, extract_with_strategy, extract_stream_with_strategy)
+
 def price_crawl(url):
-    headers = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-    'Accept-Language': 'en-US,en;q=0.9',
-    'Accept-Encoding': 'gzip, deflate, br',
-    'Connection': 'keep-alive'
-    }
     try:
-        # header is added to prevent robot blocking
-        response = requests.get(url, headers=headers)
-        # Check if the request was successful
-        response.raise_for_status()
-        # Parse the HTML content
-        soup = bs(response.text, 'html.parser')
-        logger.info(f"Loading webpage {url}...")
-        logger.info("Looking for Item title...")
-        # Find the title element
-        title_element = soup.find('span', class_='ux-textspans ux-textspans--BOLD')
-        # Find the price element
-        logger.info("Looking for Item price...")
-        price_element = soup.find('span', class_='ux-textspans', string=lambda text: text and text.strip().startswith('US $'))
-        if title_element and price_element:
-            title = title_element.text.strip()
-            # Extract the text and remove any unwanted characters
-            price = price_element.text.strip().replace('US $', '').replace(',', '').split('/')[0]
-            return price, title
-        else:
-            return None,None
+        # a listing the signup Lambda has just read is not fetched again;
+        # rows created before item-id keying are still fetched through the listing's canonical URL
+        return observations.crawl(canonical_item_url(url), crawl_observation)
     except requests.RequestException as e:
         raise WebScrapingError(f"Error in price_crawl: {str(e)}")
 
 
+#ExclusiveStartKey that continues a scan segment (or due-index shard) right after item:
+#the table key, plus the index key for a due-index query
+def resume_key(mode, segment, item):
+    if mode == 'due':
+        return {'check_shard': segment, 'next_check_at': item.next_check_at, 'url': item.url}
+    return {'url': item.url}
+
 #Read from dynamodb
-def read_dynamodb():
-    items = []
+# Items are yielded page by page as the scan segments return them,
+# so the crawl stage can start before the whole table has been read.
+# Every item handed out is recorded in the cursor; once stop() returns True
+# no further items are handed out and no further pages are requested (pages
+# the FilterExpression leaves empty included), and the cursor points right
+# after the last item handed out.
+def read_dynamodb(cursor, stop=lambda: False):
+    count = 0
+    bucket = read_bucket_for(cursor.mode)
+    if bucket is not None:
+        bucket.reset_stats()
 
     try:
         # Define the attributes you want to retrieve
-        projection_expression = "#u, max_price, lowest_price, lowest_price_date, SNS_ARN"
+        projection_expression = "#u, lowest_price, SNS_ARN, subscribers, next_check_at, " \
+                                "last_price, last_change_at, volatility, listing_ends_at, failed_checks"
         expression_attribute_names = {"#u": "url"}
-        
-        # Scan the table with ProjectionExpression
-        response = table.scan(
-            ProjectionExpression=projection_expression,
-            ExpressionAttributeNames=expression_attribute_names
-        )
-        items.extend(response['Items'])
+        now = int(time.time())
 
-        # If there are more items, keep scanning
-        while 'LastEvaluatedKey' in response:
-            response = table.scan(
+        if cursor.mode == 'due':
+            # Query each due-index shard for items whose next_check_at has passed
+            pages = query_pages(
+                scan_table,
+                [{'ExpressionAttributeValues': {':shard': shard}} for shard in range(cursor.segments)],
+                cursor.start_keys(),
+                bucket=bucket,
+                stop=stop,
+                IndexName=DUE_INDEX,
+                KeyConditionExpression="check_shard = :shard AND next_check_at <= :now",
                 ProjectionExpression=projection_expression,
-                ExclusiveStartKey=response['LastEvaluatedKey']
+                ExpressionAttributeNames=expression_attribute_names,
+                ExpressionAttributeValues={':now': now}
             )
-            items.extend(response['Items'])
-        
-        logger.info(f"Successfully read {len(items)} items from the table.")
-        return items
+        else:
+            # Scan the table with ProjectionExpression, following LastEvaluatedKey in every segment.
+            # Items never scheduled before have no next_check_at and are always due; reserved
+            # records (cursors, signup leases) have none either and are filtered out by key.
+            pages = scan_pages(
+                scan_table,
+                cursor.segments,
+                cursor.start_keys(),
+                bucket=bucket,
+                stop=stop,
+                ProjectionExpression=projection_expression,
+                FilterExpression="(attribute_not_exists(next_check_at) OR next_check_at <= :now) "
+                                 "AND NOT begins_with(#u, :reserved)",
+                ExpressionAttributeNames=expression_attribute_names,
+                ExpressionAttributeValues={':now': now, ':reserved': '#'}
+            )
+
+        for segment, _, page in pages:
+            for item in page['Items']:
+                if stop():
+                    logger.info(f"Stopping the scan early after {count} items.")
+                    return
+                cursor.advance(segment, resume_key(cursor.mode, segment, item))
+                # reserved records (this cursor, signup leases) have keys starting with '#'
+                if item.url.startswith('#'):
+                    continue
+                count += 1
+                yield item
+            cursor.end_page(segment, page)
+
+        if cursor.finished:
+            logger.info(f"Successfully read {count} items from the table.")
+        else:
+            # stop() ended the scan between pages; the cursor is at the next page's start key
+            logger.info(f"Stopping the scan early after {count} items.")
 
     except ClientError as e:
         logger.error(f"Error reading from DynamoDB table {table}: {e}")
-        return None
+        raise DynamoDBError(f"Error reading from DynamoDB table {table.name}")
+    finally:
+        if bucket is not None:
+            logger.info(f"Read capacity: {json.dumps(bucket.report())}")
 
 #Update dynamodb
-def update_dynamodb_lowest_price(url,lowest_price):
-
-    #update dynamodb entry
+#Lower the stored lowest price to current_price in one conditional update, only if it is
+#still higher, so overlapping runs can neither raise it again nor both report the same drop.
+#The item's new check state (see check_state) is written along with it.
+#Returns the replaced {lowest_price, lowest_price_date} when this write won, otherwise None.
+def update_dynamodb_lowest_price(item,current_price,state=None):
     lowest_price_date=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    state=state or {}
+    values={':val1': current_price, ':val2': lowest_price_date}
+    values.update({f':{name}': value for name, value in state.items()})
+    seen=item.lowest_price
+    if isinstance(seen, str):
+        # written before prices were Numbers: a string never compares to a Number,
+        # so swap it only if it is still the value this check read
+        condition='lowest_price = :seen'
+        values[':seen']=seen
+    else:
+        condition='lowest_price > :val1'
     try:
         response = table.update_item(
+            Key={
+                'url': item.url
+            },
+            UpdateExpression='SET  lowest_price= :val1,  lowest_price_date= :val2' + ''.join(f', {name} = :{name}' for name in state),
+            ConditionExpression=condition,
+            ExpressionAttributeValues=values,
+            ReturnValues="UPDATED_OLD"
+        )
+        logger.info(f"Updated lowest price for {item.url}")
+        return response['Attributes']
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return None
+        raise DynamoDBError(f"Error in update_dynamodb_lowest_price: {e.response['Error']['Message']}")
+
+#Put back the lowest price replaced by a drop whose alert could not be sent, so the next
+#check finds the drop again; skipped if another check has lowered it further meanwhile
+def restore_dynamodb_lowest_price(url,current_price,previous):
+    try:
+        table.update_item(
             Key={
                 'url': url
             },
-            UpdateExpression='SET  lowest_price= :val1,  lowest_price_date= :val2',
+            UpdateExpression='SET  lowest_price= :old,  lowest_price_date= :old_date',
+            ConditionExpression='lowest_price = :val1',
             ExpressionAttributeValues={
-                ':val1': lowest_price,
-                ':val2': lowest_price_date
-            },
-            ReturnValues="UPDATED_NEW"
+                ':val1': current_price,
+                ':old': previous['lowest_price'],
+                ':old_date': previous.get('lowest_price_date')
+            }
         )
-        logger.info(f"Updated lowest price for {url}")
-        return response['Attributes']
     except ClientError as e:
-        raise DynamoDBError(f"Error in update_dynamodb_subscribers: {e.response['Error']['Message']}")
-        
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            logger.error(f"Could not restore the lowest price of {url}: {e.response['Error']['Message']}")
+
+#Attributes to SET and counters to ADD after a check that observed current_price
+#(None when the check failed) and the listing end time ends_at (None: the stored one):
+#the next check time and the failed checks in a row
+def check_state(item, current_price, ends_at=None):
+    if current_price is None:
+        return failure_schedule(item.url, item.failed_checks), {'failed_checks': 1}
+    if ends_at is None:
+        ends_at=item.listing_ends_at
+    schedule=check_schedule(item.url, current_price, item.last_price, item.last_change_at, item.volatility,
+                            item.subscriber_count, ends_at)
+    return dict(schedule, failed_checks=0), {}
+
 
 def publish_sns(sns_arn, subject, body):
-    # Create an SNS client
-    sns_client = boto3.client('sns')
+    # The SNS client is built once per container and shared by the crawl workers
+    sns_client = get_client('sns')
 
     try:
         # Publish the message
@@ -132,36 +258,137 @@ def publish_sns(sns_arn, subject, body):
         # Log the error
         raise SNSError(f"Error publishing message to SNS topic {sns_arn}: {e}")
 
-def lambda_handler(event,some):
+#Compare the crawled price with the stored lowest price; only the check whose conditional
+#update lowers it sends the alert. The drop and the item's new state are written before
+#the alert goes out, so a crash after it cannot lead to a second alert for the same drop.
+#Returns True when the state was written along with a drop.
+def check_price(item, current_price, title, state=None):
+    url=item.url
+    SNS_ARN=item.sns_arn
+    current_price=price_number(current_price)
+    if current_price is None:
+        logger.error(f"No price to compare for {title}")
+        return False
+    # the stored value can only have gone down since the scan read it, so a price that is
+    # not below the scanned one needs no write at all
+    scanned=price_number(item.lowest_price)
+    if scanned is not None and current_price>=scanned:
+        logger.info(f"No lower price found for {title}")
+        return False
+    previous=update_dynamodb_lowest_price(item,current_price,state)
+    if previous is None:
+        logger.info(f"Lowest price of {title} is already at or below {current_price}")
+        return False
+    sub=f"Price Drop alert!"
+    msg=f"Price drop on {title}: Now is {current_price}. The last lowest price was {previous['lowest_price']}. Check now {url}."
     try:
-        # Read from DB and store each entry to [url, max_price, lowest_price, lowest_price_date, SNS_ARN]
-        entries=read_dynamodb()
+        publish_sns(SNS_ARN,sub,msg)
+    except SNSError:
+        restore_dynamodb_lowest_price(url,current_price,previous)
+        raise
+    logger.info(f'Publishing msg for {title}')
+    return True
+
+#Start a new async invocation of this function to continue from the slice's saved cursor
+def reinvoke(context, slot):
+    lambda_client = get_client('lambda')
+    lambda_client.invoke(
+        FunctionName=context.invoked_function_arn,
+        InvocationType='Event',
+        Payload=json.dumps({'job': 'resume', 'slot': slot})
+    )
+    logger.info("Re-invoked to continue the price check.")
+
+def lambda_handler(event,context):
+    try:
+        start=time.monotonic()
+        checked=0
+        cache_stats.reset()
+        observation_stats.reset()
+        strategy_stats.reset()
+        # Only this run's slice of the scheduling wheel is read: its due-index shards,
+        # or its share of a scan split into TIME_SLICES * SCAN_SEGMENTS segments.
+        # A resumed run continues the slice its chain started on.
+        event=event or {}
+        resuming=event.get('job')=='resume'
+        slot=int(event['slot']) if resuming and 'slot' in event else current_slice()
+        if CHECK_MODE=='due':
+            segments,active=CHECK_SHARDS,slice_shards(slot)
+        else:
+            segments,active=SCAN_SEGMENTS*TIME_SLICES,slice_segments(slot, SCAN_SEGMENTS)
+        # Pick up where the previous invocation of this slice stopped, if it ran out of time
+        cursor,cursor_saved_at=load_cursor(table, segments, CHECK_MODE, active, slot)
+        if cursor_saved_at is None:
+            logger.info(f"Checking time slice {slot + 1} of {TIME_SLICES}.")
+        if cursor_saved_at is not None:
+            cursor_age=(datetime.datetime.now()-cursor_saved_at).total_seconds()
+            if SELF_REINVOKE and not resuming and cursor_age<CURSOR_LEASE_SECONDS:
+                logger.info(f"A resumed price check of time slice {slot + 1} is still running. Skipping this tick.")
+                return {
+                'statusCode': 200,
+                'body': json.dumps({'message': 'Price check already in progress'})
+                }
+            logger.info(f"Resuming price check of time slice {slot + 1} from cursor saved {cursor_age:.0f}s ago.")
+
+        def deadline_reached():
+            return context is not None and context.get_remaining_time_in_millis()<DEADLINE_MARGIN_MS
+
+        # Stream each entry (a TrackedItem: url, lowest_price, SNS_ARN, subscriber count, schedule fields) from DB page by page.
+        # Nothing is materialized: only the current scan page and the items being crawled are held in memory.
+        entries=read_dynamodb(cursor, deadline_reached)
+
+        # Schedules and failure counters are written behind, paced to the table's capacity
+        state_writes=WriteBehind(table).start()
 
         # For each entry in DB
-        # Crawl the current price 
+        # Crawl the current price (CRAWL_CONCURRENCY pages in flight at once)
         # compare the current_price with lowest_price.
         # update entry in DB
-        for item in entries:
+        for item, result, error in crawl_concurrently(entries, price_crawl, CRAWL_CONCURRENCY, item_url):
+            checked+=1
+            if checked==1:
+                logger.info(f"First price check started after {time.monotonic()-start:.2f}s")
+            checked_price=None
+            ends_at=None
             try:
-                url=item['url']
-                lowest_price=item['lowest_price']
-                SNS_ARN=item['SNS_ARN']
-                current_price,title=price_crawl(url)
+                if error is not None:
+                    raise error
+                current_price,title,ends_at=result
                 if current_price is None or title is None:
-                    logger.error(f"Failed to catch elements on the webpage {url}.")
-                    continue
-                if float(current_price)<float(item['lowest_price']):
-                    sub=f"Price Drop alert!"
-                    msg=f"Price drop on {title}: Now is {current_price}. The last lowest price was {lowest_price}. Check now {url}."
-                    publish_sns(SNS_ARN,sub,msg)
-                    logger.info(f'Publishing msg for {title}')
-                    update_dynamodb_lowest_price(url,current_price)
+                    logger.error(f"Failed to catch elements on the webpage {item.url}.")
                 else:
-                    logger.info(f"No lower price found for {title}")
+                    checked_price=price_number(current_price)
+                    if checked_price is None:
+                        # e.g. a price range ("19.99 to 29.99"); counted as a failed check
+                        logger.error(f"Could not read a price from {current_price!r} on the webpage {item.url}.")
+                    elif check_price(item, checked_price, title, check_state(item, checked_price, ends_at)[0]):
+                        continue
             except (WebScrapingError, DynamoDBError, SNSError) as e:
-                logger.error(f"Error processing item {item['url']}: {str(e)}")
-                continue
-        logger.info("Scan has finished.")
+                logger.error(f"Error processing item {item.url}: {str(e)}")
+            # Schedule the next check of this item; failed checks are retried soon
+            state,counters=check_state(item, checked_price, ends_at)
+            state_writes.put(item.url, state, counters)
+        flush_timeout=None
+        if context is not None:
+            flush_timeout=(context.get_remaining_time_in_millis()-FLUSH_MARGIN_MS)/1000
+        state_writes.close(flush_timeout)
+        logger.info(f"Deferred state writes: {json.dumps(state_writes.stats.report())}")
+        logger.info(f"Response cache: {json.dumps(cache_stats.report())}")
+        logger.info(f"Extraction strategies: {json.dumps(strategy_stats.report())}")
+        logger.info(f"Observation cache: {json.dumps(observation_stats.report())}")
+        if not cursor.finished:
+            # Out of time: remember where to continue, then hand over to the next invocation
+            save_cursor(table, cursor)
+            logger.info(f"Deadline reached. Checked {checked} items in {time.monotonic()-start:.2f}s.")
+            if SELF_REINVOKE and checked>0:
+                reinvoke(context, slot)
+            return {
+            'statusCode': 200,
+            'body': json.dumps({'message': 'Price check paused before the deadline', 'checked': checked})
+            }
+        if cursor_saved_at is not None:
+            clear_cursor(table, slot)
+        logger.info(f"Scan has finished. Checked {checked} items in {time.monotonic()-start:.2f}s.")
         return {
         'statusCode': 200,
         'body': json.dumps({'message': 'Price check completed successfully'})
@@ -1,3 +1,13 @@
+locals {
+  # One full pass over the tracked set per cycle, split into time_slices scheduled runs
+  check_cycle_minutes = var.check_mode == "due" ? 10 : 30
+  # Ticks fall on whole multiples of slice_minutes past the hour, so it must divide 60
+  slice_minutes = max(concat([1], [
+    for minutes in [2, 3, 4, 5, 6, 10, 12, 15, 20, 30] : minutes
+    if minutes * var.time_slices <= local.check_cycle_minutes
+  ])...)
+}
+
 #1. Create a lambda function that scans the DynamoDB table 
 module "lambda" {
   source  = "terraform-aws-modules/lambda/aws"
@@ -18,6 +28,25 @@ module "lambda" {
 
   environment_variables = {
     DB = var.dynamodb_table_name
+    CRAWL_CONCURRENCY = var.crawl_concurrency
+    HTTP_POOL_SIZE = var.crawl_concurrency
+    SCAN_SEGMENTS = var.scan_segments
+    CHECK_MODE = var.check_mode
+    CHECK_SHARDS = var.check_shards
+    TIME_SLICES = var.time_slices
+    SLICE_SECONDS = local.slice_minutes * 60
+    DEADLINE_MARGIN_MS = var.deadline_margin_ms
+    SELF_REINVOKE = var.self_reinvoke
+    STREAM_PAGES = var.stream_pages
+    STREAM_MIN_BYTES = var.stream_min_bytes
+    OBSERVATION_CACHE = var.observation_cache
+    OBSERVATION_TTL_SECONDS = var.observation_ttl_seconds
+    WRITE_CAPACITY_UNITS = var.write_capacity_units
+    WRITE_BURST_UNITS = var.write_burst_units
+    SCAN_CAPACITY_SHARE = var.scan_capacity_share
+    # AWS connections in use at once: every crawl worker, every scan segment, the deferred writes and SNS
+    BOTO_POOL_SIZE = var.crawl_concurrency + var.scan_segments + 2
+    BOTO_RETRY_MODE = var.boto_retry_mode
   }
 
   attach_policy_json = true
@@ -52,6 +81,7 @@ module "lambda" {
           "sns:Unsubscribe",
           "sns:SetTopicAttributes",
           "sns:Publish",
+          "lambda:InvokeFunction",
           "tag:GetResources"
         ]
         Resource = "*"
@@ -82,7 +112,11 @@ module "eventbridge" {
   rules = {
     crons = {
       description         = "Trigger for a Lambda"
-      schedule_expression = "rate(30 minutes)"
+      # due mode only reads due items, so it can afford to run often enough for the shortest check interval.
+      # Every run handles one slice of the tracked set, spreading the load evenly over the cycle.
+      # A cron aligned to the clock (unlike rate(), which fires at an offset set by the rule's
+      # creation) lets each run tell its slice from the time it starts.
+      schedule_expression = "cron(0/${local.slice_minutes} * * * ? *)"
     }
   }
 
@@ -91,7 +125,7 @@ module "eventbridge" {
       {
         name  = "price_tracker_v1_schedule"
         arn   = module.lambda.lambda_function_arn
-        input = jsonencode({"job": "cron-by-rate"})
+        input = jsonencode({"job": "cron-by-slice"})
       }
     ]
   }
@@ -10,4 +10,78 @@ variable "dynamodb_table_name" {
 variable "lambda_layer_arn"{
     type=string
   #default="arn:aws:lambda:us-east-1:637423641675:layer:price_tracker_v1_layer:8"
-}
\ No newline at end of file
+}
+variable "crawl_concurrency" {
+  description = "Number of eBay listings crawled in parallel by the scheduled price check"
+  default     = 8
+}
+
+variable "scan_segments" {
+  description = "Number of parallel scan segments used to read the tracking table"
+  default     = 1
+}
+
+variable "deadline_margin_ms" {
+  description = "Time left (ms) at which a price check stops taking new items and saves its cursor"
+  default     = 10000
+}
+
+variable "self_reinvoke" {
+  description = "Continue an unfinished price check in a new invocation instead of waiting for the next schedule tick"
+  default     = "true"
+}
+
+variable "stream_pages" {
+  description = "Stream item pages and stop downloading once the title and price are found (drops the connection, so each streamed page opens a new one)"
+  default     = "false"
+}
+
+variable "stream_min_bytes" {
+  description = "With stream_pages on, pages whose Content-Length is below this are read whole and keep their connection"
+  default     = 1048576
+}
+
+variable "check_mode" {
+  description = "scan: scan the table and check due items (backfills schedules of old items); due: query only due items through the due-index GSI"
+  default     = "scan"
+}
+
+variable "check_shards" {
+  description = "Number of due-index partitions the tracked items are spread over (must match Task1); keep it a multiple of time_slices"
+  default     = 6
+}
+
+variable "time_slices" {
+  description = "Number of slices the tracked set is split into; each scheduled run checks one slice, and runs start every cycle / time_slices minutes, rounded down to a divisor of 60"
+  default     = 6
+}
+
+variable "observation_cache" {
+  description = "Where the price check keeps recent title/price observations: memory (per container) or none"
+  default     = "memory"
+}
+
+variable "observation_ttl_seconds" {
+  description = "How old a title/price observation may be and still be used instead of crawling the page"
+  default     = 300
+}
+
+variable "write_capacity_units" {
+  description = "Write capacity units per second the price check spends on deferred schedule writes (the table has 1 WCU)"
+  default     = 1
+}
+
+variable "write_burst_units" {
+  description = "Unused write capacity the deferred schedule writes may spend at once"
+  default     = 30
+}
+
+variable "scan_capacity_share" {
+  description = "Share of the table's (or due-index's) provisioned read capacity the price check scan may use"
+  default     = 1.0
+}
+
+variable "boto_retry_mode" {
+  description = "botocore retry mode of the AWS clients: adaptive (client-side rate limiting on throttles), standard or legacy"
+  default     = "adaptive"
+}
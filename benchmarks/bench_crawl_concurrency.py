@@ -0,0 +1,48 @@
+# Items/second of the Task2 crawl stage against a local fake eBay server.
+# Usage: python benchmarks/bench_crawl_concurrency.py [--items 256] [--latency 0.05]
+import argparse
+import logging
+import os
+import time
+
+from common import FakeEbayServer, TASK2_SRC, item_crawl, setup_lambda_env
+
+# every run re-crawls the same URLs; measure the network + parse path, not the response cache
+os.environ['RESPONSE_CACHE'] = 'false'
+setup_lambda_env(TASK2_SRC)
+import handler
+from crawl_engine import crawl_concurrently
+
+crawl = item_crawl(handler)
+
+
+def run(server, n_items, concurrency):
+    items = [{'url': server.item_url(i)} for i in range(n_items)]
+    start = time.perf_counter()
+    ok = 0
+    for item, result, error in crawl_concurrently(items, crawl, concurrency):
+        if error is None and result[0] is not None:
+            ok += 1
+    elapsed = time.perf_counter() - start
+    return ok, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=256)
+    parser.add_argument('--latency', type=float, default=0.25, help='simulated eBay response time in seconds')
+    parser.add_argument('--padding-kb', type=int, default=16)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 64])
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with FakeEbayServer(latency=args.latency, padding_kb=args.padding_kb) as server:
+        print(f"{args.items} items, {args.latency * 1000:.0f} ms simulated latency, ~{args.padding_kb * 2} KB pages")
+        print(f"{'concurrency':>11} {'ok':>5} {'seconds':>8} {'items/s':>8}")
+        for concurrency in args.concurrency:
+            ok, elapsed = run(server, args.items, concurrency)
+            print(f"{concurrency:>11} {ok:>5} {elapsed:>8.2f} {ok / elapsed:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# Parse time and peak memory per extractor backend over a corpus of eBay item pages.
+# 'item' is the full extract_item chain (JSON-LD first, then scan, then bs4); the strategy
+# that produced each of its results is counted at the end.
+# The default corpus is tests/fixtures padded to a realistic page size with the kind of
+# markup that surrounds the title and price on a live page (scripts, nested divs, spans);
+# point --fixtures at a directory of pages saved from www.ebay.com to use real ones as-is.
+# Usage: python benchmarks/bench_extractors.py [--fixtures DIR] [--page-kb 400] [--repeat 5]
+import argparse
+import glob
+import os
+import statistics
+import time
+import tracemalloc
+
+from common import FIXTURES_DIR, TASK2_SRC, setup_lambda_env
+
+setup_lambda_env(TASK2_SRC)
+from tracker_common.extract import EXTRACTORS, extract_item, strategy_stats
+
+FILLER = (
+    '<div class="ux-layout-section"><div class="ux-layout-section__row">'
+    '<span class="ux-textspans ux-textspans--SECONDARY">Item specifics</span>'
+    '<a href="/sch/i.html?_nkw=x"><span class="ux-textspans">See similar items</span></a></div></div>\n'
+    '<script type="text/javascript">$rwidgets([["x", {"model": {"label": "<span>US $0.00</span>"}}]]);</script>\n'
+)
+
+
+# Put two fifths of the padding before the title block and the rest after it, as on a live page
+def pad(html, page_kb):
+    missing = page_kb * 1024 - len(html)
+    if missing <= 0:
+        return html
+    units = missing // len(FILLER) + 1
+    split = html.find('<body')
+    split = html.find('>', split) + 1 if split >= 0 else 0
+    before = units * 2 // 5
+    return html[:split] + FILLER * before + html[split:] + FILLER * (units - before)
+
+
+def load_corpus(directory, page_kb):
+    corpus = {}
+    for path in sorted(glob.glob(os.path.join(directory, '*.html'))):
+        with open(path, encoding='utf-8', errors='replace') as f:
+            html = f.read()
+        corpus[os.path.basename(path)] = pad(html, page_kb) if page_kb else html
+    return corpus
+
+
+def measure(extract, html, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = extract(html)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    extract(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, statistics.median(times), peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fixtures', default=FIXTURES_DIR)
+    parser.add_argument('--page-kb', type=int, default=400, help='pad pages to this size (0 keeps them as they are)')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.fixtures, args.page_kb if args.fixtures == FIXTURES_DIR else 0)
+    print(f"{len(corpus)} pages from {args.fixtures}\n")
+    print(f"{'page':>24} {'KB':>5} {'backend':>9} {'ms':>8} {'peak MB':>8} {'agrees':>7}")
+    backends = dict(EXTRACTORS, item=extract_item)
+    totals = {name: [0.0, 0] for name in backends}
+    strategy_stats.reset()
+    for name, html in corpus.items():
+        reference = None
+        for backend in ('bs4', 'strainer', 'scan', 'item'):
+            result, seconds, peak = measure(backends[backend], html, args.repeat)
+            reference = result if reference is None else reference
+            totals[backend][0] += seconds
+            totals[backend][1] = max(totals[backend][1], peak)
+            print(f"{name:>24} {len(html) // 1024:>5} {backend:>9} {seconds * 1000:>8.2f} "
+                  f"{peak / 2**20:>8.2f} {str(result == reference):>7}")
+    print()
+    for backend, (seconds, peak) in totals.items():
+        speedup = totals['bs4'][0] / seconds if seconds else float('inf')
+        print(f"{backend:>9}: {seconds / len(corpus) * 1000:8.2f} ms/page, peak {peak / 2**20:6.2f} MB, {speedup:6.1f}x vs bs4")
+    print(f"\nextract_item strategies (all repeats): {strategy_stats.report()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# TCP+TLS handshakes per invocation: bare requests.get versus the shared layer session.
+# Runs against a local TLS stand-in for www.ebay.com; each "invocation" crawls --items listings.
+# Usage: python benchmarks/bench_http_session.py [--invocations 5] [--items 20] [--rtt-ms 40]
+import argparse
+import time
+
+from common import FakeEbayServer, TASK2_SRC, make_self_signed_cert, setup_lambda_env
+
+setup_lambda_env(TASK2_SRC)
+import requests
+from tracker_common.http_client import CRAWL_HEADERS, fetch
+
+
+def bare_get(url, verify):
+    return requests.get(url, headers=CRAWL_HEADERS, verify=verify)
+
+
+def pooled_get(url, verify):
+    return fetch(url, verify=verify)
+
+
+def run(server, get, invocations, n_items, verify):
+    rows = []
+    for invocation in range(invocations):
+        before = server.connections_opened
+        start = time.perf_counter()
+        for i in range(n_items):
+            get(server.item_url(invocation * n_items + i), verify).raise_for_status()
+        elapsed = time.perf_counter() - start
+        rows.append((server.connections_opened - before, elapsed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--invocations', type=int, default=5)
+    parser.add_argument('--items', type=int, default=20)
+    parser.add_argument('--rtt-ms', type=float, default=40, help='assumed Lambda-to-eBay round trip for the estimate')
+    args = parser.parse_args()
+
+    certfile = make_self_signed_cert()
+    with FakeEbayServer(latency=0, padding_kb=4, certfile=certfile) as server:
+        results = {
+            'requests.get': run(server, bare_get, args.invocations, args.items, certfile),
+            'shared session': run(server, pooled_get, args.invocations, args.items, certfile),
+        }
+
+    print(f"{args.invocations} warm invocations x {args.items} listings over local TLS")
+    print(f"{'client':>15} {'invocation':>10} {'handshakes':>10} {'ms/request':>10}")
+    for name, rows in results.items():
+        for invocation, (handshakes, elapsed) in enumerate(rows, 1):
+            print(f"{name:>15} {invocation:>10} {handshakes:>10} {elapsed / args.items * 1000:>10.2f}")
+
+    # TCP connect is one round trip and a TLS 1.2/1.3 handshake one or two more
+    bare = sum(h for h, _ in results['requests.get']) / args.invocations
+    pooled = sum(h for h, _ in results['shared session']) / args.invocations
+    saved = bare - pooled
+    print(f"\nhandshakes saved per invocation: {saved:.1f} "
+          f"(~{saved * 2 * args.rtt_ms:.0f}-{saved * 3 * args.rtt_ms:.0f} ms at {args.rtt_ms:.0f} ms RTT)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# Peak memory and time-to-first-check of the Task2 price check at 10k and 100k rows:
+# the old "read the whole table into a list, then crawl" flow versus the streaming
+# scan -> crawl -> compare pipeline. Crawling is replaced by an instant fake.
+# Usage: python benchmarks/bench_pipeline_memory.py [--rows 10000 100000]
+import argparse
+import logging
+import time
+import tracemalloc
+
+from common import SyntheticTable, TASK2_SRC, setup_lambda_env
+
+setup_lambda_env(TASK2_SRC)
+import handler
+from checkpoint import ScanCursor
+from crawl_engine import crawl_concurrently
+from tracker_common.tracked_item import TrackedItem, item_url
+
+
+def fake_crawl(url):
+    return '109.99', 'Synthetic item'
+
+
+# Baseline: the pre-streaming read_dynamodb, every item appended to one list
+def read_all(table):
+    items = []
+    response = table.scan()
+    items.extend(response['Items'])
+    while 'LastEvaluatedKey' in response:
+        response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+        items.extend(response['Items'])
+    return items
+
+
+# The synthetic rows come decoded as dicts; the price check reads TrackedItems
+class TrackedTable:
+    def __init__(self, table):
+        self.table = table
+        self.name = table.name
+
+    def scan(self, **kwargs):
+        response = self.table.scan(**kwargs)
+        response['Items'] = [TrackedItem.from_item(row) for row in response['Items']]
+        return response
+
+
+def measure(run, table):
+    first_check = []
+    start = time.perf_counter()
+
+    def check(item, current_price, title):
+        if not first_check:
+            first_check.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    run(table, check)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, first_check[0], time.perf_counter() - start
+
+
+def materialized(table, check):
+    for item, result, error in crawl_concurrently(read_all(table), fake_crawl, 8):
+        check(item, *result)
+
+
+def streaming(table, check):
+    # the synthetic table has no provisioned capacity
+    handler.table = table
+    handler.scan_table = TrackedTable(table)
+    handler.read_buckets = {'scan': None}
+    for item, result, error in crawl_concurrently(handler.read_dynamodb(ScanCursor(1)), fake_crawl, 8, item_url):
+        check(item, *result)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--page-size', type=int, default=1000, help='rows per scan page (~1 MB pages in DynamoDB)')
+    parser.add_argument('--page-latency', type=float, default=0.02, help='simulated seconds per scan call')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"{'rows':>7} {'mode':>12} {'peak MB':>8} {'first check s':>13} {'total s':>8}")
+    for rows in args.rows:
+        for name, run in (('materialized', materialized), ('streaming', streaming)):
+            table = SyntheticTable(rows, args.page_size, args.page_latency)
+            peak, first, total = measure(run, table)
+            print(f"{rows:>7} {name:>12} {peak / 2**20:>8.1f} {first:>13.3f} {total:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# Hit rate, bytes saved and parse time saved by the /tmp response cache over
+# consecutive warm runs of the Task2 crawl stage against a local fake eBay server,
+# once with ETag validators (304 revalidation) and once without (content hash only).
+# Usage: python benchmarks/bench_response_cache.py [--items 100] [--runs 3]
+import argparse
+import logging
+import os
+import tempfile
+
+from common import FakeEbayServer, TASK2_SRC, item_crawl, setup_lambda_env
+
+os.environ['RESPONSE_CACHE_DIR'] = tempfile.mkdtemp(prefix='ebay-cache-bench-')
+# streamed pages are cached without their body, which rules out the content hash check
+os.environ['STREAM_PAGES'] = 'false'
+setup_lambda_env(TASK2_SRC)
+import handler
+from crawl_engine import crawl_concurrently
+from tracker_common import response_cache
+
+crawl = item_crawl(handler)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=100)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--padding-kb', type=int, default=64)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print("(parse seconds are summed over the 8 crawl threads)")
+    print(f"{'validators':>10} {'run':>3} {'requests':>8} {'hit rate':>8} {'KB sent':>8} {'KB saved':>8} "
+          f"{'parse s':>7} {'parse s saved':>13}")
+    for etags in (True, False):
+        response_cache.cache = response_cache.ResponseCache(tempfile.mkdtemp(prefix='ebay-cache-bench-'))
+        with FakeEbayServer(latency=0, padding_kb=args.padding_kb, etags=etags) as server:
+            items = [{'url': server.item_url(i) + '?hash=item1f0&_trkparms=x'} for i in range(args.items)]
+            for run in range(1, args.runs + 1):
+                response_cache.stats.reset()
+                sent_before = server.bytes_sent
+                for item, result, error in crawl_concurrently(items, crawl, 8):
+                    if error is not None:
+                        raise error
+                report = response_cache.stats.report()
+                print(f"{'ETag' if etags else 'none':>10} {run:>3} {report['requests']:>8} {report['hit_rate']:>8.0%} "
+                      f"{(server.bytes_sent - sent_before) / 1024:>8.0f} {report['bytes_saved'] / 1024:>8.0f} "
+                      f"{report['parse_seconds']:>7.2f} {report['parse_seconds_saved']:>13.2f}")
+
+
+if __name__ == '__main__':
+    main()
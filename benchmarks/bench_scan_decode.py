@@ -0,0 +1,81 @@
+# Decode cost per 10k scanned items: the boto3 resource layer (TypeDeserializer applied
+# to every attribute value of the response, as Table.scan does) versus the decoder
+# the Task2 scan uses on the low-level client (TrackedItems, see bench_tracked_item.py). The items carry the attributes Task2
+# projects. Only decoding is timed; the response copies are made beforehand.
+# Usage: python benchmarks/bench_scan_decode.py [--items 10000] [--subscribers 3] [--repeat 5]
+import argparse
+import copy
+import time
+
+from common import TASK2_SRC, setup_lambda_env, wire_item
+
+setup_lambda_env(TASK2_SRC)
+import boto3
+from boto3.dynamodb.transform import TransformationInjector
+import handler
+from tracker_common.tracked_item import TrackedItem
+
+
+def scan_response(items, subscribers):
+    return {
+        'Items': [wire_item(i, subscribers) for i in range(items)],
+        'Count': items,
+        'ScannedCount': items,
+        'LastEvaluatedKey': {'url': {'S': f'https://www.ebay.com/itm/{100000000000 + items}'}}
+    }
+
+
+def resource_decode(response, operation_model, injector):
+    injector.inject_attribute_value_output(response, operation_model)
+    return response
+
+
+def client_decode(response, decoder):
+    response['Items'] = [decoder(item) for item in response['Items']]
+    return response
+
+
+def fields(item):
+    return [getattr(item, name) for name in TrackedItem.__slots__]
+
+
+def best_of(repeat, responses, decode):
+    times = []
+    for response in responses[:repeat]:
+        start = time.perf_counter()
+        decode(response)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--subscribers', type=int, default=3, help='emails in every subscribers list')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    operation_model = boto3.session.Session().client('dynamodb').meta.service_model.operation_model('Scan')
+    injector = TransformationInjector()
+    response = scan_response(args.items, args.subscribers)
+
+    resource_seconds = best_of(args.repeat, [copy.deepcopy(response) for _ in range(args.repeat)],
+                               lambda r: resource_decode(r, operation_model, injector))
+    client_seconds = best_of(args.repeat, [copy.deepcopy(response) for _ in range(args.repeat)],
+                             lambda r: client_decode(r, handler.scan_table.decode))
+
+    # both paths must hand the read stage the same items
+    resource_items = resource_decode(copy.deepcopy(response), operation_model, injector)['Items']
+    client_items = client_decode(copy.deepcopy(response), handler.scan_table.decode)['Items']
+    assert [fields(TrackedItem.from_item(item)) for item in resource_items] == [fields(item) for item in client_items]
+
+    per_10k = 10000 / args.items
+    print(f"{args.items} items, {len(response['Items'][0])} attributes, {args.subscribers} subscribers each")
+    print(f"{'path':>9} {'ms / 10k items':>15} {'us / item':>10}")
+    for name, seconds in (('resource', resource_seconds), ('client', client_seconds)):
+        print(f"{name:>9} {seconds * per_10k * 1000:>15.1f} {seconds / args.items * 1e6:>10.2f}")
+    print(f"speed-up: {resource_seconds / client_seconds:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
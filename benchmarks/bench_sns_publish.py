@@ -0,0 +1,130 @@
+# Per-publish latency of the Task2 price drop alert: a new boto3 SNS client for every
+# publish (the old publish_sns) versus the shared client of tracker_common.aws_clients.
+# SNS is a local HTTPS stand-in (self-signed certificate), so connection setup and the
+# TLS handshake are part of what a new client pays.
+# Usage: python benchmarks/bench_sns_publish.py [--publishes 200] [--latency 0.005] [--threads 1 8]
+import argparse
+import os
+import ssl
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from common import TASK2_SRC, make_self_signed_cert, setup_lambda_env
+
+setup_lambda_env(TASK2_SRC)
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+import boto3
+from tracker_common import aws_clients
+
+PUBLISH_RESPONSE = (
+    '<PublishResponse xmlns="http://sns.amazonaws.com/doc/2010-03-31/">'
+    '<PublishResult><MessageId>00000000-0000-0000-0000-000000000000</MessageId></PublishResult>'
+    '<ResponseMetadata><RequestId>00000000-0000-0000-0000-000000000001</RequestId></ResponseMetadata>'
+    '</PublishResponse>'
+).encode()
+
+TOPIC_ARN = 'arn:aws:sns:us-east-1:123456789012:Synthetic_item'
+
+
+class FakeSNSServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, certfile, latency=0.0):
+        self.latency = latency
+        self.connections_opened = 0
+        self._lock = threading.Lock()
+        super().__init__(('127.0.0.1', 0), FakeSNSHandler)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile)
+        self.socket = context.wrap_socket(self.socket, server_side=True)
+
+    @property
+    def endpoint_url(self):
+        return f'https://127.0.0.1:{self.server_address[1]}'
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeSNSHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server._lock:
+            self.server.connections_opened += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.server.latency)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(PUBLISH_RESPONSE)))
+        self.end_headers()
+        self.wfile.write(PUBLISH_RESPONSE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# The old publish_sns: a client built for every message
+def publish_new_client(body):
+    boto3.client('sns').publish(TopicArn=TOPIC_ARN, Subject='Price Drop alert!', Message=body)
+
+
+def publish_shared_client(body):
+    aws_clients.get_client('sns').publish(TopicArn=TOPIC_ARN, Subject='Price Drop alert!', Message=body)
+
+
+def timed(publish, body):
+    start = time.perf_counter()
+    publish(body)
+    return time.perf_counter() - start
+
+
+def run(publish, publishes, threads):
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        start = time.perf_counter()
+        latencies = list(pool.map(lambda i: timed(publish, f'Price drop {i}'), range(publishes)))
+        return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--publishes', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.005, help='simulated SNS service time per publish')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8], help='publishing threads')
+    args = parser.parse_args()
+
+    certfile = make_self_signed_cert()
+    with FakeSNSServer(certfile, args.latency) as server:
+        os.environ['AWS_ENDPOINT_URL_SNS'] = server.endpoint_url
+        os.environ['AWS_CA_BUNDLE'] = certfile
+        # warm both paths (service model loading, the shared client's first connection)
+        publish_new_client('warm-up')
+        publish_shared_client('warm-up')
+
+        print(f"{'threads':>7} {'client':>7} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8} {'publish/s':>9} {'connections':>11}")
+        for threads in args.threads:
+            for name, publish in (('new', publish_new_client), ('shared', publish_shared_client)):
+                opened = server.connections_opened
+                latencies, elapsed = run(publish, args.publishes, threads)
+                latencies.sort()
+                print(f"{threads:>7} {name:>7} {statistics.median(latencies) * 1000:>8.2f} "
+                      f"{latencies[int(len(latencies) * 0.95) - 1] * 1000:>8.2f} "
+                      f"{statistics.fmean(latencies) * 1000:>8.2f} {args.publishes / elapsed:>9.0f} "
+                      f"{server.connections_opened - opened:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# Bytes read, time and peak memory per item page for the streamed fetch (stop reading
+# once title and price are found) against reading the whole page, over a local fake
+# eBay server. The fake page has its title and price half way down, like a live one.
+# An early stop drops the connection, so every streamed item pays for a new one;
+# --tls makes that a full TLS handshake, as against www.ebay.com.
+# Usage: python benchmarks/bench_streamed_fetch.py [--items 50] [--padding-kb 256] [--latency 0] [--tls] [--gzip]
+import argparse
+import logging
+import os
+import time
+import tracemalloc
+
+from common import FakeEbayServer, TASK2_SRC, make_self_signed_cert, item_crawl, setup_lambda_env
+
+os.environ['RESPONSE_CACHE'] = 'false'
+setup_lambda_env(TASK2_SRC)
+import handler
+from tracker_common import response_cache
+
+crawl = item_crawl(handler)
+
+
+def run(server, items, stream):
+    response_cache.STREAM_PAGES = stream
+    # stream every page, whatever --padding-kb makes its size
+    response_cache.STREAM_MIN_BYTES = 0
+    response_cache.stats.reset()
+    start = time.perf_counter()
+    for i in range(items):
+        price, title = crawl(server.item_url(i))
+        assert price == '123.45', (price, title)
+    seconds = (time.perf_counter() - start) / items
+    report = response_cache.stats.report()
+    # peak memory in a separate pass, tracemalloc slows everything down
+    tracemalloc.start()
+    crawl(server.item_url(items))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak, report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=50)
+    parser.add_argument('--padding-kb', type=int, default=256)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--tls', action='store_true')
+    parser.add_argument('--gzip', action='store_true', help='serve gzip-encoded pages')
+    args = parser.parse_args()
+    certfile = make_self_signed_cert() if args.tls else None
+    if certfile:
+        # requests prefers the CA bundle from the environment over Session.verify
+        os.environ['REQUESTS_CA_BUNDLE'] = certfile
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"{'mode':>8} {'ms/item':>8} {'peak MB':>8} {'KB read/item':>12} {'KB page':>8} {'read ratio':>10} {'connections':>11}")
+    for stream in (False, True):
+        with FakeEbayServer(latency=args.latency, padding_kb=args.padding_kb, certfile=certfile, gzip=args.gzip) as server:
+            seconds, peak, report = run(server, args.items, stream)
+            if stream:
+                read, page, ratio = report['bytes_read'] / args.items, report['page_bytes'] / args.items, report['read_ratio']
+            else:
+                read = page = report['bytes_read'] / args.items if report['bytes_read'] else server.bytes_sent / (args.items + 1)
+                ratio = 1.0
+            print(f"{'stream' if stream else 'full':>8} {seconds * 1000:>8.2f} {peak / 2**20:>8.2f} {read / 1024:>12.0f} "
+                  f"{page / 1024:>8.0f} {ratio:>10.2f} {server.connections_opened:>11}")
+            for encoding, counts in report['encodings'].items():
+                print(f"{'':>8} {encoding}: {counts['responses']} responses, "
+                      f"{counts['wire_bytes'] / 1024:.0f} KB on the wire, {counts['decoded_bytes'] / 1024:.0f} KB decoded")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# Memory held by scanned items, and the cost of decoding them and reading the fields
+# the price check reads: the dicts of the ItemDecoder versus slotted TrackedItems.
+# The wire items stand in for scan responses and are built before tracing starts, so
+# only the decoded representation is counted.
+# Usage: python benchmarks/bench_tracked_item.py [--items 10000 50000] [--subscribers 3] [--repeat 5]
+import argparse
+import gc
+import time
+import tracemalloc
+
+from common import TASK2_SRC, setup_lambda_env, wire_item
+
+setup_lambda_env(TASK2_SRC)
+from tracker_common.dynamo_client import ItemDecoder
+from tracker_common.tracked_item import decode_tracked_item
+
+# The number conversions the Task2 scan used before TrackedItem
+dict_decoder = ItemDecoder({
+    'next_check_at': int,
+    'last_change_at': int,
+    'listing_ends_at': int,
+    'failed_checks': int,
+    'last_price': float,
+    'volatility': float
+})
+
+
+# What one successful check reads from a dict item
+def read_dict(item):
+    return (item['url'], item.get('lowest_price'), item.get('last_price'), item.get('last_change_at'),
+            item.get('volatility'), len(item.get('subscribers', [])), item.get('listing_ends_at'), item['url'])
+
+
+# ... and from a TrackedItem
+def read_tracked(item):
+    return (item.url, item.lowest_price, item.last_price, item.last_change_at,
+            item.volatility, item.subscriber_count, item.listing_ends_at, item.url)
+
+
+def held_bytes(wire, decode):
+    gc.collect()
+    tracemalloc.start()
+    items = [decode(item) for item in wire]
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del items
+    return held
+
+
+def best_seconds(repeat, run):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--subscribers', type=int, default=3, help='emails in every subscribers list')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'items':>7} {'type':>12} {'held MB':>8} {'bytes/item':>10} {'decode ms':>10} {'access ms':>10}")
+    for count in args.items:
+        wire = [wire_item(i, args.subscribers) for i in range(count)]
+        for name, decode, read in (('dict', dict_decoder, read_dict), ('TrackedItem', decode_tracked_item, read_tracked)):
+            held = held_bytes(wire, decode)
+            decode_seconds = best_seconds(args.repeat, lambda: [decode(item) for item in wire])
+            items = [decode(item) for item in wire]
+            access_seconds = best_seconds(args.repeat, lambda: [read(item) for item in items])
+            assert [read_dict(dict_decoder(w)) for w in wire[:10]] == [read(item) for item in items[:10]]
+            print(f"{count:>7} {name:>12} {held / 2**20:>8.1f} {held / count:>10.0f} "
+                  f"{decode_seconds * 1000:>10.1f} {access_seconds * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
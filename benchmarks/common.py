@@ -0,0 +1,201 @@
+import gzip
+import hashlib
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAYER_PATH = os.path.join(ROOT, 'Task1', 'lambda_layer', 'python')
+TASK1_SRC = os.path.join(ROOT, 'Task1', 'lambda_src')
+TASK2_SRC = os.path.join(ROOT, 'Task2', 'lambda_src')
+FIXTURES_DIR = os.path.join(ROOT, 'tests', 'fixtures')
+
+
+# Make the Lambda layer and one Lambda's source importable, the way the runtime does.
+# The handlers build their boto3 resources at import time, so give them a table name and region.
+# Every crawl is measured, so the observation cache is off.
+def setup_lambda_env(src_path):
+    os.environ.setdefault('DB', 'price_tracker_bench')
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    os.environ.setdefault('OBSERVATION_CACHE', 'none')
+    for path in (LAYER_PATH, src_path):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+# The handler's page crawl without the rewrite to the listing's www.ebay.com URL,
+# which would send the requests past the fake server
+def item_crawl(handler):
+    def crawl(url):
+        price, title, _, _ = handler.crawl_observation(url)
+        return price, title
+    return crawl
+
+
+# Self-signed certificate for 127.0.0.1, written to a temp dir; returns the PEM path (cert + key)
+def make_self_signed_cert():
+    directory = tempfile.mkdtemp(prefix='fake-ebay-tls-')
+    pem = os.path.join(directory, 'server.pem')
+    key = os.path.join(directory, 'server.key')
+    subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+         '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1',
+         '-keyout', key, '-out', pem],
+        check=True, capture_output=True
+    )
+    with open(key) as f:
+        key_pem = f.read()
+    with open(pem, 'a') as f:
+        f.write(key_pem)
+    return pem
+
+
+# A minimal item page with the same spans price_crawl looks for, padded with filler markup
+def render_item_page(item_id, title='Test Item', price='123.45', padding_kb=64):
+    filler = '<div class="x-filler"><span class="ux-textspans">Lorem ipsum dolor sit amet</span></div>\n'
+    padding = filler * (padding_kb * 1024 // len(filler))
+    return (
+        '<!DOCTYPE html><html><head><title>{title} | eBay</title></head><body>\n'
+        '{padding}'
+        '<h1 class="x-item-title__mainTitle"><span class="ux-textspans ux-textspans--BOLD">{title} #{item_id}</span></h1>\n'
+        '<div class="x-price-primary"><span class="ux-textspans">US ${price}</span></div>\n'
+        '{padding}'
+        '</body></html>\n'
+    ).format(title=title, item_id=item_id, price=price, padding=padding)
+
+
+# Local stand-in for www.ebay.com: serves /itm/<id> with a fixed artificial latency
+class FakeEbayServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, latency=0.05, padding_kb=64, port=0, certfile=None, etags=False, gzip=False):
+        self.latency = latency
+        self.padding_kb = padding_kb
+        self.etags = etags
+        self.gzip = gzip
+        self.bytes_sent = 0
+        self.requests_served = 0
+        self.connections_opened = 0
+        self._lock = threading.Lock()
+        super().__init__(('127.0.0.1', port), FakeEbayHandler)
+        self.scheme = 'http'
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile)
+            self.socket = context.wrap_socket(self.socket, server_side=True)
+            self.scheme = 'https'
+
+    @property
+    def base_url(self):
+        return f'{self.scheme}://127.0.0.1:{self.server_address[1]}'
+
+    def item_url(self, item_id):
+        return f'{self.base_url}/itm/{item_id}'
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+    # clients that stop reading a page early reset the connection; that is expected
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeEbayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server._lock:
+            self.server.connections_opened += 1
+
+    def do_GET(self):
+        import time
+        time.sleep(self.server.latency)
+        item_id = self.path.rstrip('/').rsplit('/', 1)[-1]
+        body = render_item_page(item_id, padding_kb=self.server.padding_kb).encode()
+        with self.server._lock:
+            self.server.requests_served += 1
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+        if self.server.etags and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        encoded = self.server.gzip and 'gzip' in self.headers.get('Accept-Encoding', '')
+        if encoded:
+            body = gzip.compress(body, 6)
+        with self.server._lock:
+            self.server.bytes_sent += len(body)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        if encoded:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        if self.server.etags:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Stand-in for the boto3 Table: rows are generated on demand, page by page,
+# so the table itself holds nothing in memory whatever its size
+class SyntheticTable:
+    def __init__(self, n_rows, page_size=1000, page_latency=0.0, name='price_tracker_bench'):
+        self.n_rows = n_rows
+        self.page_size = page_size
+        self.page_latency = page_latency
+        self.name = name
+        self.scans = 0
+
+    def row(self, i):
+        return {
+            'url': f'https://www.ebay.com/itm/{100000000000 + i}',
+            'max_price': '129.99',
+            'lowest_price': '99.99',
+            'lowest_price_date': '2024-09-01 12:00:00',
+            'SNS_ARN': f'arn:aws:sns:us-east-1:123456789012:Synthetic_item_{i}',
+        }
+
+    def scan(self, **kwargs):
+        import time
+        time.sleep(self.page_latency)
+        self.scans += 1
+        rows = range(self.n_rows)
+        if 'TotalSegments' in kwargs:
+            rows = rows[kwargs['Segment']::kwargs['TotalSegments']]
+        start = kwargs.get('ExclusiveStartKey', {}).get('pos', 0)
+        response = {'Items': [self.row(i) for i in rows[start:start + self.page_size]]}
+        if start + self.page_size < len(rows):
+            response['LastEvaluatedKey'] = {'pos': start + self.page_size}
+        return response
+
+
+# A scanned Task2 item in the low-level wire format, with the attributes the check projects
+def wire_item(i, subscribers):
+    return {
+        'url': {'S': f'https://www.ebay.com/itm/{100000000000 + i}'},
+        'lowest_price': {'N': '99.99'},
+        'SNS_ARN': {'S': f'arn:aws:sns:us-east-1:123456789012:Synthetic_item_{i}'},
+        'subscribers': {'L': [{'S': f'user{n}@example.com'} for n in range(subscribers)]},
+        'last_price': {'N': '109.99'},
+        'last_change_at': {'N': '1725192000'},
+        'volatility': {'N': '0.1'},
+        'next_check_at': {'N': '1725193800'},
+        'failed_checks': {'N': '0'}
+    }
@@ -0,0 +1,94 @@
+# Simulates one check cycle of the scheduled Lambda and reports the peak versus
+# average request rate on eBay (crawls), DynamoDB (schedule writes) and SNS
+# (price drop notifications), with the whole table checked in one burst
+# (1 slice, the old behaviour) and with the tracked set split into time slices.
+# In scan mode (the default) a slice is a run of parallel scan segments, which DynamoDB
+# cuts out of the key hash range; in due mode it is a set of due-index shards.
+# Usage: python benchmarks/simulate_time_slices.py [--items 3000] [--slices 1 6 15] [--mode scan] [--segments 1]
+import argparse
+import collections
+import hashlib
+import random
+
+from common import TASK2_SRC, setup_lambda_env
+
+setup_lambda_env(TASK2_SRC)
+from tracker_common import schedule
+
+
+# Scan segment of a key among `segments`: DynamoDB splits the hash range of the keys
+# into equal parts (it hashes with MD5 internally)
+def scan_segment(url, segments):
+    return int(hashlib.md5(url.encode()).hexdigest(), 16) * segments >> 128
+
+
+# Slot of every url as the handler reads them: the slice whose scan segments (or
+# due-index shards) hold it
+def slots_of(urls, slices, mode, segments_per_slice):
+    if mode == 'due':
+        owner = {shard: slot for slot in range(slices) for shard in schedule.slice_shards(slot)}
+        return {url: owner[schedule.check_shard(url)] for url in urls}
+    owner = {segment: slot for slot in range(slices) for segment in schedule.slice_segments(slot, segments_per_slice)}
+    return {url: owner[scan_segment(url, slices * segments_per_slice)] for url in urls}
+
+
+def simulate(urls, slices, cycle, concurrency, latency, drop_rate, mode='scan', segments_per_slice=1, seed=1):
+    schedule.TIME_SLICES = slices
+    schedule.CHECK_SHARDS = max(slices, schedule.CHECK_SHARDS - schedule.CHECK_SHARDS % slices)
+    tick = cycle / slices
+    by_slice = collections.defaultdict(list)
+    for url, slot in slots_of(urls, slices, mode, segments_per_slice).items():
+        by_slice[slot].append(url)
+
+    rng = random.Random(seed)
+    ebay, dynamodb, sns = collections.Counter(), collections.Counter(), collections.Counter()
+    for slot in range(slices):
+        start = slot * tick
+        for i, url in enumerate(by_slice[slot]):
+            # concurrency crawls in flight, each taking `latency` seconds
+            done = int(start + (i // concurrency + 1) * latency)
+            ebay[done] += 1
+            dynamodb[done] += 1
+            if rng.random() < drop_rate:
+                sns[done] += 1
+    sizes = [len(by_slice[slot]) for slot in range(slices)]
+    return sizes, ebay, dynamodb, sns
+
+
+def rates(counter, cycle):
+    per_minute = collections.Counter()
+    for second, n in counter.items():
+        per_minute[second // 60] += n
+    total = sum(counter.values())
+    return max(counter.values(), default=0), max(per_minute.values(), default=0), total / cycle
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=3000)
+    parser.add_argument('--cycle-minutes', type=int, default=30)
+    parser.add_argument('--slices', type=int, nargs='+', default=[1, 6, 15, 30])
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds per crawl')
+    parser.add_argument('--drop-rate', type=float, default=0.05, help='share of checks that find a price drop')
+    parser.add_argument('--mode', choices=['scan', 'due'], default='scan', help='check_mode of the price check')
+    parser.add_argument('--segments', type=int, default=1, help='SCAN_SEGMENTS per slice in scan mode')
+    args = parser.parse_args()
+
+    cycle = args.cycle_minutes * 60
+    urls = [f'https://www.ebay.com/itm/{100000000000 + i}' for i in range(args.items)]
+    print(f"{args.items} items per {args.cycle_minutes} min cycle in {args.mode} mode, concurrency {args.concurrency}, "
+          f"{args.latency}s per crawl, {args.drop_rate:.0%} price drops\n")
+    print(f"{'slices':>6} {'items/run':>11} {'target':>7} {'peak/s':>7} {'peak/min':>9} {'avg/s':>6} {'peak:avg (per min)':>19}")
+    for slices in args.slices:
+        sizes, ebay, dynamodb, sns = simulate(urls, slices, cycle, args.concurrency, args.latency, args.drop_rate,
+                                              args.mode, args.segments)
+        size_range = f'{min(sizes)}-{max(sizes)}'
+        for name, counter in (('eBay', ebay), ('DynamoDB', dynamodb), ('SNS', sns)):
+            peak_s, peak_min, avg = rates(counter, cycle)
+            ratio = peak_min / (avg * 60) if avg else 0
+            print(f"{slices:>6} {size_range:>11} {name:>7} {peak_s:>7} {peak_min:>9} {avg:>6.2f} {ratio:>19.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,14 @@
-import boto3, subprocess,json
+import subprocess,json,os,sys
 from botocore.exceptions import ClientError
 
-dynamodb = boto3.resource('dynamodb')
-sns_client = boto3.client('sns')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Task1', 'lambda_layer', 'python'))
+from tracker_common.aws_clients import get_client, get_resource
+from tracker_common.capacity import read_bucket
+from tracker_common.dynamo_client import ClientTable
+from tracker_common.dynamo_scan import scan_pages
+
+dynamodb = get_resource('dynamodb')
+sns_client = get_client('sns')
 table = dynamodb.Table('price_tracker_v1')
 
 def read_dynamodb():
@@ -12,24 +18,20 @@ def read_dynamodb():
         # Define the attributes you want to retrieve
         projection_expression = "SNS_ARN"
         
-        # Scan the table with ProjectionExpression
-        response = table.scan(
-            ProjectionExpression=projection_expression,
-        )
-        items.extend(response['Items'])
-
-        # If there are more items, keep scanning
-        while 'LastEvaluatedKey' in response:
-            response = table.scan(
-                ProjectionExpression=projection_expression,
-                ExclusiveStartKey=response['LastEvaluatedKey']
-            )
-            items.extend(response['Items'])
+        # Scan the table with ProjectionExpression, paced to its provisioned read capacity
+        # so the price check and signups running meanwhile are not throttled
+        bucket = read_bucket(table)
+        for _, _, page in scan_pages(ClientTable(table), bucket=bucket, ProjectionExpression=projection_expression):
+            items.extend(page['Items'])
         
         print(f"Successfully read {len(items)} items from the table.")
+        if bucket is not None:
+            print(f"Read capacity: {bucket.report()}")
         sns_list=[]
         for item in items:
-            sns_list.append(item['SNS_ARN'])
+            # the price check cursor record has no topic
+            if 'SNS_ARN' in item:
+                sns_list.append(item['SNS_ARN'])
         print (f'List of SNS ARN in the table {sns_list}')
         return sns_list
     except ClientError as e:
@@ -0,0 +1,161 @@
+# One-off migration to item-id keys: every row whose url is not the canonical item URL
+# (tracking query strings, /itm/Title-Slug/<id>, ...) is merged into the row keyed by
+# https://www.ebay.com/itm/<id>, together with any other spelling of the same listing.
+# Subscriber lists are merged; the surviving topic gets an SNS subscription for every
+# email that was only on a merged row (they receive a new confirmation email).
+# Prints the plan by default; run with --apply to write it, then run cleanup.py to
+# delete the topics that no row refers to anymore.
+# Usage: python migrate_item_keys.py [--table price_tracker_v1] [--apply]
+import argparse
+import os
+import sys
+from decimal import Decimal
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Task1', 'lambda_layer', 'python'))
+from tracker_common.aws_clients import get_client, get_resource
+from tracker_common.capacity import read_bucket
+from tracker_common.dynamo_client import ClientTable
+from tracker_common.dynamo_scan import scan_pages
+from tracker_common.ebay_url import canonical_item_url
+from tracker_common.schedule import check_shard
+
+SCHEDULE_FIELDS = ('next_check_at', 'last_checked_at', 'last_price', 'last_change_at', 'volatility', 'listing_ends_at')
+# Attributes the running Lambdas write (signups, price checks); the merged row is only
+# written while the canonical row still holds the scanned value of each of them
+WATCHED_FIELDS = ('SNS_ARN', 'subscribers', 'lowest_price', 'lowest_price_date', 'max_price', 'max_price_date',
+                  'failed_checks', 'check_shard') + SCHEDULE_FIELDS
+MAX_MERGE_ATTEMPTS = 5
+
+
+def read_rows(table, bucket=None):
+    rows = []
+    for _, _, page in scan_pages(ClientTable(table), bucket=bucket):
+        # reserved records (price check cursor, signup leases) start with '#'
+        rows.extend(row for row in page['Items'] if not row['url'].startswith('#'))
+    print(f"Read {len(rows)} items from {table.name}.")
+    return rows
+
+
+# canonical url -> rows to merge into it, for every listing that is not stored under it alone
+def plan_merges(rows):
+    groups = {}
+    for row in rows:
+        groups.setdefault(canonical_item_url(row['url']), []).append(row)
+    return {key: group for key, group in groups.items() if len(group) > 1 or group[0]['url'] != key}
+
+
+def _price(row, name):
+    return Decimal(str(row[name]))
+
+
+# Returns the merged row and the emails its topic does not have a subscription for yet.
+# The row already under the canonical key (or the one with most subscribers) keeps its
+# topic; prices take the extremes over all rows, the schedule the most recent check.
+def merge_rows(key, rows):
+    rows = sorted(rows, key=lambda row: (row['url'] != key, -len(row.get('subscribers', []))))
+    survivor = rows[0]
+    merged = dict(survivor, url=key)
+
+    subscribers = []
+    for row in rows:
+        subscribers.extend(email for email in row.get('subscribers', []) if email not in subscribers)
+    merged['subscribers'] = subscribers
+    new_emails = [email for email in subscribers if email not in survivor.get('subscribers', [])]
+
+    priced = [row for row in rows if row.get('lowest_price') is not None]
+    if priced:
+        lowest = min(priced, key=lambda row: _price(row, 'lowest_price'))
+        merged['lowest_price'], merged['lowest_price_date'] = lowest['lowest_price'], lowest.get('lowest_price_date')
+    priced = [row for row in rows if row.get('max_price') is not None]
+    if priced:
+        highest = max(priced, key=lambda row: _price(row, 'max_price'))
+        merged['max_price'], merged['max_price_date'] = highest['max_price'], highest.get('max_price_date')
+
+    latest = max(rows, key=lambda row: int(row.get('last_checked_at', 0)))
+    for name in SCHEDULE_FIELDS:
+        if name in latest:
+            merged[name] = latest[name]
+    if 'next_check_at' in merged:
+        merged['check_shard'] = check_shard(key)
+    return merged, new_emails
+
+
+# put_item arguments that make the write fail once the canonical row no longer is what
+# was scanned: every scanned attribute unchanged and no watched attribute added, or,
+# when there was no canonical row, still none
+def unchanged_condition(key, rows):
+    scanned = next((row for row in rows if row['url'] == key), None)
+    if scanned is None:
+        return {'ConditionExpression': 'attribute_not_exists(#k)', 'ExpressionAttributeNames': {'#k': 'url'}}
+    terms, names, values = [], {}, {}
+    for i, name in enumerate(sorted(set(scanned) | set(WATCHED_FIELDS))):
+        names[f'#a{i}'] = name
+        if name in scanned:
+            values[f':v{i}'] = scanned[name]
+            terms.append(f'#a{i} = :v{i}')
+        else:
+            terms.append(f'attribute_not_exists(#a{i})')
+    return {
+        'ConditionExpression': ' AND '.join(terms),
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values
+    }
+
+
+# The merged row is written before the old ones are deleted, so an interrupted run
+# leaves duplicates behind rather than losing subscribers; running again finishes it.
+# A signup or price check that changed the canonical row since the scan fails the
+# write; the row is then read again and merged anew. Returns False if it kept changing.
+def apply_merge(table, sns_client, key, rows, merged, new_emails):
+    for _ in range(MAX_MERGE_ATTEMPTS):
+        try:
+            table.put_item(Item=merged, **unchanged_condition(key, rows))
+            break
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+        print(f"{key} changed since it was read, merging again.")
+        current = table.get_item(Key={'url': key}, ConsistentRead=True).get('Item')
+        rows = [row for row in rows if row['url'] != key] + ([current] if current is not None else [])
+        merged, new_emails = merge_rows(key, rows)
+    else:
+        print(f"{key} kept changing, skipped. Run the migration again.")
+        return False
+    for row in rows:
+        if row['url'] != key:
+            table.delete_item(Key={'url': row['url']})
+    for email in new_emails:
+        sns_client.subscribe(TopicArn=merged['SNS_ARN'], Protocol='email', Endpoint=email)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--table', default='price_tracker_v1')
+    parser.add_argument('--apply', action='store_true', help='write the merges instead of only printing them')
+    args = parser.parse_args()
+
+    table = get_resource('dynamodb').Table(args.table)
+    sns_client = get_client('sns')
+    # paced to the table's read capacity so the running Lambdas are not throttled
+    plan = plan_merges(read_rows(table, read_bucket(table)))
+    if not plan:
+        print("Every item is already keyed by its canonical URL.")
+        return
+    skipped = 0
+    for key, rows in plan.items():
+        merged, new_emails = merge_rows(key, rows)
+        print(f"{key} <- {[row['url'] for row in rows]}: {len(merged['subscribers'])} subscribers, "
+              f"{len(new_emails)} new on {merged['SNS_ARN']}")
+        if args.apply and not apply_merge(table, sns_client, key, rows, merged, new_emails):
+            skipped += 1
+    if skipped:
+        print(f"Skipped {skipped} items that kept changing.")
+    print(f"{'Merged' if args.apply else 'Would merge'} {sum(len(rows) for rows in plan.values())} rows into {len(plan)} items.")
+    if args.apply:
+        print("Run cleanup.py to delete the SNS topics of the merged rows.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Shared Lambda code lives in the layer; make it importable the way the Lambda runtime does
+LAYER_PATH = os.path.join(ROOT, 'Task1', 'lambda_layer', 'python')
+if LAYER_PATH not in sys.path:
+    sys.path.insert(0, LAYER_PATH)
+
+# The price check Lambda's own modules (checkpoint, crawl_engine, handler). Its handler
+# builds its table at import time, which needs a table name and a region.
+TASK2_SRC = os.path.join(ROOT, 'Task2', 'lambda_src')
+if TASK2_SRC not in sys.path:
+    sys.path.insert(0, TASK2_SRC)
+os.environ.setdefault('DB', 'price_tracker_test')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('OBSERVATION_CACHE', 'none')
@@ -0,0 +1,23 @@
+import threading
+from tracker_common import aws_clients
+
+
+def test_clients_are_built_once_and_shared(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setattr(aws_clients, '_clients', {})
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(aws_clients.get_client('sns'))) for _ in range(8)]
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+    assert len({id(client) for client in clients}) == 1
+    assert aws_clients.get_client('sns') is clients[0]
+
+
+def test_clients_use_the_tuned_config(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setattr(aws_clients, '_clients', {})
+    config = aws_clients.get_client('dynamodb').meta.config
+    assert config.max_pool_connections == aws_clients.POOL_SIZE
+    assert (config.connect_timeout, config.read_timeout) == (aws_clients.CONNECT_TIMEOUT, aws_clients.READ_TIMEOUT)
+    assert config.retries['mode'] == 'adaptive'
+    assert config.tcp_keepalive is True
@@ -0,0 +1,170 @@
+import time
+from decimal import Decimal
+import pytest
+import handler
+from checkpoint import CURSOR_KEY, ScanCursor, clear_cursor, load_cursor, save_cursor
+from tracker_common.tracked_item import TrackedItem
+from tracker_common.write_behind import WriteBehind
+from test_dynamo_scan import FakeTable
+
+
+# Fake table keyed by url, with the item operations the cursor uses. Pages continue
+# after the row whose key is the ExclusiveStartKey, and like DynamoDB a page counts
+# the rows it read before the due filter drops the ones that are not due.
+class CursorTable(FakeTable):
+    def __init__(self, rows, page_size=2):
+        super().__init__(rows, page_size)
+        self.items = {}
+
+    def scan(self, **kwargs):
+        self.calls.append(kwargs)
+        urls = [row['url'] for row in self.rows]
+        start = urls.index(kwargs['ExclusiveStartKey']['url']) + 1 if 'ExclusiveStartKey' in kwargs else 0
+        read = self.rows[start:start + kwargs.get('Limit', self.page_size)]
+        now = kwargs.get('ExpressionAttributeValues', {}).get(':now')
+        items = [row for row in read if now is None or row.get('next_check_at', now) <= now]
+        response = {'Items': items, 'Count': len(items), 'ScannedCount': len(read)}
+        if start + len(read) < len(self.rows):
+            response['LastEvaluatedKey'] = {'url': read[-1]['url']}
+        return response
+
+    def get_item(self, Key, ConsistentRead=False):
+        item = self.items.get(Key['url'])
+        return {'Item': item} if item is not None else {}
+
+    def put_item(self, Item):
+        self.items[Item['url']] = Item
+
+    def delete_item(self, Key):
+        self.items.pop(Key['url'], None)
+
+
+# The price check reads TrackedItems from the low-level client; the fake returns dicts
+class TrackedScan:
+    def __init__(self, table):
+        self.table = table
+        self.name = table.name
+
+    def scan(self, **kwargs):
+        response = self.table.scan(**kwargs)
+        response['Items'] = [TrackedItem.from_item(row) for row in response['Items']]
+        return response
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = CursorTable([{'url': f'https://www.ebay.com/itm/{i}', 'lowest_price': Decimal('10')} for i in range(10)])
+    monkeypatch.setattr(handler, 'table', table)
+    monkeypatch.setattr(handler, 'scan_table', TrackedScan(table))
+    monkeypatch.setattr(handler, 'read_buckets', {'scan': None})
+    return table
+
+
+def test_cursor_tracks_the_last_item_handed_out():
+    cursor = ScanCursor(2)
+    assert cursor.start_keys() == {0: None, 1: None}
+    cursor.advance(0, {'url': 'a'})
+    cursor.advance(0, {'url': 'b'})
+    assert cursor.start_keys() == {0: {'url': 'b'}, 1: None}
+    cursor.end_page(0, {'LastEvaluatedKey': {'url': 'k'}})
+    cursor.end_page(1, {})
+    assert cursor.start_keys() == {0: {'url': 'k'}} and not cursor.finished
+
+
+def test_resume_key_includes_the_due_index_key():
+    item = TrackedItem('https://www.ebay.com/itm/1', next_check_at=1700000000)
+    assert handler.resume_key('scan', 3, item) == {'url': item.url}
+    assert handler.resume_key('due', 3, item) == {'check_shard': 3, 'next_check_at': 1700000000, 'url': item.url}
+
+
+def test_cursor_round_trips_through_its_item():
+    cursor = ScanCursor(4, {1: {'url': 'k'}, 2: None}, mode='due')
+    item = cursor.to_item()
+    assert item['url'] == CURSOR_KEY
+    restored = ScanCursor.from_item(item)
+    assert (restored.segments, restored.mode, restored.positions) == (4, 'due', cursor.positions)
+    assert ScanCursor.from_item(ScanCursor(4, {}, slot=3).to_item()).slot == 3
+
+
+def test_load_cursor(table):
+    cursor, saved_at = load_cursor(table, 2, active=[1])
+    assert saved_at is None and cursor.start_keys() == {1: None}
+    save_cursor(table, ScanCursor(2, {1: {'url': 'k'}}))
+    cursor, saved_at = load_cursor(table, 2)
+    assert saved_at is not None and cursor.positions == {1: {'url': 'k'}}
+    # a cursor saved with another segment count or mode starts a new cycle
+    assert load_cursor(table, 3)[1] is None
+    assert load_cursor(table, 2, mode='due')[1] is None
+
+
+def test_every_slice_has_its_own_cursor(table):
+    save_cursor(table, ScanCursor(4, {1: {'url': 'k'}}, slot=0))
+    assert set(table.items) == {f'{CURSOR_KEY}#0'}
+    # another slice starts over its own segments instead of resuming slice 0
+    cursor, saved_at = load_cursor(table, 4, active=[2, 3], slot=1)
+    assert saved_at is None and cursor.start_keys() == {2: None, 3: None} and cursor.slot == 1
+    cursor, saved_at = load_cursor(table, 4, active=[0, 1], slot=0)
+    assert saved_at is not None and cursor.slot == 0 and cursor.positions == {1: {'url': 'k'}}
+    clear_cursor(table, 1)
+    assert set(table.items) == {f'{CURSOR_KEY}#0'}
+    clear_cursor(table, 0)
+    assert table.items == {}
+
+
+def test_resumed_run_continues_the_slice_its_chain_started(table, monkeypatch):
+    invoked = []
+    monkeypatch.setattr(handler, 'current_slice', lambda: 1)
+    monkeypatch.setattr(handler, 'load_cursor', lambda table, segments, mode, active, slot: invoked.append(slot) or
+                        (ScanCursor(segments, {}, slot=slot), None))
+    monkeypatch.setattr(handler, 'WriteBehind', lambda table: WriteBehind(table, table_factory=lambda t: t))
+    handler.lambda_handler({'job': 'resume', 'slot': 0}, None)
+    handler.lambda_handler({}, None)
+    assert invoked == [0, 1]
+
+
+def test_stopped_scan_resumes_where_it_stopped(table):
+    cursor, _ = load_cursor(table, 1)
+    first = []
+    for item in handler.read_dynamodb(cursor, lambda: len(first) >= 3):
+        first.append(item.url)
+    assert len(first) == 3 and not cursor.finished
+    save_cursor(table, cursor)
+
+    cursor, saved_at = load_cursor(table, 1)
+    assert saved_at is not None
+    rest = [item.url for item in handler.read_dynamodb(cursor)]
+    assert cursor.finished
+    assert sorted(first + rest) == sorted(row['url'] for row in table.rows)
+
+
+def test_resume_after_checks_rescheduled_the_page_skips_nothing(table):
+    table.page_size = 5
+    now = int(time.time())
+    cursor, _ = load_cursor(table, 1)
+    first = []
+    for item in handler.read_dynamodb(cursor, lambda: len(first) >= 3):
+        first.append(item.url)
+    # the checks of the first three items are written before the cursor is saved
+    for row in table.rows:
+        if row['url'] in first:
+            row['next_check_at'] = now + 3600
+    save_cursor(table, cursor)
+
+    cursor, _ = load_cursor(table, 1)
+    rest = [item.url for item in handler.read_dynamodb(cursor)]
+    assert cursor.finished
+    assert first + rest == [row['url'] for row in table.rows]
+
+
+def test_stop_before_the_first_page_requests_nothing(table):
+    cursor, _ = load_cursor(table, 1)
+    assert list(handler.read_dynamodb(cursor, lambda: True)) == []
+    assert table.calls == [] and not cursor.finished
+
+
+def test_scan_filters_out_reserved_records(table):
+    cursor, _ = load_cursor(table, 1)
+    list(handler.read_dynamodb(cursor))
+    scan = table.calls[0]
+    assert 'NOT begins_with(#u, :reserved)' in scan['FilterExpression']
+    assert scan['ExpressionAttributeValues'][':reserved'] == '#' and scan['ExpressionAttributeNames']['#u'] == 'url'
@@ -0,0 +1,69 @@
+import threading
+import time
+from crawl_engine import crawl_concurrently
+
+ITEMS = [{'url': f'https://www.ebay.com/itm/{i}'} for i in range(20)]
+
+
+# Crawl that records how many calls run at once
+class Crawler:
+    def __init__(self, seconds=0.05):
+        self.seconds = seconds
+        self.lock = threading.Lock()
+        self.running = 0
+        self.widest = 0
+
+    def __call__(self, url):
+        with self.lock:
+            self.running += 1
+            self.widest = max(self.widest, self.running)
+        time.sleep(self.seconds)
+        with self.lock:
+            self.running -= 1
+        return url.rsplit('/', 1)[1]
+
+
+def test_in_flight_crawls_are_bounded_by_the_concurrency():
+    crawl = Crawler()
+    results = list(crawl_concurrently(ITEMS, crawl, concurrency=4))
+    assert crawl.widest == 4
+    assert sorted(result for _, result, _ in results) == sorted(str(i) for i in range(20))
+    assert all(result == item['url'].rsplit('/', 1)[1] and error is None for item, result, error in results)
+    # a width below one still crawls, one page at a time
+    crawl = Crawler(0)
+    assert len(list(crawl_concurrently(ITEMS[:3], crawl, concurrency=0))) == 3 and crawl.widest == 1
+
+
+def test_items_are_pulled_no_further_ahead_than_the_pool_width():
+    pulled = []
+
+    def items():
+        for item in ITEMS:
+            pulled.append(item)
+            yield item
+
+    results = crawl_concurrently(items(), Crawler(), concurrency=3)
+    assert pulled == []
+    next(results)
+    assert len(pulled) == 3
+    list(results)
+    assert len(pulled) == len(ITEMS)
+
+
+def test_a_failed_crawl_is_reported_with_its_item():
+    def crawl(url):
+        if url.endswith('/3'):
+            raise ValueError('no price')
+        return url
+
+    results = {item['url']: (result, error) for item, result, error in
+               crawl_concurrently(ITEMS[:6], crawl, concurrency=2)}
+    result, error = results.pop('https://www.ebay.com/itm/3')
+    assert result is None and isinstance(error, ValueError)
+    assert all(result == url and error is None for url, (result, error) in results.items())
+
+
+def test_url_of_picks_the_url():
+    items = [('a', 'https://www.ebay.com/itm/1')]
+    assert list(crawl_concurrently(items, lambda url: url, url_of=lambda item: item[1])) == \
+        [(items[0], 'https://www.ebay.com/itm/1', None)]
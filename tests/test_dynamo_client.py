@@ -0,0 +1,79 @@
+from decimal import Decimal
+from boto3.dynamodb.types import TypeDeserializer
+from tracker_common.dynamo_client import ClientTable, ItemDecoder
+from tracker_common.dynamo_scan import scan_pages
+
+WIRE_ITEM = {
+    'url': {'S': 'https://www.ebay.com/itm/133058473014'},
+    'lowest_price': {'N': '99.99'},
+    'SNS_ARN': {'S': 'arn:aws:sns:us-east-1:123456789012:Item'},
+    'next_check_at': {'N': '1700000000'},
+    'subscribers': {'L': [{'S': 'a@example.com'}, {'S': 'b@example.com'}]},
+    'volatility': {'N': '0.2'},
+    'lowest_price_date': {'NULL': True},
+    'tags': {'SS': ['x']}
+}
+
+
+class FakeClient:
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+
+    def scan(self, **kwargs):
+        self.requests.append(kwargs)
+        return self.pages[len(self.requests) - 1]
+
+    def update_item(self, **kwargs):
+        self.requests.append(kwargs)
+        return {'Attributes': {'lowest_price': {'N': '10'}}}
+
+
+class FakeTable:
+    name = 'price_tracker_test'
+
+
+def test_decoder_matches_the_resource_layer():
+    deserializer = TypeDeserializer()
+    expected = {name: deserializer.deserialize(value) for name, value in WIRE_ITEM.items()}
+    assert ItemDecoder()(WIRE_ITEM) == expected
+
+
+def test_decoder_converts_configured_numbers():
+    item = ItemDecoder({'next_check_at': int})(WIRE_ITEM)
+    assert item['next_check_at'] == 1700000000 and isinstance(item['next_check_at'], int)
+    assert item['lowest_price'] == Decimal('99.99')
+    # rows written before prices were Numbers
+    assert ItemDecoder()({'lowest_price': {'S': '99.99'}}) == {'lowest_price': '99.99'}
+
+
+def test_client_table_keeps_the_resource_format_for_keys_and_values():
+    client = FakeClient([
+        {'Items': [WIRE_ITEM], 'LastEvaluatedKey': {'url': {'S': 'k1'}}},
+        {'Items': []}
+    ])
+    table = ClientTable(FakeTable(), client=client)
+    pages = list(scan_pages(
+        table,
+        FilterExpression='next_check_at <= :now',
+        ExpressionAttributeValues={':now': 1700000000}
+    ))
+    assert [start_key for _, start_key, _ in pages] == [None, {'url': 'k1'}]
+    assert pages[0][2]['Items'][0]['url'] == 'https://www.ebay.com/itm/133058473014'
+    assert client.requests[0]['TableName'] == 'price_tracker_test'
+    assert client.requests[0]['ExpressionAttributeValues'] == {':now': {'N': '1700000000'}}
+    assert client.requests[1]['ExclusiveStartKey'] == {'url': {'S': 'k1'}}
+
+
+def test_client_table_update_encodes_the_key_and_values():
+    client = FakeClient([])
+    response = ClientTable(FakeTable(), client=client).update_item(
+        Key={'url': 'k1'},
+        UpdateExpression='SET lowest_price = :price',
+        ExpressionAttributeValues={':price': Decimal('9.50')},
+        ReturnValues='UPDATED_OLD'
+    )
+    assert client.requests[0]['TableName'] == 'price_tracker_test'
+    assert client.requests[0]['Key'] == {'url': {'S': 'k1'}}
+    assert client.requests[0]['ExpressionAttributeValues'] == {':price': {'N': '9.50'}}
+    assert response['Attributes'] == {'lowest_price': Decimal('10')}
@@ -0,0 +1,136 @@
+import threading
+import pytest
+from botocore.exceptions import ClientError
+from tracker_common import dynamo_scan
+from tracker_common.capacity import CapacityBucket
+from tracker_common.dynamo_scan import scan_pages
+
+
+class FakeTable:
+    name = 'price_tracker_test'
+
+    def __init__(self, rows, page_size=2):
+        self.rows = rows
+        self.page_size = page_size
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def scan(self, **kwargs):
+        with self.lock:
+            self.calls.append(kwargs)
+        rows = self.rows
+        page_size = kwargs.get('Limit', self.page_size)
+        if 'TotalSegments' in kwargs:
+            rows = [r for i, r in enumerate(rows) if i % kwargs['TotalSegments'] == kwargs['Segment']]
+        start = kwargs.get('ExclusiveStartKey', {}).get('pos', 0)
+        page = rows[start:start + page_size]
+        response = {'Items': page, 'Count': len(page), 'ScannedCount': len(page)}
+        if 'ReturnConsumedCapacity' in kwargs:
+            # half a unit per item
+            response['ConsumedCapacity'] = {'CapacityUnits': len(page) / 2}
+        if start + page_size < len(rows):
+            response['LastEvaluatedKey'] = {'pos': start + page_size}
+        return response
+
+
+# Throttles the first `throttles` requests
+class ThrottledTable(FakeTable):
+    def __init__(self, rows, throttles):
+        super().__init__(rows)
+        self.throttles = throttles
+
+    def scan(self, **kwargs):
+        if self.throttles:
+            self.throttles -= 1
+            raise ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException', 'Message': 'slow down'}}, 'Scan')
+        return super().scan(**kwargs)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_scan_pages_keeps_attribute_names_on_continuation():
+    table = FakeTable([{'url': str(i)} for i in range(5)])
+    pages = list(scan_pages(table, ProjectionExpression='#u', ExpressionAttributeNames={'#u': 'url'}))
+    assert [item['url'] for _, _, page in pages for item in page['Items']] == ['0', '1', '2', '3', '4']
+    assert [start_key for _, start_key, _ in pages] == [None, {'pos': 2}, {'pos': 4}]
+    assert len(table.calls) == 3
+    assert all(call['ExpressionAttributeNames'] == {'#u': 'url'} for call in table.calls)
+
+
+def test_scan_pages_parallel_segments():
+    table = FakeTable([{'url': str(i)} for i in range(20)])
+    pages = list(scan_pages(table, 4, table_factory=lambda t: t, ProjectionExpression='#u'))
+    urls = sorted(int(item['url']) for _, _, page in pages for item in page['Items'])
+    assert urls == list(range(20))
+    assert {call['Segment'] for call in table.calls} == {0, 1, 2, 3}
+    assert all(call['TotalSegments'] == 4 for call in table.calls)
+
+
+def test_scan_pages_resumes_from_start_keys():
+    table = FakeTable([{'url': str(i)} for i in range(12)])
+    # segment 0 resumes at its second page, segment 1 is already finished
+    pages = list(scan_pages(table, 2, start_keys={0: {'pos': 2}}, table_factory=lambda t: t))
+    assert sorted(int(item['url']) for _, _, page in pages for item in page['Items']) == [4, 6, 8, 10]
+    assert {segment for segment, _, _ in pages} == {0}
+
+
+def test_paced_scan_charges_consumed_capacity_and_sizes_pages():
+    table = FakeTable([{'url': str(i)} for i in range(40)])
+    clock = FakeClock()
+    bucket = CapacityBucket(2, 4, clock=clock, sleep=clock.sleep)
+    pages = list(scan_pages(table, bucket=bucket))
+    assert sum(len(page['Items']) for _, _, page in pages) == 40
+    assert all(call['ReturnConsumedCapacity'] == 'TOTAL' for call in table.calls)
+    # the first page guesses eight items per unit; the fake has two, so later pages
+    # hold one burst of four units
+    assert [call.get('Limit') for call in table.calls[:2]] == [32, 8]
+    assert bucket.consumed == 20
+    # the first page (16 units) leaves the bucket 12 units in debt; the second one
+    # waits until a unit is back, 6.5 seconds at 2 units per second
+    assert clock.now == pytest.approx(6.5)
+
+
+def test_throttled_page_is_retried(monkeypatch):
+    monkeypatch.setattr(dynamo_scan, 'BACKOFF_SECONDS', 0.01)
+    table = ThrottledTable([{'url': str(i)} for i in range(5)], throttles=2)
+    clock = FakeClock()
+    bucket = CapacityBucket(100, 100, clock=clock, sleep=clock.sleep)
+    pages = list(scan_pages(table, bucket=bucket))
+    assert [item['url'] for _, _, page in pages for item in page['Items']] == ['0', '1', '2', '3', '4']
+    assert bucket.throttled == 2
+
+
+def test_unpaced_scan_raises_throttling():
+    table = ThrottledTable([{'url': '0'}], throttles=1)
+    with pytest.raises(ClientError):
+        list(scan_pages(table))
+
+
+def test_stop_ends_the_scan_before_the_next_request():
+    table = FakeTable([{'url': str(i)} for i in range(100)])
+    assert list(scan_pages(table, stop=lambda: True)) == []
+    assert table.calls == []
+
+    pages = []
+    for page in scan_pages(table, stop=lambda: len(pages) >= 3):
+        pages.append(page)
+    assert len(pages) == 3 and len(table.calls) == 3
+    assert pages[-1][2]['LastEvaluatedKey'] == {'pos': 6}
+
+
+def test_stop_ends_a_capacity_wait():
+    table = ThrottledTable([{'url': str(i)} for i in range(5)], throttles=8)
+    clock = FakeClock()
+    bucket = CapacityBucket(1, 1, clock=clock, sleep=clock.sleep)
+    # stop once ten seconds have passed; eight throttles in a row would back off for minutes
+    assert list(scan_pages(table, bucket=bucket, stop=lambda: clock.now >= 10)) == []
+    assert clock.now < 11
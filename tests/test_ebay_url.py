@@ -0,0 +1,42 @@
+import pytest
+from tracker_common.ebay_url import canonical_item_url, item_id, item_key, parse_item_url
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('https://www.ebay.com/itm/133058473014', '133058473014'),
+    ('https://www.ebay.com/itm/133058473014?hash=item1efa&_trkparms=x#tab', '133058473014'),
+    ('https://www.ebay.com/itm/Apple-iPhone-13-128GB/133058473014', '133058473014'),
+    ('https://www.ebay.com/itm/133058473014/', '133058473014'),
+    ('https://www.ebay.com/sch/i.html?_nkw=iphone', None),
+    ('https://www.ebay.com/itm/1', '1'),
+    ('https://www.ebay.com/itm/Slug-Only', None),
+])
+def test_item_id(url, expected):
+    assert item_id(url) == expected
+
+
+def test_item_key_falls_back_to_canonical_url():
+    assert item_key('https://WWW.EBAY.com/p/1234?x=1') == 'https://www.ebay.com/p/1234'
+    assert item_key('http://www.ebay.com/itm/133058473014?x=1') == '133058473014'
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('https://www.ebay.com/itm/133058473014', '133058473014'),
+    ('http://ebay.com/itm/Apple-iPhone-13/133058473014/?hash=x#tab', '133058473014'),
+    ('https://m.ebay.com/itm/1', '1'),
+    ('', None),
+    (None, None),
+    ('https://www.amazon.com/itm/133058473014', None),
+    ('https://www.ebay.com.evil.io/itm/133058473014', None),
+    ('ftp://www.ebay.com/itm/133058473014', None),
+    ('https://www.ebay.com/sch/i.html?_nkw=iphone', None),
+    ('https://www.ebay.com/itm/133058473014/reviews', None),
+    ('https://[www.ebay.com/itm/1', None),
+    ('https://www.ebay.com/itm/' + '1' * 3000, None),
+])
+def test_parse_item_url(url, expected):
+    assert parse_item_url(url) == expected
+
+
+def test_canonical_item_url():
+    assert canonical_item_url('https://www.ebay.com/itm/Slug/133058473014?x=1') == 'https://www.ebay.com/itm/133058473014'
@@ -0,0 +1,120 @@
+import json
+import os
+import pytest
+from tracker_common.extract import (
+    EXTRACTORS, ItemPageScanner, extract_item, extract_json_ld, extract_stream_with_strategy,
+    extract_with_strategy, strategy_stats
+)
+from tracker_common.prices import price_number
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+EXPECTED = {
+    'item_fixed_price.html': ('1299.99', 'Apple iPhone 13 128GB & Case - Unlocked'),
+    'item_per_unit.html': ('4.99', 'Lot of 10 AA Batteries'),
+    'item_auction.html': ('845.00', 'Vintage Omega Seamaster "De Ville" 1968'),
+    'item_no_price.html': (None, 'Nintendo Switch OLED'),
+    'item_json_ld.html': ('1249.00', 'Sony WH-1000XM5 Wireless Headphones & Case'),
+    'item_json_ld_foreign.html': ('2690.12', 'Leica M6 Body'),
+}
+
+
+def load(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('backend', sorted(EXTRACTORS))
+@pytest.mark.parametrize('fixture', sorted(EXPECTED))
+def test_backends_agree_with_expected_fields(backend, fixture):
+    assert EXTRACTORS[backend](load(fixture)) == EXPECTED[fixture]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64])
+def test_scanner_handles_chunked_input(chunk_size):
+    html = load('item_fixed_price.html')
+    scanner = ItemPageScanner()
+    for i in range(0, len(html), chunk_size):
+        if scanner.feed(html[i:i + chunk_size]):
+            break
+    assert (scanner.price, scanner.title) == EXPECTED['item_fixed_price.html']
+    # the scanner stops before the second ("Approximately") price
+    assert i < len(html) - chunk_size
+
+
+def test_extract_item_falls_back_to_bs4(monkeypatch):
+    monkeypatch.setitem(EXTRACTORS, 'scan', lambda html: (None, None))
+    assert extract_item(load('item_per_unit.html'), 'scan') == EXPECTED['item_per_unit.html']
+
+
+def test_json_ld_reads_product_offer():
+    assert extract_json_ld(load('item_json_ld.html')) == EXPECTED['item_json_ld.html']
+    assert extract_json_ld(load('item_fixed_price.html')) == (None, None)
+
+
+def test_json_ld_ignores_other_currencies():
+    assert extract_json_ld(load('item_json_ld_foreign.html')) == (None, None)
+
+
+@pytest.mark.parametrize('price', ['NaN', 'Infinity', '-Infinity', 'n/a'])
+def test_json_ld_ignores_prices_that_are_not_numbers(price):
+    assert extract_json_ld(json_ld_page({'price': price})) == (None, None)
+    assert price_number(price) is None
+
+
+@pytest.mark.parametrize('fixture, strategy', [
+    ('item_json_ld.html', 'json_ld'),
+    ('item_json_ld_foreign.html', 'scan'),
+    ('item_fixed_price.html', 'scan'),
+    ('item_no_price.html', 'none'),
+])
+def test_extract_records_strategy(fixture, strategy):
+    strategy_stats.reset()
+    price, title, used, ends_at = extract_with_strategy(load(fixture), 'scan')
+    assert (price, title) == EXPECTED[fixture]
+    assert used == strategy and ends_at is None
+    assert strategy_stats.report() == {strategy: 1}
+
+
+def json_ld_page(offer):
+    offer = dict({'price': '845.00', 'priceCurrency': 'USD'}, **offer)
+    return ('<html><head><script type="application/ld+json">'
+            + json.dumps({'@type': 'Product', 'name': 'Watch', 'offers': offer})
+            + '</script></head><body>' + 'filler ' * 200 + '</body></html>')
+
+
+@pytest.mark.parametrize('offer, ends_at', [
+    ({'availabilityEnds': '2023-11-14T22:13:20Z'}, 1700000000),
+    ({'availabilityEnds': '2023-11-14T23:13:20+01:00', 'priceValidUntil': '2030-01-01'}, 1700000000),
+    # a date alone lasts until the end of that day
+    ({'priceValidUntil': '2023-11-14'}, 1700006400),
+    ({'priceValidUntil': 'soon'}, None),
+    ({}, None),
+])
+def test_json_ld_offer_end_is_the_listing_end(offer, ends_at):
+    html = json_ld_page(offer)
+    assert extract_with_strategy(html)[2:] == ('json_ld', ends_at)
+    assert extract_stream_with_strategy(iter([html[:50], html[50:]]))[2:] == ('json_ld', ends_at)
+
+
+def test_stream_stops_reading_once_fields_are_found():
+    html = load('item_json_ld.html')
+    chunks = [html[i:i + 32] for i in range(0, len(html), 32)]
+    consumed = []
+
+    def feed():
+        for chunk in chunks:
+            consumed.append(chunk)
+            yield chunk
+
+    strategy_stats.reset()
+    assert extract_stream_with_strategy(feed())[:2] == EXPECTED['item_json_ld.html']
+    assert len(consumed) < len(chunks)
+    assert strategy_stats.report() == {'json_ld': 1}
+
+
+def test_stream_falls_back_to_the_full_chain():
+    html = load('item_no_price.html')
+    strategy_stats.reset()
+    assert extract_stream_with_strategy(iter([html[:100], html[100:]]))[:2] == EXPECTED['item_no_price.html']
+    assert strategy_stats.report() == {'none': 1}
@@ -0,0 +1,83 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from tracker_common import http_client
+
+
+class TooManyRequests(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests += 1
+        self.send_response(429)
+        self.send_header('Retry-After', '3600')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Sends a 1 MB page a little at a time, well within the read timeout each time
+class SlowPage(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(1024 * 1024))
+        self.end_headers()
+        try:
+            for _ in range(1024):
+                self.wfile.write(b'x' * 1024)
+                self.wfile.flush()
+                time.sleep(0.02)
+        except OSError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(handler):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_worst_case_fits_the_deadline_margin():
+    # the price check stops taking items 10 s before its timeout
+    assert http_client.worst_case_seconds() < 10
+
+
+def test_long_retry_after_is_capped():
+    server = serve(TooManyRequests)
+    try:
+        session = http_client.build_session()
+        start = time.monotonic()
+        with pytest.raises(requests.exceptions.RetryError):
+            session.get(f'http://127.0.0.1:{server.server_address[1]}/itm/1', timeout=(1, 1))
+        assert time.monotonic() - start < http_client.MAX_RETRY_WAIT + 1
+        assert server.requests == http_client.RETRIES + 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_slow_download_is_cut_off_at_the_total_timeout(monkeypatch, stream):
+    monkeypatch.setattr(http_client, 'TOTAL_TIMEOUT', 0.3)
+    monkeypatch.setattr(http_client, '_session', http_client.build_session(retries=0))
+    server = serve(SlowPage)
+    try:
+        start = time.monotonic()
+        with pytest.raises(requests.exceptions.Timeout):
+            response = http_client.fetch(f'http://127.0.0.1:{server.server_address[1]}/itm/1', stream=stream)
+            for _ in http_client.iter_body(response, 1024):
+                pass
+        assert time.monotonic() - start < 1
+    finally:
+        server.shutdown()
+        server.server_close()
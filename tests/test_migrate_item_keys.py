@@ -0,0 +1,117 @@
+import os
+import sys
+from decimal import Decimal
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cleanup_script'))
+from migrate_item_keys import apply_merge, merge_rows, plan_merges
+
+CANONICAL = 'https://www.ebay.com/itm/133058473014'
+
+
+def test_plan_groups_url_spellings_of_one_listing():
+    rows = [
+        {'url': CANONICAL + '?hash=item1f&_trkparms=x'},
+        {'url': 'https://www.ebay.com/itm/Apple-iPhone-13/133058473014'},
+        {'url': 'https://www.ebay.com/itm/256000000001'},
+        {'url': 'https://www.ebay.com/itm/256000000002?var=1'},
+    ]
+    plan = plan_merges(rows)
+    assert sorted(plan) == [CANONICAL, 'https://www.ebay.com/itm/256000000002']
+    assert len(plan[CANONICAL]) == 2
+
+
+def test_merge_keeps_one_topic_and_all_subscribers():
+    rows = [
+        {'url': CANONICAL + '?trk=1', 'SNS_ARN': 'arn:a', 'subscribers': ['a@x.com'],
+         'lowest_price': '95.00', 'lowest_price_date': 'd1', 'max_price': '120.00', 'max_price_date': 'd1',
+         'next_check_at': 500, 'last_checked_at': 100, 'check_shard': 1},
+        {'url': 'https://www.ebay.com/itm/Slug/133058473014', 'SNS_ARN': 'arn:b', 'subscribers': ['b@x.com', 'c@x.com'],
+         'lowest_price': '99.00', 'lowest_price_date': 'd2', 'max_price': '130.00', 'max_price_date': 'd2',
+         'next_check_at': 900, 'last_checked_at': 300, 'check_shard': 4},
+    ]
+    merged, new_emails = merge_rows(CANONICAL, rows)
+    assert merged['url'] == CANONICAL
+    assert merged['SNS_ARN'] == 'arn:b'
+    assert merged['subscribers'] == ['b@x.com', 'c@x.com', 'a@x.com']
+    assert new_emails == ['a@x.com']
+    assert (merged['lowest_price'], merged['lowest_price_date']) == ('95.00', 'd1')
+    assert (merged['max_price'], merged['max_price_date']) == ('130.00', 'd2')
+    assert (merged['next_check_at'], merged['last_checked_at']) == (900, 300)
+
+
+# Table that evaluates the merge's put_item condition; `changes` are applied to the
+# canonical row right before the next put, like a signup or price check in between
+class MergeTable:
+    def __init__(self, rows, changes=()):
+        self.rows = {row['url']: dict(row) for row in rows}
+        self.changes = list(changes)
+        self.puts = 0
+
+    def put_item(self, Item, ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues=None):
+        self.puts += 1
+        if self.changes:
+            self.rows[Item['url']].update(self.changes.pop(0))
+        current = self.rows.get(Item['url'])
+        names, values = ExpressionAttributeNames, ExpressionAttributeValues or {}
+        for term in ConditionExpression.split(' AND '):
+            if term.startswith('attribute_not_exists('):
+                ok = current is None or names[term[len('attribute_not_exists('):-1]] not in current
+            else:
+                name, value = term.split(' = ')
+                ok = current is not None and current.get(names[name]) == values[value]
+            if not ok:
+                raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'failed'}}, 'PutItem')
+        self.rows[Item['url']] = Item
+
+    def get_item(self, Key, ConsistentRead=False):
+        item = self.rows.get(Key['url'])
+        return {'Item': dict(item)} if item is not None else {}
+
+    def delete_item(self, Key):
+        del self.rows[Key['url']]
+
+
+class SNS:
+    def __init__(self):
+        self.subscribed = []
+
+    def subscribe(self, TopicArn, Protocol, Endpoint):
+        self.subscribed.append((TopicArn, Endpoint))
+
+
+def scanned_rows():
+    return [
+        {'url': CANONICAL, 'SNS_ARN': 'arn:a', 'subscribers': ['a@x.com'], 'lowest_price': Decimal('95.00')},
+        {'url': CANONICAL + '?trk=1', 'SNS_ARN': 'arn:b', 'subscribers': ['b@x.com'], 'lowest_price': Decimal('99.00')},
+    ]
+
+
+def test_merge_is_redone_when_the_canonical_row_changed():
+    rows = scanned_rows()
+    # a signup and a price drop land on the canonical row after the scan
+    table = MergeTable(rows, [{'subscribers': ['a@x.com', 'c@x.com'], 'lowest_price': Decimal('90.00')}])
+    sns = SNS()
+    assert apply_merge(table, sns, CANONICAL, rows, *merge_rows(CANONICAL, rows))
+    assert table.puts == 2
+    assert list(table.rows) == [CANONICAL]
+    assert table.rows[CANONICAL]['subscribers'] == ['a@x.com', 'c@x.com', 'b@x.com']
+    assert table.rows[CANONICAL]['lowest_price'] == Decimal('90.00')
+    assert sns.subscribed == [('arn:a', 'b@x.com')]
+
+
+def test_merge_into_a_missing_row_does_not_overwrite_a_new_one():
+    rows = scanned_rows()[1:]
+    table = MergeTable(rows)
+    # a signup created the canonical row after the scan
+    table.rows[CANONICAL] = scanned_rows()[0]
+    assert apply_merge(table, SNS(), CANONICAL, rows, *merge_rows(CANONICAL, rows))
+    assert table.rows[CANONICAL]['SNS_ARN'] == 'arn:a'
+    assert table.rows[CANONICAL]['subscribers'] == ['a@x.com', 'b@x.com']
+
+
+def test_merge_of_a_row_that_keeps_changing_is_skipped():
+    rows = scanned_rows()
+    table = MergeTable(rows, [{'next_check_at': Decimal(i)} for i in range(10)])
+    assert not apply_merge(table, SNS(), CANONICAL, rows, *merge_rows(CANONICAL, rows))
+    assert CANONICAL + '?trk=1' in table.rows
@@ -0,0 +1,74 @@
+import time
+import pytest
+from tracker_common import observation_cache
+from tracker_common.observation_cache import ObservationCache, MemoryObservationStore
+
+URL = 'https://www.ebay.com/itm/123456789012'
+
+
+class Crawler:
+    def __init__(self, result=('19.99', 'Widget', 'json_ld', None)):
+        self.result = result
+        self.calls = []
+
+    def __call__(self, url):
+        self.calls.append(url)
+        return self.result
+
+
+@pytest.fixture(autouse=True)
+def reset_stats():
+    observation_cache.stats.reset()
+
+
+def test_fresh_observation_is_served_without_crawling():
+    cache = ObservationCache(MemoryObservationStore())
+    crawl = Crawler()
+    assert cache.crawl(URL, crawl) == ('19.99', 'Widget', None)
+    assert cache.crawl(URL + '?hash=item1', crawl) == ('19.99', 'Widget', None)
+    assert crawl.calls == [URL]
+    report = observation_cache.stats.report()
+    assert report['lookups'] == 2
+    assert report['lru_hits'] == 1
+    assert report['hit_ratio'] == 0.5
+
+
+def test_expired_observation_is_crawled_again():
+    cache = ObservationCache(MemoryObservationStore(), ttl_seconds=60)
+    cache.put('123456789012', '25.00', 'Widget', now=time.time() - 61)
+    crawl = Crawler()
+    assert cache.crawl(URL, crawl) == ('19.99', 'Widget', None)
+    assert crawl.calls == [URL]
+
+
+def test_incomplete_result_is_not_stored():
+    cache = ObservationCache(MemoryObservationStore())
+    crawl = Crawler((None, 'Widget', 'none', None))
+    cache.crawl(URL, crawl)
+    cache.crawl(URL, crawl)
+    assert len(crawl.calls) == 2
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ObservationCache(lru_size=2)
+    cache.put('1', '1.00', 'One')
+    cache.put('2', '2.00', 'Two')
+    cache.get('1')
+    cache.put('3', '3.00', 'Three')
+    assert cache.get('2') is None
+    assert cache.get('1')['title'] == 'One'
+
+
+def test_listing_end_is_kept_with_the_observation():
+    cache = ObservationCache(MemoryObservationStore())
+    cache.crawl(URL, Crawler(('19.99', 'Widget', 'json_ld', 1700000000)))
+    crawl = Crawler()
+    assert cache.crawl(URL, crawl) == ('19.99', 'Widget', 1700000000)
+    assert crawl.calls == []
+
+
+def test_open_cache():
+    assert isinstance(observation_cache.open_cache('memory').store, MemoryObservationStore)
+    cache = observation_cache.open_cache('none')
+    cache.put('1', '1.00', 'One')
+    assert cache.store is None and cache.get('1') is None
@@ -0,0 +1,142 @@
+import threading
+import time
+from decimal import Decimal
+import pytest
+from botocore.exceptions import ClientError
+import handler
+from tracker_common.tracked_item import TrackedItem
+from tracker_common.write_behind import WriteBehind
+
+URL = 'https://www.ebay.com/itm/133058473014'
+
+
+def conditional_check_failed():
+    return ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'failed'}}, 'UpdateItem')
+
+
+# Table with the conditions the price check writes with
+class PriceTable:
+    name = 'price_tracker_test'
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.updates = []
+        self.lock = threading.Lock()
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, ConditionExpression=None,
+                    ExpressionAttributeNames=None, ReturnValues=None, ReturnConsumedCapacity=None):
+        with self.lock:
+            self.updates.append(UpdateExpression)
+            row = self.rows.get(Key['url'])
+            values = ExpressionAttributeValues
+            stored = row.get('lowest_price') if row else None
+            if ConditionExpression == 'lowest_price > :val1':
+                ok = isinstance(stored, Decimal) and stored > values[':val1']
+            elif ConditionExpression == 'lowest_price = :seen':
+                ok = stored == values[':seen']
+            elif ConditionExpression == 'lowest_price = :val1':
+                ok = stored == values[':val1']
+            else:
+                ok = row is not None
+            if not ok:
+                raise conditional_check_failed()
+            old = {'lowest_price': stored, 'lowest_price_date': row.get('lowest_price_date')}
+            if ':old' in values:
+                row['lowest_price'], row['lowest_price_date'] = values[':old'], values[':old_date']
+            elif ':val1' in values:
+                row['lowest_price'], row['lowest_price_date'] = values[':val1'], values[':val2']
+            else:
+                row.update({name[1:]: value for name, value in values.items()})
+            return {'Attributes': old, 'ConsumedCapacity': {'CapacityUnits': 1.0}}
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = PriceTable({URL: {'url': URL, 'lowest_price': Decimal('10.00'), 'lowest_price_date': 'then'}})
+    monkeypatch.setattr(handler, 'table', table)
+    return table
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    sent = []
+    monkeypatch.setattr(handler, 'publish_sns', lambda arn, subject, body: sent.append(body))
+    return sent
+
+
+def item(lowest_price):
+    return TrackedItem(URL, lowest_price, 'arn:aws:sns:us-east-1:123456789012:Item')
+
+
+def test_update_lowers_only_a_higher_price(table):
+    assert handler.update_dynamodb_lowest_price(item(Decimal('10.00')), Decimal('9.50')) == \
+        {'lowest_price': Decimal('10.00'), 'lowest_price_date': 'then'}
+    assert table.rows[URL]['lowest_price'] == Decimal('9.50')
+    assert handler.update_dynamodb_lowest_price(item(Decimal('10.00')), Decimal('9.75')) is None
+    assert table.rows[URL]['lowest_price'] == Decimal('9.50')
+
+
+def test_legacy_string_price_is_swapped_only_if_unchanged(table):
+    table.rows[URL]['lowest_price'] = '10.00'
+    assert handler.update_dynamodb_lowest_price(item('10.00'), Decimal('9.50')) is not None
+    assert table.rows[URL]['lowest_price'] == Decimal('9.50')
+    # another check already replaced the string
+    assert handler.update_dynamodb_lowest_price(item('10.00'), Decimal('9.00')) is None
+
+
+def test_only_the_winning_check_publishes(table, sent):
+    threads = [threading.Thread(target=handler.check_price, args=(item(Decimal('10.00')), '9.50', 'Item'))
+               for _ in range(8)]
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+    assert len(sent) == 1
+    # not below the scanned price: no write at all
+    writes = len(table.updates)
+    assert handler.check_price(item(Decimal('9.50')), '9.50', 'Item') is False
+    assert len(table.updates) == writes and len(sent) == 1
+
+
+def test_failed_alert_restores_the_previous_price(table, monkeypatch):
+    def fail(*args):
+        raise handler.SNSError('down')
+    monkeypatch.setattr(handler, 'publish_sns', fail)
+    with pytest.raises(handler.SNSError):
+        handler.check_price(item(Decimal('10.00')), '9.00', 'Item')
+    assert table.rows[URL]['lowest_price'] == Decimal('10.00')
+    assert table.rows[URL]['lowest_price_date'] == 'then'
+
+
+def test_restore_skips_a_price_lowered_meanwhile(table):
+    table.rows[URL]['lowest_price'] = Decimal('8.00')
+    handler.restore_dynamodb_lowest_price(URL, Decimal('9.00'), {'lowest_price': Decimal('10.00'), 'lowest_price_date': 'then'})
+    assert table.rows[URL]['lowest_price'] == Decimal('8.00')
+
+
+@pytest.mark.parametrize('price', ['19.99 to 29.99', 'NaN', 'Infinity'])
+def test_unparseable_price_is_a_failed_check(table, sent, monkeypatch, price):
+    class Cursor:
+        finished = True
+    monkeypatch.setattr(handler, 'load_cursor', lambda *args: (Cursor(), None))
+    monkeypatch.setattr(handler, 'read_dynamodb', lambda cursor, stop: iter([item(Decimal('10.00'))]))
+    monkeypatch.setattr(handler, 'price_crawl', lambda url: (price, 'Item', None))
+    monkeypatch.setattr(handler, 'WriteBehind', lambda table: WriteBehind(table, table_factory=lambda t: t))
+    response = handler.lambda_handler({}, None)
+    assert response['statusCode'] == 200
+    assert sent == []
+    # rescheduled as a retry, with the failure counted
+    assert table.rows[URL]['failed_checks'] == 1
+    assert 'last_price' not in table.rows[URL]
+
+
+def test_listing_end_seen_on_the_page_is_stored(table, sent, monkeypatch):
+    class Cursor:
+        finished = True
+    ends_at = int(time.time()) + 3600
+    monkeypatch.setattr(handler, 'load_cursor', lambda *args: (Cursor(), None))
+    monkeypatch.setattr(handler, 'read_dynamodb', lambda cursor, stop: iter([item(Decimal('10.00'))]))
+    monkeypatch.setattr(handler, 'price_crawl', lambda url: ('10.00', 'Item', ends_at))
+    monkeypatch.setattr(handler, 'WriteBehind', lambda table: WriteBehind(table, table_factory=lambda t: t))
+    handler.lambda_handler({}, None)
+    assert table.rows[URL]['listing_ends_at'] == ends_at
+    # checked at least four times before it ends
+    assert table.rows[URL]['next_check_at'] <= table.rows[URL]['last_checked_at'] + 900
@@ -0,0 +1,208 @@
+import os
+import pytest
+import requests
+from tracker_common import response_cache
+
+
+class FakeRaw:
+    def __init__(self, read=0):
+        self.read = read
+
+    def tell(self):
+        return self.read
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.encoding = 'utf-8'
+        self.url = 'https://www.ebay.com/itm/1'
+        self.raw = FakeRaw(len(content))
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(response_cache, 'cache', response_cache.ResponseCache(str(tmp_path)))
+    monkeypatch.setattr(response_cache, 'CACHE_ENABLED', True)
+    response_cache.stats.reset()
+    return response_cache.cache
+
+
+def parse_page(html):
+    parse_page.calls += 1
+    return '9.99', html
+
+
+def test_not_modified_reuses_parse_result(cache, monkeypatch):
+    parse_page.calls = 0
+    sent = []
+
+    def fetch(url, headers):
+        sent.append(headers)
+        if headers.get('If-None-Match') == '"v1"':
+            return FakeResponse(304)
+        return FakeResponse(200, b'<html>page</html>', {'ETag': '"v1"'})
+
+    monkeypatch.setattr(response_cache, 'fetch', fetch)
+    url = 'https://www.ebay.com/itm/133058473014'
+    assert response_cache.crawl_page(url + '?_trkparms=abc', parse_page) == ('9.99', '<html>page</html>')
+    assert response_cache.crawl_page(url, parse_page) == ('9.99', '<html>page</html>')
+    assert sent == [{}, {'If-None-Match': '"v1"'}]
+    assert parse_page.calls == 1
+    report = response_cache.stats.report()
+    assert report['not_modified'] == 1 and report['hit_rate'] == 0.5
+    assert report['bytes_saved'] == len(b'<html>page</html>')
+
+
+def test_unchanged_content_without_validators_is_not_parsed_again(cache, monkeypatch):
+    parse_page.calls = 0
+    bodies = [b'<html>a</html>', b'<html>a</html>', b'<html>b</html>']
+    monkeypatch.setattr(response_cache, 'fetch', lambda url, headers: FakeResponse(200, bodies.pop(0)))
+    url = 'https://www.ebay.com/itm/1'
+    results = [response_cache.crawl_page(url, parse_page) for _ in range(3)]
+    assert [title for _, title in results] == ['<html>a</html>', '<html>a</html>', '<html>b</html>']
+    assert parse_page.calls == 2
+    assert response_cache.stats.report()['unchanged_content'] == 1
+
+
+class FakeStreamedResponse(FakeResponse):
+    def __init__(self, content, headers=None, chunk_size=4):
+        super().__init__(200, content, headers)
+        self.raw = FakeRaw()
+        self.chunk_size = chunk_size
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), self.chunk_size):
+            self.raw.read += len(self.content[i:i + self.chunk_size])
+            yield self.content[i:i + self.chunk_size]
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def streaming(cache, monkeypatch):
+    monkeypatch.setattr(response_cache, 'STREAM_PAGES', True)
+    monkeypatch.setattr(response_cache, 'STREAM_MIN_BYTES', 16)
+    return cache
+
+
+def first_word(chunks):
+    text = ''
+    for chunk in chunks:
+        text += chunk
+        if ' ' in text:
+            return '1.00', text.split(' ')[0]
+    return None, text
+
+
+def test_streamed_page_stops_once_parser_returns(streaming, monkeypatch):
+    body = b'title rest of a long page'
+    responses = []
+
+    def fetch(url, headers, stream=False):
+        assert stream
+        responses.append(FakeStreamedResponse(body, {'Content-Length': str(len(body)), 'ETag': '"v1"'}))
+        return responses[-1]
+
+    monkeypatch.setattr(response_cache, 'fetch', fetch)
+    assert response_cache.crawl_page('https://www.ebay.com/itm/2', parse_page, first_word) == ('1.00', 'title')
+    assert responses[0].closed
+    report = response_cache.stats.report()
+    assert report['streamed'] == 1 and report['stopped_early'] == 1
+    assert report['bytes_read'] == 8 and report['page_bytes'] == len(body)
+    assert report['bytes_read_per_page'] == 8 and report['page_bytes_per_page'] == len(body)
+    assert report['read_ratio_p50'] == report['read_ratio_p90'] == round(8 / len(body), 3)
+
+
+def test_streamed_entry_is_revalidated_but_never_reparsed(streaming, monkeypatch):
+    parse_page.calls = 0
+    sent = []
+
+    def fetch(url, headers, stream=False):
+        sent.append(headers)
+        if headers.get('If-None-Match') == '"v1"':
+            return FakeResponse(304)
+        return FakeStreamedResponse(b'title rest', {'ETag': '"v1"'})
+
+    monkeypatch.setattr(response_cache, 'fetch', fetch)
+    url = 'https://www.ebay.com/itm/3'
+    assert response_cache.crawl_page(url, parse_page, first_word) == ('1.00', 'title')
+    assert response_cache.crawl_page(url, parse_page, first_word) == ('1.00', 'title')
+    assert sent == [{}, {'If-None-Match': '"v1"'}]
+    assert response_cache.stats.report()['page_size_unknown'] == 1
+
+
+def test_pages_are_read_whole_unless_streaming_is_on(cache, monkeypatch):
+    parse_page.calls = 0
+    fetched = []
+
+    def fetch(url, headers, stream=False):
+        fetched.append(stream)
+        return FakeResponse(200, b'title rest of a long page')
+
+    monkeypatch.setattr(response_cache, 'fetch', fetch)
+    assert response_cache.crawl_page('https://www.ebay.com/itm/4', parse_page, first_word)[0] == '9.99'
+    assert fetched == [False] and parse_page.calls == 1
+
+
+def test_short_page_is_read_whole_and_cached_with_its_body(streaming, monkeypatch):
+    parse_page.calls = 0
+    body = b'short page'
+    responses = []
+
+    def fetch(url, headers, stream=False):
+        responses.append(FakeStreamedResponse(body, {'Content-Length': str(len(body))}))
+        return responses[-1]
+
+    monkeypatch.setattr(response_cache, 'fetch', fetch)
+    url = 'https://www.ebay.com/itm/5'
+    assert response_cache.crawl_page(url, parse_page, first_word) == ('9.99', 'short page')
+    assert not responses[0].closed
+    assert response_cache.stats.report()['streamed'] == 0
+    # the body is kept, so an unchanged page is recognised by its hash
+    assert response_cache.crawl_page(url, parse_page, first_word) == ('9.99', 'short page')
+    assert parse_page.calls == 1 and response_cache.stats.report()['unchanged_content'] == 1
+
+
+def test_bytes_are_counted_per_content_encoding(cache, monkeypatch):
+    responses = [
+        FakeResponse(200, b'<html>a</html>', {'Content-Encoding': 'gzip'}),
+        FakeResponse(200, b'<html>b</html>'),
+    ]
+    responses[0].raw = FakeRaw(9)
+    monkeypatch.setattr(response_cache, 'fetch', lambda url, headers: responses.pop(0))
+    response_cache.crawl_page('https://www.ebay.com/itm/4', parse_page)
+    response_cache.crawl_page('https://www.ebay.com/itm/5', parse_page)
+    assert response_cache.stats.report()['encodings'] == {
+        'gzip': {'responses': 1, 'wire_bytes': 9, 'decoded_bytes': 14},
+        'identity': {'responses': 1, 'wire_bytes': 14, 'decoded_bytes': 14},
+    }
+
+
+def test_undecodable_encoding_fails_like_a_network_error(cache, monkeypatch):
+    monkeypatch.setattr(response_cache, 'DECODABLE_ENCODINGS', frozenset({'gzip', 'deflate', 'identity'}))
+    response = FakeResponse(200, b'\x1b\x0b', {'Content-Encoding': 'br'})
+    monkeypatch.setattr(response_cache, 'fetch', lambda url, headers: response)
+    with pytest.raises(requests.exceptions.RequestException):
+        response_cache.crawl_page('https://www.ebay.com/itm/6', parse_page)
+
+
+def test_rewritten_entries_are_counted_once(tmp_path):
+    cache = response_cache.ResponseCache(str(tmp_path), max_bytes=200 * 1024)
+    bodies = [os.urandom(30 * 1024) for _ in range(5)]
+    for _ in range(4):
+        for i, body in enumerate(bodies):
+            cache.put(f'https://www.ebay.com/itm/{i}', {'body': body})
+    assert all(cache.get(f'https://www.ebay.com/itm/{i}') is not None for i in range(5))
+    on_disk = sum(entry.stat().st_size for entry in os.scandir(tmp_path))
+    assert cache._size == on_disk < 200 * 1024
@@ -0,0 +1,67 @@
+from decimal import Decimal
+from tracker_common import schedule
+from tracker_common.schedule import (BASE_INTERVAL, MAX_INTERVAL, MIN_INTERVAL, check_interval,
+                                     check_shard, failure_schedule, next_schedule)
+
+NOW = 1_700_000_000
+
+
+def test_quiet_listing_slows_down():
+    assert check_interval(0.0, 0) == BASE_INTERVAL
+    assert check_interval(0.0, 7 * 86400) > check_interval(0.0, 86400) > BASE_INTERVAL
+
+
+def test_volatile_and_popular_listings_are_checked_more_often():
+    assert check_interval(1.0, 0) < check_interval(0.5, 0) < BASE_INTERVAL
+    assert check_interval(0.0, 86400, subscribers=16) < check_interval(0.0, 86400, subscribers=1)
+
+
+def test_ending_listing_is_bounded_by_remaining_time():
+    assert check_interval(0.0, 30 * 86400, ends_at=NOW + 3600, now=NOW) == 900
+    assert check_interval(0.0, 0, ends_at=NOW + 60, now=NOW) == MIN_INTERVAL
+    assert check_interval(1.0, 0, ends_at=NOW - 1, now=NOW) == MAX_INTERVAL
+
+
+def test_observed_end_time_is_stored_and_used():
+    item = {'url': 'https://www.ebay.com/itm/133058473014', 'last_price': '10.00', 'last_change_at': NOW - 30 * 86400}
+    schedule = next_schedule(item, '10.00', now=NOW, ends_at=NOW + 3600)
+    assert schedule['listing_ends_at'] == NOW + 3600
+    assert schedule['next_check_at'] == NOW + 900
+    # a later check that did not see the end time keeps using the stored one
+    assert next_schedule(dict(item, listing_ends_at=NOW + 3600), '10.00', now=NOW) == schedule
+    assert 'listing_ends_at' not in next_schedule(item, '10.00', now=NOW)
+
+
+def test_next_schedule_tracks_price_changes():
+    item = {'url': 'https://www.ebay.com/itm/133058473014', 'last_price': '10.00', 'last_change_at': NOW - 86400}
+    unchanged = next_schedule(item, '10.00', now=NOW)
+    changed = next_schedule(item, '9.50', now=NOW)
+    assert unchanged['last_change_at'] == NOW - 86400
+    assert changed['last_change_at'] == NOW
+    assert float(changed['volatility']) > float(unchanged['volatility']) == 0.0
+    assert changed['next_check_at'] < unchanged['next_check_at']
+    assert changed['check_shard'] == check_shard(item['url'])
+
+
+def test_next_schedule_stores_the_price_as_a_number():
+    item = {'url': 'https://www.ebay.com/itm/133058473014', 'last_price': Decimal('10.00'), 'last_change_at': NOW}
+    schedule = next_schedule(item, '10.00', now=NOW)
+    assert schedule['last_price'] == Decimal('10.00')
+    assert schedule['last_change_at'] == NOW
+
+
+def test_failure_schedule_backs_off_after_repeated_failures():
+    url = 'https://www.ebay.com/itm/133058473014'
+    assert failure_schedule(url, now=NOW)['next_check_at'] == NOW + MIN_INTERVAL
+    assert failure_schedule(url, Decimal(2), now=NOW)['next_check_at'] == NOW + 4 * MIN_INTERVAL
+    assert failure_schedule(url, Decimal(40), now=NOW)['next_check_at'] == NOW + MAX_INTERVAL
+    assert failure_schedule(url, now=NOW)['check_shard'] == check_shard(url)
+
+
+def test_every_tick_takes_the_slice_it_started_in(monkeypatch):
+    monkeypatch.setattr(schedule, 'TIME_SLICES', 6)
+    monkeypatch.setattr(schedule, 'SLICE_SECONDS', 300)
+    tick = NOW - NOW % 3600
+    # a trigger that fires late, even by most of a slice, stays on its slice
+    assert [schedule.current_slice(tick + k * 300 + delay) for k in range(7) for delay in (0, 20, 290)] == \
+        [k % 6 for k in range(7) for _ in range(3)]
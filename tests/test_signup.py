@@ -0,0 +1,310 @@
+import importlib.util
+import json
+import os
+import re
+import threading
+import time
+import pytest
+import requests
+from botocore.exceptions import ClientError
+
+# The signup Lambda's handler, loaded under its own name: the price check's handler is
+# the one importable as `handler`
+SIGNUP_HANDLER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'Task1', 'lambda_src', 'handler.py')
+spec = importlib.util.spec_from_file_location('signup_handler', SIGNUP_HANDLER)
+signup = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(signup)
+
+URL = 'https://www.ebay.com/itm/123456789012'
+NOW = int(time.time())
+
+
+def conditional_failure():
+    return ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'failed'}}, 'PutItem')
+
+
+# The Table API calls of the signup: items, their subscribers and schedule, and the
+# creation leases, with just enough of the conditions they use
+class SignupTable:
+    def __init__(self, rows=()):
+        self.rows = {row['url']: dict(row) for row in rows}
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def get_item(self, Key, ConsistentRead=False):
+        with self.lock:
+            self.calls.append(('get_item', Key['url']))
+            row = self.rows.get(Key['url'])
+            return {'Item': dict(row)} if row is not None else {}
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None):
+        with self.lock:
+            self.calls.append(('put_item', Item['url']))
+            current = self.rows.get(Item['url'])
+            if ConditionExpression and current is not None:
+                # an expired lease may be taken over
+                if 'expires_at < :now' not in ConditionExpression or current['expires_at'] >= ExpressionAttributeValues[':now']:
+                    raise conditional_failure()
+            self.rows[Item['url']] = dict(Item)
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, ConditionExpression=None,
+                    ExpressionAttributeNames=None, ReturnValues=None):
+        with self.lock:
+            self.calls.append(('update_item', Key['url']))
+            row = self.rows.setdefault(Key['url'], {'url': Key['url']})
+            if 'list_append' in UpdateExpression:
+                row['subscribers'] = row.get('subscribers', []) + ExpressionAttributeValues[':new_email']
+                return {'Attributes': {'subscribers': row['subscribers']}}
+            if ':result' in ExpressionAttributeValues:
+                row.update(result=ExpressionAttributeValues[':result'], expires_at=ExpressionAttributeValues[':expires_at'])
+                return {}
+            for name in re.findall(r'(\w+) = :', UpdateExpression):
+                row[name] = ExpressionAttributeValues[f':{name}']
+            return {}
+
+    def delete_item(self, Key, **kwargs):
+        with self.lock:
+            self.calls.append(('delete_item', Key['url']))
+            self.rows.pop(Key['url'], None)
+
+
+class FakeSNS:
+    def __init__(self):
+        self.topics = []
+        self.subscriptions = []
+
+    def create_topic(self, Name):
+        self.topics.append(Name)
+        return {'TopicArn': f'arn:aws:sns:us-east-1:123456789012:{Name}'}
+
+    def subscribe(self, TopicArn, Protocol, Endpoint):
+        self.subscriptions.append((TopicArn, Endpoint))
+
+
+class Crawler:
+    def __init__(self, result=('19.99', 'Widget', 'json_ld', None)):
+        self.result = result
+        self.calls = []
+
+    def __call__(self, url):
+        self.calls.append(url)
+        return self.result
+
+
+def tracked(**fields):
+    return dict({
+        'url': URL,
+        'title': 'Widget',
+        'lowest_price': '25.00',
+        'SNS_ARN': 'arn:aws:sns:us-east-1:123456789012:Widget',
+        'subscribers': ['b@example.com'],
+        'last_checked_at': NOW - 60
+    }, **fields)
+
+
+@pytest.fixture
+def sns(monkeypatch):
+    sns = FakeSNS()
+    monkeypatch.setattr(signup, 'sns_client', sns)
+    return sns
+
+
+@pytest.fixture
+def crawl(monkeypatch):
+    crawl = Crawler()
+    monkeypatch.setattr(signup, 'crawl_observation', crawl)
+    return crawl
+
+
+def use_table(monkeypatch, *rows):
+    table = SignupTable(rows)
+    monkeypatch.setattr(signup, 'table', table)
+    return table
+
+
+def records(*bodies):
+    return [
+        {
+            'messageId': f'm{i}',
+            'receiptHandle': f'r{i}',
+            'body': json.dumps(dict({'signup_id': f's{i}', 'url': URL, 'email': 'a@example.com'}, **body)),
+            'attributes': {'ApproximateReceiveCount': '1'}
+        }
+        for i, body in enumerate(bodies)
+    ]
+
+
+def test_only_transient_signup_failures_are_redelivered(monkeypatch):
+    errors = {
+        'missing': ValueError('Failed to get price or title'),
+        'db': signup.DynamoDBError('Failed to query or update DynamoDB'),
+        'sns': signup.SNSError('Failed to update SNS subscribers'),
+        'download': signup.CrawlError('Failed to download'),
+        'ok': None
+    }
+
+    def query_dynamodb_sns(url, email):
+        error = errors[email.split('@')[0]]
+        if error is not None:
+            raise error
+
+    monkeypatch.setattr(signup, 'query_dynamodb_sns', query_dynamodb_sns)
+    event = {'Records': records(*({'email': f'{name}@example.com'} for name in errors))}
+    response = signup.lambda_handler(event, None)
+    assert response == {'batchItemFailures': [{'itemIdentifier': 'm1'}, {'itemIdentifier': 'm2'}, {'itemIdentifier': 'm3'}]}
+
+
+def test_malformed_signup_is_acknowledged(monkeypatch):
+    monkeypatch.setattr(signup, 'query_dynamodb_sns', lambda url, email: pytest.fail('no signup to make'))
+    event = {'Records': records({})}
+    event['Records'][0]['body'] = json.dumps({'signup_id': 's0'})
+    assert signup.lambda_handler(event, None) == {'batchItemFailures': []}
+
+
+def test_failed_download_is_transient(monkeypatch):
+    def crawl_observation(url):
+        raise requests.ConnectionError('connection reset')
+
+    monkeypatch.setattr(signup, 'crawl_observation', crawl_observation)
+    with pytest.raises(signup.CrawlError):
+        signup.price_crawl(URL)
+    # a stale item is still signed up for without the page
+    assert signup.refresh_crawl(URL) == (None, None, None)
+
+
+def test_new_listing_is_crawled_and_created(monkeypatch, sns, crawl):
+    table = use_table(monkeypatch)
+    signup.query_dynamodb_sns(URL + '?hash=item1', 'a@example.com')
+    assert crawl.calls == [URL]
+    row = table.rows[URL]
+    assert (row['title'], str(row['lowest_price']), row['subscribers']) == ('Widget', '19.99', ['a@example.com'])
+    assert row['next_check_at'] > NOW
+    assert sns.topics == ['Widget'] and sns.subscriptions == [(row['SNS_ARN'], 'a@example.com')]
+    # the lease that coalesced the creation published its result
+    assert table.rows['#lease#123456789012']['result'] == URL
+
+
+def test_fresh_item_is_subscribed_to_without_crawling(monkeypatch, sns, crawl):
+    table = use_table(monkeypatch, tracked())
+    signup.query_dynamodb_sns(URL, 'a@example.com')
+    assert crawl.calls == []
+    assert table.calls[0] == ('get_item', URL)
+    assert table.rows[URL]['subscribers'] == ['b@example.com', 'a@example.com']
+    assert sns.topics == [] and sns.subscriptions == [(tracked()['SNS_ARN'], 'a@example.com')]
+
+
+def test_stale_item_is_crawled_and_refreshed(monkeypatch, sns, crawl):
+    table = use_table(monkeypatch, tracked(last_checked_at=NOW - 2 * signup.ITEM_FRESH_SECONDS))
+    signup.query_dynamodb_sns(URL, 'a@example.com')
+    assert crawl.calls == [URL]
+    row = table.rows[URL]
+    assert str(row['last_price']) == '19.99' and row['last_checked_at'] >= NOW
+    assert row['subscribers'] == ['b@example.com', 'a@example.com']
+
+
+def test_known_subscriber_only_gets_the_confirmation_again(monkeypatch, sns, crawl):
+    table = use_table(monkeypatch, tracked())
+    signup.query_dynamodb_sns(URL, 'b@example.com')
+    assert ('update_item', URL) not in table.calls
+    assert table.rows[URL]['subscribers'] == ['b@example.com']
+    assert sns.subscriptions == [(tracked()['SNS_ARN'], 'b@example.com')]
+
+
+def test_stale_item_whose_page_fails_keeps_its_record(monkeypatch, sns, crawl):
+    crawl.result = (None, None, 'none', None)
+    table = use_table(monkeypatch, tracked(last_checked_at=NOW - 2 * signup.ITEM_FRESH_SECONDS))
+    signup.query_dynamodb_sns(URL, 'a@example.com')
+    assert 'last_price' not in table.rows[URL]
+    assert table.rows[URL]['subscribers'] == ['b@example.com', 'a@example.com']
+
+
+def test_concurrent_steps_are_all_awaited_before_the_first_error_is_raised():
+    finished = []
+
+    def slow():
+        time.sleep(0.05)
+        finished.append('slow')
+        return 'done'
+
+    def fail(name):
+        raise signup.SNSError(f'{name} failed')
+
+    timings = {}
+    with pytest.raises(signup.SNSError, match='first failed'):
+        signup.run_concurrently({
+            'first': (fail, ('first',)),
+            'slow': (slow, ()),
+            'second': (fail, ('second',))
+        }, timings)
+    # the failures did not leave the slow step running unobserved
+    assert finished == ['slow']
+    assert set(timings) == {'first', 'slow', 'second'} and timings['slow'] >= 50
+
+
+def test_concurrent_steps_return_their_results_by_name():
+    timings = {}
+    results = signup.run_concurrently({'a': (lambda x: x * 2, (2,)), 'b': (str.upper, ('b',))}, timings)
+    assert results == {'a': 4, 'b': 'B'}
+    assert set(timings) == {'a', 'b'}
+
+
+def test_signup_steps_are_timed(monkeypatch, sns, crawl):
+    use_table(monkeypatch, tracked(last_checked_at=NOW - 2 * signup.ITEM_FRESH_SECONDS))
+    logged = []
+    monkeypatch.setattr(signup.logger, 'info', logged.append)
+    signup.query_dynamodb_sns(URL, 'a@example.com')
+    line = next(line for line in logged if line.startswith('Signup step latency (ms): '))
+    timings = json.loads(line.split(': ', 1)[1])
+    assert set(timings) == {'get_item', 'sns_subscribe', 'db_subscribers', 'crawl', 'db_refresh', 'total'}
+
+
+def request(url=URL, email='a@example.com'):
+    return {'queryStringParameters': {'url': url, 'email': email}}
+
+
+@pytest.mark.parametrize('email', [
+    'a@example.com', 'first.last+tag@sub.example.co.uk'
+])
+def test_valid_emails(email):
+    assert signup.validate_email(email)
+
+
+@pytest.mark.parametrize('email', [
+    None, '', 'a', 'a@', '@example.com', 'a@example', 'a b@example.com', 'a@exa mple.com',
+    'a@@example.com', 'x' * 65 + '@example.com', 'a@' + 'x' * 250 + '.com', ['a@example.com']
+])
+def test_invalid_emails(email):
+    assert not signup.validate_email(email)
+
+
+@pytest.mark.parametrize('event, error', [
+    (request(url='https://www.example.com/itm/123456789012'), 'Invalid URL'),
+    (request(url='https://www.ebay.com/sch/i.html?_nkw=widget'), 'Invalid URL'),
+    (request(email='not an email'), 'Invalid email address'),
+    ({'queryStringParameters': {'url': URL}}, 'Invalid email address'),
+    ({'queryStringParameters': None}, 'Invalid URL'),
+    ({}, 'Invalid URL'),
+])
+def test_malformed_request_is_rejected_before_any_network_work(monkeypatch, sns, crawl, event, error):
+    table = use_table(monkeypatch)
+    response = signup.lambda_handler(event, None)
+    assert response['statusCode'] == 400 and json.loads(response['body']) == {'error': error}
+    assert table.calls == [] and sns.topics == sns.subscriptions == [] and crawl.calls == []
+
+
+def test_listing_that_cannot_be_read_is_rejected(monkeypatch, sns, crawl):
+    crawl.result = (None, 'Widget', 'none', None)
+    table = use_table(monkeypatch)
+    response = signup.lambda_handler(request(), None)
+    assert response['statusCode'] == 400
+    assert json.loads(response['body']) == {'error': f'Failed to get price or title for {URL}'}
+    # nothing is created and the creation lease is given up
+    assert table.rows == {} and sns.topics == []
+
+
+def test_valid_request_signs_up(monkeypatch, sns, crawl):
+    table = use_table(monkeypatch)
+    response = signup.lambda_handler(request(url=URL + '?hash=item1#x'), None)
+    assert response['statusCode'] == 200
+    assert table.rows[URL]['subscribers'] == ['a@example.com']
@@ -0,0 +1,53 @@
+import pytest
+from tracker_common import signup_queue
+from tracker_common.signup_queue import MemoryQueue, SQLiteQueue, drain, messages_from_event
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def queue(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryQueue()
+    return SQLiteQueue(str(tmp_path / 'signups.db'))
+
+
+def test_received_messages_are_invisible_until_retried(queue):
+    queue.send({'n': 1})
+    queue.send({'n': 2})
+    batch = queue.receive(10, visibility_seconds=60)
+    assert [message.body for message in batch] == [{'n': 1}, {'n': 2}]
+    assert queue.receive(10) == []
+    queue.retry(batch[0])
+    queue.ack(batch[1])
+    again = queue.receive(10)
+    assert [(message.body, message.attempts) for message in again] == [({'n': 1}, 2)]
+    assert len(queue) == 1
+
+
+def test_drain_processes_in_batches_and_retries_failures(queue, monkeypatch):
+    monkeypatch.setattr(signup_queue, 'RETRY_DELAY_SECONDS', 0)
+    for n in range(7):
+        queue.send({'n': n})
+    seen = []
+
+    def process(body):
+        seen.append(body['n'])
+        if body['n'] == 3 and seen.count(3) < 2:
+            raise RuntimeError('eBay timed out')
+        if body['n'] == 5:
+            raise RuntimeError('listing removed')
+
+    assert drain(queue, process, batch_size=3, max_attempts=3) == (6, 3, 1)
+    assert sorted(set(seen)) == list(range(7))
+    assert seen.count(5) == 3
+    assert len(queue) == 0
+
+
+def test_messages_from_sqs_event():
+    records = [{
+        'messageId': 'm1',
+        'receiptHandle': 'r1',
+        'body': '{"signup_id": "s1", "url": "u", "email": "e"}',
+        'attributes': {'ApproximateReceiveCount': '2'}
+    }]
+    [message] = messages_from_event(records)
+    assert (message.id, message.receipt, message.body['signup_id'], message.attempts) == ('m1', 'r1', 's1', 2)
@@ -0,0 +1,106 @@
+import threading
+import time
+import pytest
+from botocore.exceptions import ClientError
+from tracker_common import single_flight
+from tracker_common.single_flight import SingleFlight, LeaseTimeout, coalesce
+
+
+def conditional_failure():
+    return ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'failed'}}, 'PutItem')
+
+
+# Just enough of the Table API for the lease conditions used by single_flight
+class LeaseTable:
+    def __init__(self):
+        self.rows = {}
+        self.lock = threading.Lock()
+
+    def put_item(self, Item, ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues):
+        with self.lock:
+            current = self.rows.get(Item['url'])
+            if current is not None and current['expires_at'] >= ExpressionAttributeValues[':now']:
+                raise conditional_failure()
+            self.rows[Item['url']] = dict(Item)
+
+    def update_item(self, Key, ExpressionAttributeValues, **kwargs):
+        with self.lock:
+            current = self.rows.get(Key['url'])
+            if current is None or current['owner'] != ExpressionAttributeValues[':owner']:
+                raise conditional_failure()
+            current.update(result=ExpressionAttributeValues[':result'], expires_at=ExpressionAttributeValues[':expires_at'])
+
+    def delete_item(self, Key, ExpressionAttributeValues, **kwargs):
+        with self.lock:
+            current = self.rows.get(Key['url'])
+            if current is None or current['owner'] != ExpressionAttributeValues[':owner']:
+                raise conditional_failure()
+            del self.rows[Key['url']]
+
+    def get_item(self, Key, ConsistentRead=False):
+        with self.lock:
+            current = self.rows.get(Key['url'])
+            return {'Item': dict(current)} if current is not None else {}
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(single_flight, 'LEASE_POLL_SECONDS', 0.01)
+
+
+def test_single_flight_runs_once_for_concurrent_callers():
+    flight = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def create():
+        calls.append(1)
+        started.set()
+        time.sleep(0.05)
+        return 'item'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do('k', create))) for _ in range(5)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert results == ['item'] * 5
+
+
+def test_coalesce_waiters_reuse_the_holders_result():
+    table = LeaseTable()
+    calls = []
+
+    def create():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'https://www.ebay.com/itm/133058473014'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(coalesce(table, '133058473014', create)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == ['https://www.ebay.com/itm/133058473014'] * 4
+
+
+def test_coalesce_takes_over_after_a_failed_holder():
+    table = LeaseTable()
+    with pytest.raises(ValueError):
+        coalesce(table, 'k', lambda: (_ for _ in ()).throw(ValueError('crawl failed')))
+    assert table.rows == {}
+    assert coalesce(table, 'k', lambda: 'url') == 'url'
+
+
+def test_coalesce_gives_up_on_a_live_lease():
+    table = LeaseTable()
+    table.rows['#lease#k'] = {'url': '#lease#k', 'owner': 'other', 'expires_at': int(time.time()) + 60}
+    with pytest.raises(LeaseTimeout):
+        coalesce(table, 'k', lambda: 'url', wait_seconds=0.05)
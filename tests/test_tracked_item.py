@@ -0,0 +1,51 @@
+from decimal import Decimal
+from boto3.dynamodb.types import TypeDeserializer
+from tracker_common.schedule import check_schedule, next_schedule
+from tracker_common.tracked_item import TrackedItem, decode_tracked_item
+
+NOW = 1_700_000_000
+
+WIRE_ITEM = {
+    'url': {'S': 'https://www.ebay.com/itm/133058473014'},
+    'lowest_price': {'N': '99.99'},
+    'SNS_ARN': {'S': 'arn:aws:sns:us-east-1:123456789012:Item'},
+    'subscribers': {'L': [{'S': 'a@example.com'}, {'S': 'b@example.com'}]},
+    'last_price': {'N': '109.99'},
+    'last_change_at': {'N': str(NOW - 86400)},
+    'volatility': {'N': '0.2'},
+    'listing_ends_at': {'N': str(NOW + 3600)},
+    'failed_checks': {'N': '3'},
+    'next_check_at': {'N': str(NOW)}
+}
+
+
+def fields(item):
+    return [getattr(item, name) for name in TrackedItem.__slots__]
+
+
+def test_wire_and_resource_items_decode_alike():
+    deserializer = TypeDeserializer()
+    resource_item = {name: deserializer.deserialize(value) for name, value in WIRE_ITEM.items()}
+    item = decode_tracked_item(WIRE_ITEM)
+    assert fields(item) == fields(TrackedItem.from_item(resource_item))
+    assert item.lowest_price == Decimal('99.99')
+    assert item.sns_arn == 'arn:aws:sns:us-east-1:123456789012:Item'
+    assert item.subscriber_count == 2
+    assert item.failed_checks == 3
+    assert item.next_check_at == NOW
+
+
+def test_sparse_and_legacy_items():
+    item = decode_tracked_item({'url': {'S': 'https://www.ebay.com/itm/1'}, 'lowest_price': {'S': '99.99'}})
+    # rows written before prices were Numbers
+    assert item.lowest_price == '99.99'
+    assert (item.subscriber_count, item.failed_checks, item.last_change_at, item.listing_ends_at) == (0, 0, None, None)
+    assert not hasattr(item, '__dict__')
+
+
+def test_schedules_match_the_dict_versions():
+    resource_item = {name: TypeDeserializer().deserialize(value) for name, value in WIRE_ITEM.items()}
+    item = decode_tracked_item(WIRE_ITEM)
+    for price in ('109.99', '89.99'):
+        assert check_schedule(item.url, price, item.last_price, item.last_change_at, item.volatility,
+                              item.subscriber_count, item.listing_ends_at, NOW) == next_schedule(resource_item, price, NOW)
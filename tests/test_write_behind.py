@@ -0,0 +1,152 @@
+import threading
+from types import SimpleNamespace
+import pytest
+from botocore.exceptions import ClientError
+from tracker_common import write_behind
+from tracker_common.capacity import CapacityBucket
+from tracker_common.write_behind import WriteBehind
+
+
+def client_error(code):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, 'UpdateItem')
+
+
+# Applies SET/ADD updates to existing rows; throttles the first `throttle` requests
+class StateTable:
+    def __init__(self, keys, throttle=0, units=1.0):
+        self.rows = {key: {'url': key} for key in keys}
+        self.requests = []
+        self.throttle = throttle
+        self.units = units
+        self.lock = threading.Lock()
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression, ExpressionAttributeNames,
+                    ExpressionAttributeValues, ReturnConsumedCapacity):
+        with self.lock:
+            self.requests.append(UpdateExpression)
+            if self.throttle:
+                self.throttle -= 1
+                raise client_error('ProvisionedThroughputExceededException')
+            row = self.rows.get(Key['url'])
+            if row is None:
+                raise client_error('ConditionalCheckFailedException')
+            sets, _, adds = UpdateExpression[len('SET '):].partition(' ADD ')
+            for assignment in sets.split(', '):
+                name, value = assignment.split(' = ')
+                row[name] = ExpressionAttributeValues[value]
+            for addition in filter(None, adds.split(', ')):
+                name, value = addition.split(' ')
+                row[name] = row.get(name, 0) + ExpressionAttributeValues[value]
+            return {'ConsumedCapacity': {'CapacityUnits': self.units}}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(write_behind, 'BACKOFF_SECONDS', 0.001)
+
+
+def new_writer(table, rate=1000.0):
+    return WriteBehind(table, CapacityBucket(rate, rate), table_factory=lambda table: table)
+
+
+def test_updates_of_the_same_item_are_merged():
+    table = StateTable(['a', 'b'])
+    writer = new_writer(table)
+    writer.put('a', {'next_check_at': 1}, {'failed_checks': 1})
+    writer.put('a', {'next_check_at': 2}, {'failed_checks': 1})
+    writer.put('b', {'next_check_at': 3, 'failed_checks': 0})
+    writer.start()
+    assert writer.close(5) == 0
+    assert table.rows['a'] == {'url': 'a', 'next_check_at': 2, 'failed_checks': 2}
+    assert table.rows['b'] == {'url': 'b', 'next_check_at': 3, 'failed_checks': 0}
+    report = writer.stats.report()
+    assert (report['queued'], report['coalesced'], report['writes'], report['consumed_units']) == (3, 1, 2, 2.0)
+
+
+def test_set_after_add_resets_the_counter():
+    table = StateTable(['a'])
+    writer = new_writer(table)
+    writer.put('a', {'next_check_at': 1}, {'failed_checks': 1})
+    writer.put('a', {'next_check_at': 2, 'failed_checks': 0})
+    writer.start().close(5)
+    assert table.rows['a']['failed_checks'] == 0
+    assert len(table.requests) == 1
+
+
+def test_throttled_updates_are_retried():
+    table = StateTable(['a', 'b'], throttle=3)
+    writer = new_writer(table)
+    writer.start()
+    writer.put('a', {'next_check_at': 1})
+    writer.put('b', {'next_check_at': 2})
+    assert writer.close(5) == 0
+    assert table.rows['a']['next_check_at'] == 1 and table.rows['b']['next_check_at'] == 2
+    report = writer.stats.report()
+    assert (report['throttled'], report['writes'], report['failed']) == (3, 2, 0)
+
+
+def test_deleted_items_are_not_recreated():
+    table = StateTable([])
+    writer = new_writer(table)
+    writer.put('gone', {'next_check_at': 1})
+    writer.start().close(5)
+    assert table.rows == {}
+    assert writer.stats.report()['missing'] == 1
+
+
+def test_updates_left_at_the_deadline_are_dropped():
+    table = StateTable(['a', 'b', 'c'])
+    # one unit of burst, then one write every 100 seconds
+    writer = WriteBehind(table, CapacityBucket(0.01, 1), table_factory=lambda table: table)
+    for key in 'abc':
+        writer.put(key, {'next_check_at': 1})
+    writer.start()
+    assert writer.close(0.2) == 2
+    assert writer.stats.report()['writes'] == 1
+
+
+# Low-level client in the wire format, as the resource's meta.client
+class WireClient:
+    def __init__(self):
+        self.requests = []
+
+    def update_item(self, **kwargs):
+        self.requests.append(kwargs)
+        return {'ConsumedCapacity': {'CapacityUnits': 1.0}}
+
+
+def test_resource_tables_are_written_through_their_shared_client():
+    client = WireClient()
+    table = SimpleNamespace(name='price_tracker_test', meta=SimpleNamespace(client=client))
+    writer = WriteBehind(table, CapacityBucket(1000.0, 1000.0))
+    writer.put('a', {'next_check_at': 1}, {'failed_checks': 1})
+    writer.start().close(5)
+    request, = client.requests
+    assert request['TableName'] == 'price_tracker_test'
+    assert request['Key'] == {'url': {'S': 'a'}}
+    assert request['ExpressionAttributeValues'] == {':next_check_at': {'N': '1'}, ':failed_checks': {'N': '1'}}
+
+
+def test_bucket_paces_by_consumed_capacity():
+    clock = FakeClock()
+    bucket = CapacityBucket(2, 2, clock=clock, sleep=clock.sleep)
+    assert bucket.delay() == 0
+    bucket.charge(4)
+    # two units in debt plus the one needed: 1.5 seconds at 2 units per second
+    assert bucket.delay() == pytest.approx(1.5)
+    clock.sleep(1.5)
+    assert bucket.delay() == 0
+    bucket.charge(1)
+    assert bucket.delay(1) == pytest.approx(0.5)
+    assert bucket.consumed == 5